@@ -1,7 +1,21 @@
 
-import importlib.metadata as importlib_metadata
+# 延迟导入, 避免 pyrunjvm --version 和子命令加载不需要的模块
+_lazy_map = {
+    'create_application': ('.application', 'create_application'),
+    'create_context': ('.context', 'create_context'),
+}
 
-__version__ = importlib_metadata.version(__name__)
 
-from .application import create_application
-from .context import create_context
+def __getattr__(name):
+    if name == '__version__':
+        import importlib.metadata as importlib_metadata
+        value = importlib_metadata.version(__name__)
+    elif name in _lazy_map:
+        import importlib
+        module_name, attr = _lazy_map[name]
+        value = getattr(importlib.import_module(module_name, __name__), attr)
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    globals()[name] = value
+    return value
@@ -1,12 +1,72 @@
 
 import os
-import pkg_resources
 
-from .util import random_port, mkdir,rmtree,write_file_with_encoding,render_by_jinja_template
-import shutil
+from .util import mkdir, sync_tree
 import asyncio
-import subprocess
 import sys
+import time
+import signal
+
+from .ports import PortError
+from .readiness import create_ready_probe, StartupReport, ReadyResult, READY_STATUS
+from .scheduler import find_cycle
+from .supervisor import Supervisor, StatusFile, create_restart_policy
+from .logs import create_log_multiplexer
+from .control import ControlServer
+from .shutdown import create_shutdown_manager, new_process_group_kwargs, send_tomcat_shutdown
+from .monitor import create_monitor
+from .watch import create_watcher, is_watch_enable
+from .cds import is_cds_enable, create_cds_manager
+from .exploded import ExplodedJar, ExplodeError, LAUNCH_MODES
+from .profiles import ProfileError, merge_jvm_opts
+from .memory import plan_memory, get_memory_request
+from .diagnostics import create_diagnostics, get_jfr_jvm_args
+
+TOMCAT_DEFAULT_READY = {
+    'type': 'log',
+    'pattern': 'Server startup in',
+}
+
+def run_coroutine(coro, shutdown=None):
+    '''
+    shutdown: 收到 Ctrl-C/SIGTERM 时调用的协程函数
+    '''
+    if sys.platform == 'win32':
+        loop = asyncio.ProactorEventLoop()
+    else:
+        loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    main_task = loop.create_task(coro)
+    if shutdown is not None and sys.platform != 'win32':
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, lambda: loop.create_task(shutdown()))
+
+    try:
+        while True:
+            try:
+                return loop.run_until_complete(main_task)
+            except KeyboardInterrupt:
+                # windows 下没有 add_signal_handler
+                if shutdown is None:
+                    raise
+                loop.run_until_complete(shutdown())
+    finally:
+        loop.close()
+
+def get_project_profile_jvm_opts(context, config, name):
+    '''
+    项目或 tomcat 实例的 profile 参数, 覆盖全局的 jvm_opts, 被自己的 jvm_opts 覆盖
+    '''
+    profile = context.resolve_config_value(config.get('profile', None))
+    if not profile:
+        return []
+
+    try:
+        return context.get_profile_jvm_opts(profile)
+    except ProfileError as e:
+        print(f'{name}: {e}')
+        sys.exit(-1)
 
 class DebugPortInfo(object):
     def __init__(self, name, port):
@@ -17,11 +77,40 @@ class AbastApplication(object):
     def __init__(self, context):
         self.context = context
 
+        # 运行时对象, 由 start_runtime 创建
+        self.supervisor = None
+        self.log_mux = None
+        self.control_server = None
+        self.monitor = None
+        self.watcher = None
+        self.cds_manager = None
+
     def prepare_config(self):
         pass
 
-    def build_project(self, project_config):
-        pass
+    def get_build_cmds(self, project_config):
+        cmds = []
+        clear_cmds = project_config.get('clear_cmds', None)
+        if clear_cmds:
+            cmds.extend(clear_cmds)
+
+        build_cmds = project_config.get('build_cmds', None)
+        if build_cmds:
+            cmds.extend(build_cmds)
+
+        return cmds
+
+    def get_watch_patterns(self, project_config):
+        '''
+        项目没有配置 watch 和 inputs 时监控的构建输出
+        '''
+        return None
+
+    def redeploy(self, project_config):
+        '''
+        重新部署一个项目, 默认重启项目对应的服务
+        '''
+        self.supervisor.restart(self.context.get_project_name(project_config))
 
     def pre_handle(self):
         pass
@@ -35,6 +124,54 @@ class AbastApplication(object):
     def run(self, **kwargs):
         pass
 
+    def create_supervisor(self):
+        policy = create_restart_policy(self.context, self.context.supervise)
+        status_file = StatusFile(os.path.join(self.context.dest_dir, 'status.json'))
+        return Supervisor(policy, status_file, create_shutdown_manager(self.context))
+
+    def get_cds_jvm_args(self, name, jar_list, extra=None):
+        if self.cds_manager is None:
+            self.cds_manager = create_cds_manager(self.context)
+
+        return self.cds_manager.get_jvm_args(name, jar_list, extra)
+
+    def finish_cds(self, name):
+        if self.cds_manager is not None:
+            self.cds_manager.finish(name)
+
+    async def start_runtime(self):
+        self.supervisor = self.create_supervisor()
+        self.log_mux = create_log_multiplexer(self.context)
+
+        self.control_server = ControlServer(
+            self.supervisor, self.context.dest_dir,
+            create_diagnostics(self.context, self.supervisor)
+        )
+        await self.control_server.start()
+
+        self.monitor = create_monitor(self.context, self.supervisor)
+        if self.monitor is not None:
+            self.monitor.start()
+
+        self.watcher = create_watcher(self.context, self)
+        if self.watcher is not None:
+            self.watcher.start()
+
+    async def stop_runtime(self):
+        if self.watcher is not None:
+            await self.watcher.stop()
+
+        if self.monitor is not None:
+            await self.monitor.stop()
+            self.monitor.print_summary()
+
+        await self.control_server.close()
+        await self.log_mux.close()
+
+    async def shutdown(self):
+        if self.supervisor is not None:
+            await self.supervisor.shutdown()
+
 class TomcatProxy(object):
     def __init__(self, context, proxy_config):
         self.enable = proxy_config.get('enable')
@@ -45,23 +182,62 @@ class TomcatProxy(object):
         if self.ip:
             self.ip = self.ip.replace('.', '\\.')
 
-class TomcatApplication(AbastApplication):
-
-    TOMCAT_CONTEXT_XML_TPL = '''<?xml version="1.0" encoding="UTF-8"?>
-    <Context path="{context_path}" docBase="{war_path}" reloadable="true"/>
+class TomcatConnector(object):
+    '''
+    [tomcat.connector] 里的 http 连接器配置, 没有配置的属性使用 tomcat 的默认值
     '''
+    PROTOCOLS = {
+        'nio': 'org.apache.coyote.http11.Http11NioProtocol',
+        'nio2': 'org.apache.coyote.http11.Http11Nio2Protocol',
+    }
+    # 配置名 -> Connector 的属性名
+    ATTRS = (
+        ('max_threads', 'maxThreads'),
+        ('min_spare_threads', 'minSpareThreads'),
+        ('accept_count', 'acceptCount'),
+        ('max_connections', 'maxConnections'),
+        ('keep_alive_timeout', 'keepAliveTimeout'),
+        ('max_keep_alive_requests', 'maxKeepAliveRequests'),
+        ('tcp_no_delay', 'tcpNoDelay'),
+        ('compression', 'compression'),
+    )
 
-    def __init__(self, context):
+    def __init__(self, context, connector_config):
+        connector_config = connector_config or {}
+        protocol = context.resolve_config_value(connector_config.get('protocol', 'HTTP/1.1'))
+        self.protocol = self.PROTOCOLS.get(protocol, protocol)
+        self.connection_timeout = context.resolve_config_value(
+            connector_config.get('connection_timeout', 20000)
+        )
+
+        self.attrs = []
+        for key, name in self.ATTRS:
+            value = context.resolve_config_value(connector_config.get(key, None))
+            if value is None:
+                continue
+            self.attrs.append((name, to_xml_value(value)))
+
+def to_xml_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(v) for v in value)
+    return str(value)
+
+DEFAULT_TOMCAT_INSTANCE = 'tomcat'
+TOMCAT_INSTANCE_MODES = ('group', 'per-project')
+
+class TomcatInstance(object):
+    '''
+    一个 tomcat 实例, 有自己的 catalina base、端口、调试端口和日志,
+    默认实例的 catalina base 是 .pyrunjvm/tomcat, 其它实例是 .pyrunjvm/tomcat-<name>
+    '''
+    def __init__(self, context, name, instance_config=None):
         self.context = context
-        self.tomcat_config = None
-        self.tomcat_proxy = None
-        self.port = None
-        self.shutdowm_port = None
-        self.ajp_port = None
+        self.name = name
+        self.instance_config = instance_config or {}
 
-        self.tomcat_dir = os.path.join(
-            self.context.dest_dir, 'tomcat'
-            )
+        self.tomcat_dir = os.path.join(context.dest_dir, name)
         self.conf_dir = os.path.join(self.tomcat_dir, 'conf')
         self.logs_dir = os.path.join(self.tomcat_dir, 'logs')
         self.work_dir = os.path.join(self.tomcat_dir, 'work')
@@ -69,82 +245,186 @@ class TomcatApplication(AbastApplication):
         self.tomcat_context_dir = os.path.join(
             self.conf_dir, 'Catalina', 'localhost'
         )
+        self.log_file = os.path.join(context.logs_dir, f'{name}.log')
+        self.ready_probe = None
+        # handle_project 生成的 context 文件名
+        self.context_file_set = set()
+        # 部署在这个实例上的 Project
+        self.project_list = []
+
+        if name == DEFAULT_TOMCAT_INSTANCE:
+            self.port = context.get_env('TOMCAT_PORT', 8080, int)
+            self.debug_port = context.get_env('JVM_DEBUG_PORT', 50899, int)
+            self.shutdowm_port = context.get_env('TOMCAT_SHUTDOWN_PORT', -1, int)
+            self.ajp_port = context.get_env('TOMAT_AJP_PORT', -1, int)
+            self.redirect_port = context.get_env('TOMCAT_REDIRECT_PORT', -1, int)
+        else:
+            # 没有指定的端口自动分配
+            self.port = self.get_config_port('port')
+            self.debug_port = self.get_config_port('debug_port')
+            self.shutdowm_port = self.get_config_port('shutdown_port')
+            self.ajp_port = self.get_config_port('ajp_port')
+            self.redirect_port = self.get_config_port('redirect_port')
 
-        self.src_tomcat_home_dir = None
-
-        self.debug_port = self.context.get_env('JVM_DEBUG_PORT', 50899, int)
         self.jvm_arg_list = []
-        if context.jvm_arg_list:
-            self.jvm_arg_list.extend(context.jvm_arg_list)
-        self.jvm_arg_list.append('-Xdebug') 
-        self.jvm_arg_list.append(
-            '-Xrunjdwp:transport=dt_socket,server=y,suspend=n,address=127.0.0.1:%d' % self.debug_port
-        )
+        # memory_budget 分配的 -Xmx 等参数
+        self.memory_jvm_arg_list = []
+
+    def get_config_port(self, key):
+        return int(self.context.resolve_config_value(self.instance_config.get(key, -1)))
+
+    def get_port_map(self):
+        return {
+            'http': self.port,
+            'debug': self.debug_port,
+            'shutdown': self.shutdowm_port,
+            'ajp': self.ajp_port,
+            'redirect': self.redirect_port,
+        }
+
+    def set_port(self, kind, port):
+        attr_map = {
+            'http': 'port',
+            'debug': 'debug_port',
+            'shutdown': 'shutdowm_port',
+            'ajp': 'ajp_port',
+            'redirect': 'redirect_port',
+        }
+        setattr(self, attr_map[kind], port)
+
+class TomcatApplication(AbastApplication):
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.tomcat_config = None
+        self.tomcat_proxy = None
+        self.tomcat_connector = None
+        self.start_stop_threads = 0
+        self.background_processor_delay = 10
+        # 项目名 -> context 文件
+        self.context_file_map = {}
 
-        self.context.debug_port_info_list.append(DebugPortInfo('debug tomcat', self.debug_port))
+        self.src_tomcat_home_dir = None
+        self.conf_sync_mode = 'mtime'
+        self.instance_mode = 'group'
+        # name -> TomcatInstance
+        self.instance_map = {}
 
     def prepare_config(self):
 
         self.tomcat_config = self.context.config.get('tomcat')
         self.tomcat_proxy = TomcatProxy(self.context, self.tomcat_config.get('proxy'))
+        self.tomcat_connector = TomcatConnector(self.context, self.tomcat_config.get('connector', None))
+        # 0 表示使用和 cpu 核数相同的线程并行启动 webapp
+        self.start_stop_threads = int(self.context.resolve_config_value(
+            self.tomcat_config.get('start_stop_threads', 0)
+        ))
+        # 检查 context 文件变化的间隔(秒), watch 模式下默认 1 秒, 修改后尽快重新部署
+        self.background_processor_delay = int(self.context.resolve_config_value(
+            self.tomcat_config.get(
+                'background_processor_delay', 1 if is_watch_enable(self.context) else 10
+            )
+        ))
 
-        self.port = self.context.get_env('TOMCAT_PORT', 8080, int)
-        self.shutdowm_port = self.context.get_env('TOMCAT_SHUTDOWN_PORT', -1, int)
-        self.ajp_port = self.context.get_env('TOMAT_AJP_PORT', -1, int)
-        self.redirect_port = self.context.get_env('TOMCAT_REDIRECT_PORT', -1, int)
+        self.conf_sync_mode = self.context.resolve_config_value(
+            self.tomcat_config.get('conf_sync', 'mtime')
+        )
 
         self.src_tomcat_home_dir = self.context.get_env('TOMCAT_HOME')
         if not self.src_tomcat_home_dir:
             print('please define env variable TOMCAT_HOME')
             return False
 
+        self.instance_mode = self.context.resolve_config_value(
+            self.tomcat_config.get('instance_mode', 'group')
+        )
+        if self.instance_mode not in TOMCAT_INSTANCE_MODES:
+            print(f'tomcat instance_mode must be one of {", ".join(TOMCAT_INSTANCE_MODES)}, but it is {self.instance_mode}')
+            return False
+
+        for project_config in self.context.config.get('projects', None) or []:
+            self.get_instance(project_config)
+        if not self.instance_map:
+            self.get_instance(None)
+
         return True
 
+    def get_instance(self, project_config):
+        '''
+        返回项目部署的 tomcat 实例, 没有时创建
+        '''
+        name = None
+        if project_config is not None:
+            if self.instance_mode == 'per-project':
+                name = self.context.get_project_name(project_config)
+            else:
+                name = self.context.resolve_config_value(project_config.get('instance', None))
+
+        name = f'tomcat-{name}' if name else DEFAULT_TOMCAT_INSTANCE
+        instance = self.instance_map.get(name, None)
+        if instance is None:
+            instances_config = self.tomcat_config.get('instances', None) or {}
+            instance = TomcatInstance(
+                self.context, name, instances_config.get(name[len('tomcat-'):], None)
+            )
+            self.instance_map[name] = instance
+        return instance
+
     def pre_handle(self):
         if self.context.no_config:
+            # 使用上次生成的 server.xml 里的端口
+            for instance in self.instance_map.values():
+                for kind, port in instance.get_port_map().items():
+                    instance.set_port(
+                        kind, self.context.get_assigned_port(f'{instance.name}.{kind}', port)
+                    )
             return
 
-        mkdir(self.tomcat_context_dir, True)
-        mkdir(self.temp_dir)
-        mkdir(self.work_dir)
-        mkdir(self.logs_dir)
-
-        rmtree(self.conf_dir)
-
-        shutil.copytree(
+        exclude = []
+        for instance in self.instance_map.values():
+            for kind, port in instance.get_port_map().items():
+                if port > 0 and port in exclude:
+                    print(f'{instance.name} {kind} port {port} is used by another tomcat instance')
+                    sys.exit(-1)
+                exclude.append(port)
+
+        for instance in self.instance_map.values():
+            self.prepare_instance(instance, exclude)
+
+    def prepare_instance(self, instance, exclude):
+        mkdir(instance.tomcat_context_dir, True)
+        mkdir(instance.temp_dir)
+        mkdir(instance.work_dir)
+        mkdir(instance.logs_dir)
+
+        # server.xml 由 post_handle 生成, Catalina 目录下的 context 文件由 post_handle 清理
+        result = sync_tree(
             os.path.join(self.src_tomcat_home_dir, 'conf'),
-            self.conf_dir, dirs_exist_ok=True
+            instance.conf_dir, str(self.conf_sync_mode),
+            exclude=['server.xml'], keep=['Catalina']
         )
+        print(f'sync {instance.name} conf dir: {result}')
 
-        use_port_list = [self.debug_port , self.port,]
-        if self.shutdowm_port < 1 :
-            if not self.context.enable_psutil:
-                print("psutil is not enable, please use fixed port for tomcat shutdown port")
-                sys.exit(-1)
-
-            self.shutdowm_port = random_port(use_port_list)
-            use_port_list.append(self.shutdowm_port)
-
-        if self.ajp_port < 1:
-            if not self.context.enable_psutil:
-                print("psutil is not enable, please use fixed port for tomcat ajp port")
-                sys.exit(-1)
+        names = []
+        for kind, port in instance.get_port_map().items():
+            if port < 1:
+                names.append(f'{instance.name}.{kind}')
 
-            self.ajp_port = random_port(use_port_list)
-            use_port_list.append(self.ajp_port)
+        try:
+            ports = self.context.allocate_ports(names, exclude)
+        except PortError as e:
+            print(f'allocate {instance.name} port failed: {e}, please use fixed port')
+            sys.exit(-1)
 
-        if self.redirect_port < 1:
-            if not self.context.enable_psutil:
-                print("psutil is not enable, please use fixed port for tomcat redirect port")
-                sys.exit(-1)
-
-            self.redirect_port = random_port(use_port_list)
-            use_port_list.append(self.redirect_port)
+        for kind, port in instance.get_port_map().items():
+            instance.set_port(kind, ports.get(f'{instance.name}.{kind}', port))
 
 
     def handle_project(self, project_config):
-        if self.context.no_config:
-            return
+        instance = self.get_instance(project_config)
+        project = self.context.create_project(project_config)
+        project.log_file = instance.log_file
+        instance.project_list.append(project)
 
         project_path = project_config.get('path')
         context_path = project_config.get('context_path')
@@ -158,46 +438,158 @@ class TomcatApplication(AbastApplication):
 
         m = {
             'context_path': context_path,
-            'war_path': exploded_war_path
+            'war_path': exploded_war_path,
+            'project': project_config,
         }
-        s = self.TOMCAT_CONTEXT_XML_TPL.format(**m)
+        m.update(self.get_context_options(project_config))
         p = context_path[1:]
         p = p.replace('/', '#')
-        out_file = os.path.join(self.tomcat_context_dir, '%s.xml' % p)
-        write_file_with_encoding(out_file, s)
+        file_name = '%s.xml' % p
+        instance.context_file_set.add(file_name)
+        out_file = os.path.join(instance.tomcat_context_dir, file_name)
+        self.context_file_map[self.context.get_project_name(project_config)] = out_file
+        if self.context.no_config:
+            return
 
+        renderer = self.context.get_template_renderer()
+        if renderer.render_to_file('tomcat/context.xml', out_file, m):
+            print(f'write tomcat context file {out_file}')
+
+
+    def get_project_option(self, project_config, key, default=None):
+        '''
+        项目里没有配置时使用 [tomcat] 里的配置
+        '''
+        value = project_config.get(key, None)
+        if value is None:
+            value = self.tomcat_config.get(key, default)
+
+        if isinstance(value, list):
+            return [self.context.resolve_config_value(v) for v in value]
+        return self.context.resolve_config_value(value)
+
+    def get_context_options(self, project_config):
+        '''
+        context 文件里的 reloadable 和 jar 扫描配置, jar_scan_skip 里的 jar 不扫描 TLD 和
+        web-fragment 等注解, tld_scan 里的 jar 仍然扫描 TLD
+        '''
+        jar_scanner = []
+        scan_class_path = self.get_project_option(project_config, 'scan_class_path')
+        if scan_class_path is not None:
+            jar_scanner.append(('scanClassPath', to_xml_value(scan_class_path)))
+
+        jar_scan_filter = []
+        jar_scan_skip = self.get_project_option(project_config, 'jar_scan_skip')
+        if jar_scan_skip:
+            jar_scan_skip = to_xml_value(jar_scan_skip)
+            jar_scan_filter.append(('tldSkip', jar_scan_skip))
+            jar_scan_filter.append(('pluggabilitySkip', jar_scan_skip))
+        tld_scan = self.get_project_option(project_config, 'tld_scan')
+        if tld_scan:
+            jar_scan_filter.append(('tldScan', to_xml_value(tld_scan)))
+
+        return {
+            'reloadable': to_xml_value(self.get_project_option(project_config, 'reloadable', True)),
+            'jar_scanner': jar_scanner,
+            'jar_scan_filter': jar_scan_filter,
+        }
+
+    def get_watch_patterns(self, project_config):
+        exploded_war_path = self.context.resolve_config_value(
+            project_config.get('exploded_war_path', None)
+        )
+        if not exploded_war_path:
+            return None
+        return [os.path.join(exploded_war_path, '**')]
+
+    def redeploy(self, project_config):
+        '''
+        修改 context 文件的 mtime, tomcat 检查到后只重新部署这个 webapp
+        '''
+        out_file = self.context_file_map[self.context.get_project_name(project_config)]
+        os.utime(out_file)
+
+    def get_instance_jvm_opts(self, instance):
+        context = self.context
+        jvm_opts = [
+            context.resolve_config_value(v) for v in instance.instance_config.get('jvm_opts', None) or []
+        ]
+        return merge_jvm_opts(
+            context.jvm_arg_list,
+            get_project_profile_jvm_opts(context, instance.instance_config, instance.name),
+            jvm_opts
+        )
 
     def post_handle(self):
+        allocation_map = plan_memory(self.context, [
+            get_memory_request(
+                self.context, instance.name, instance.instance_config,
+                self.get_instance_jvm_opts(instance)
+            )
+            for instance in self.instance_map.values()
+        ])
+        for instance in self.instance_map.values():
+            allocation = allocation_map.get(instance.name, None)
+            if allocation is not None:
+                instance.memory_jvm_arg_list = allocation.get_jvm_args()
+            self.handle_instance(instance)
+
+    def handle_instance(self, instance):
         context = self.context
         if not context.no_config:
-            tpl = pkg_resources.resource_filename(__name__, 'config/tomcat/server.xml')
             m = {
-                'PORT': self.port,
-                'SHUTDOWN_PORT': self.shutdowm_port,
-                'REDIRECT_PORT': self.redirect_port,
-                'AJP_PORT': self.ajp_port,
-                'Proxy': self.tomcat_proxy
+                'PORT': instance.port,
+                'SHUTDOWN_PORT': instance.shutdowm_port,
+                'REDIRECT_PORT': instance.redirect_port,
+                'AJP_PORT': instance.ajp_port,
+                'START_STOP_THREADS': self.start_stop_threads,
+                'BACKGROUND_PROCESSOR_DELAY': self.background_processor_delay,
+                'Proxy': self.tomcat_proxy,
+                'Connector': self.tomcat_connector,
             }
-            render_by_jinja_template(
-                tpl,
-                os.path.join(self.conf_dir, 'server.xml'),
-                'utf-8', m
-            )
+            renderer = context.get_template_renderer()
+            if renderer.render_to_file(
+                    'tomcat/server.xml',
+                    os.path.join(instance.conf_dir, 'server.xml'),
+                    m, 'utf-8'):
+                print('write %s server.xml from %s' % (instance.name, renderer.get_template_file('tomcat/server.xml')))
+
+            self.remove_stale_context_files(instance)
+
+        instance.ready_probe = create_ready_probe(
+            context, instance.name, self.tomcat_config.get('ready', TOMCAT_DEFAULT_READY),
+            instance.port, instance.log_file
+        )
+
+        context.debug_port_info_list.append(
+            DebugPortInfo(f'debug {instance.name}', instance.debug_port)
+        )
 
-        self.jvm_arg_list.append('-Djava.awt.headless=true')
-        self.jvm_arg_list.append(
-            "-Djava.util.logging.config.file=%s" % os.path.join(self.conf_dir, 'logging.properties')
+        jvm_arg_list = instance.jvm_arg_list
+        jvm_arg_list.extend(merge_jvm_opts(
+            instance.memory_jvm_arg_list,
+            get_jfr_jvm_args(context, instance.name, instance.instance_config),
+            self.get_instance_jvm_opts(instance)
+        ))
+        jvm_arg_list.append('-Xdebug') 
+        jvm_arg_list.append(
+            '-Xrunjdwp:transport=dt_socket,server=y,suspend=n,address=127.0.0.1:%d' % instance.debug_port
+        )
+
+        jvm_arg_list.append('-Djava.awt.headless=true')
+        jvm_arg_list.append(
+            "-Djava.util.logging.config.file=%s" % os.path.join(instance.conf_dir, 'logging.properties')
             )
-        self.jvm_arg_list.append("-Djava.util.logging.manager=org.apache.juli.ClassLoaderLogManager")
+        jvm_arg_list.append("-Djava.util.logging.manager=org.apache.juli.ClassLoaderLogManager")
 
-        #self.jvm_arg_list.append("-D\"com.sun.management.jmxremote\"= ")
-        #self.jvm_arg_list.append("-D\"com.sun.management.jmxremote.port\"=%d" % tomact_jmx_port)
-        #self.jvm_arg_list.append("-D\"com.sun.management.jmxremote.ssl\"=false")
-        #self.jvm_arg_list.append("-D\"com.sun.management.jmxremote.authenticate\"=false")
+        #jvm_arg_list.append("-D\"com.sun.management.jmxremote\"= ")
+        #jvm_arg_list.append("-D\"com.sun.management.jmxremote.port\"=%d" % tomact_jmx_port)
+        #jvm_arg_list.append("-D\"com.sun.management.jmxremote.ssl\"=false")
+        #jvm_arg_list.append("-D\"com.sun.management.jmxremote.authenticate\"=false")
 
-        self.jvm_arg_list.append("-Djava.rmi.server.hostname=127.0.0.1")
-        self.jvm_arg_list.append("-Djdk.tls.ephemeralDHKeySize=2048")
-        self.jvm_arg_list.append("-Djava.protocol.handler.pkgs=org.apache.catalina.webresources")
+        jvm_arg_list.append("-Djava.rmi.server.hostname=127.0.0.1")
+        jvm_arg_list.append("-Djdk.tls.ephemeralDHKeySize=2048")
+        jvm_arg_list.append("-Djava.protocol.handler.pkgs=org.apache.catalina.webresources")
 
         class_path_list = []
         class_path_list.append(
@@ -206,52 +598,112 @@ class TomcatApplication(AbastApplication):
         class_path_list.append(
             os.path.join(self.src_tomcat_home_dir, "bin", "tomcat-juli.jar")
             )
-        self.jvm_arg_list.append('-classpath')
-        self.jvm_arg_list.append('%s' % os.pathsep.join(class_path_list))
+        if is_cds_enable(context, self.tomcat_config):
+            jvm_arg_list.extend(
+                self.get_cds_jvm_args(instance.name, class_path_list)
+            )
+        jvm_arg_list.append('-classpath')
+        jvm_arg_list.append('%s' % os.pathsep.join(class_path_list))
 
-        # self.jvm_arg_list.append('-classpath')
-        # self.jvm_arg_list.append(
-        #      os.path.join(self.src_tomcat_home_dir, "bin", "bootstrap.jar")
-        # )
+        jvm_arg_list.append("-Dcatalina.base=%s" % instance.tomcat_dir)
+        jvm_arg_list.append("-Dcatalina.home=%s" % self.src_tomcat_home_dir)
+        jvm_arg_list.append("-Djava.io.tmpdir=%s" % instance.temp_dir)
+        jvm_arg_list.append("org.apache.catalina.startup.Bootstrap")
+        jvm_arg_list.append("start")
 
-        # self.jvm_arg_list.append('-classpath')
-        # self.jvm_arg_list.append(
-        #      os.path.join(self.src_tomcat_home_dir, "bin", "tomcat-juli.jar")
-        # )
 
-        self.jvm_arg_list.append("-Dcatalina.base=%s" % self.tomcat_dir)
-        self.jvm_arg_list.append("-Dcatalina.home=%s" % self.src_tomcat_home_dir)
-        self.jvm_arg_list.append("-Djava.io.tmpdir=%s" % self.temp_dir)
-        self.jvm_arg_list.append("org.apache.catalina.startup.Bootstrap")
-        self.jvm_arg_list.append("start")
+    def remove_stale_context_files(self, instance):
+        src_context_dir = os.path.join(
+            self.src_tomcat_home_dir, 'conf', 'Catalina', 'localhost'
+        )
+        for name in os.listdir(instance.tomcat_context_dir):
+            if not name.endswith('.xml') or name in instance.context_file_set:
+                continue
+            if os.path.isfile(os.path.join(src_context_dir, name)):
+                continue
+
+            print(f'remove stale tomcat context file {name}')
+            os.unlink(os.path.join(instance.tomcat_context_dir, name))
+
+    async def run_tomcat(self, instance, report, jvm_cmd_list, **kwargs):
+        name = instance.name
+        kwargs['stdout'] = asyncio.subprocess.PIPE
+        kwargs['stderr'] = asyncio.subprocess.STDOUT
+        kwargs.update(new_process_group_kwargs())
+
+        async def spawn():
+            proc = await asyncio.create_subprocess_exec(*jvm_cmd_list, **kwargs)
+            self.log_mux.attach(name, proc)
+            for project in instance.project_list:
+                project.proc = proc
+            return proc
+
+        start = time.monotonic()
+        proc = await spawn()
+        self.supervisor.started(name, proc)
+        ready = asyncio.ensure_future(
+            report.watch(name, instance.ready_probe, proc, start)
+        )
+        returncode = await self.supervisor.supervise(name, proc, spawn)
+        await ready
+        self.finish_cds(name)
+        return returncode
+
+    async def run_tomcats(self, cmd_map, **kwargs):
+        report = StartupReport(self.context.startup_listener)
+
+        await self.start_runtime()
+        supervisor = self.supervisor
+        for instance in self.instance_map.values():
+            report.expect(instance.name)
+            supervisor.shutdown_manager.set_graceful(
+                instance.name,
+                lambda instance=instance: send_tomcat_shutdown(instance.shutdowm_port)
+            )
+            supervisor.register(instance.name, ports=instance.get_port_map())
+            self.log_mux.open(instance.name, instance.log_file)
 
+        # 所有实例同时启动
+        ct_list = []
+        for instance in self.instance_map.values():
+            ct_list.append(
+                self.run_tomcat(instance, report, cmd_map[instance.name], **kwargs)
+            )
 
-    def run(self, **kwargs):
-        jvm_cmd_list = [self.context.java_bin,]
-        jvm_cmd_list.extend(self.jvm_arg_list)
+        try:
+            return await asyncio.gather(*ct_list)
+        finally:
+            await self.stop_runtime()
 
-        kwargs['env'] = self.context.environ
+    def run(self, **kwargs):
+        cmd_map = {}
+        for instance in self.instance_map.values():
+            jvm_cmd_list = [self.context.java_bin,]
+            jvm_cmd_list.extend(instance.jvm_arg_list)
+            cmd_map[instance.name] = jvm_cmd_list
 
-        cmd = ' '.join(jvm_cmd_list)
-        if kwargs.get('shell', None) is None:
-            kwargs['shell'] = True
+            cmd = ' '.join(jvm_cmd_list)
 
-        log_file = os.path.join(self.context.logs_dir, 'tomcat.log')
+            print(f'execute cmd: {cmd}')
+            print('')
+            print('log file is %s' % instance.log_file)
 
-        print(f'execute cmd: {cmd}')
-        print('')
-        print('log file is %s' % log_file)
+        kwargs['env'] = self.context.environ
 
         if self.context.no_run:
             return
 
-        with open(log_file, 'w') as f:
-            kwargs['stdout'] = f
-            kwargs['stderr'] = f
-            subprocess.check_call(jvm_cmd_list, **kwargs)
+        returncode_list = run_coroutine(
+            self.run_tomcats(cmd_map, **kwargs), self.shutdown
+        )
 
         print('')
-        print('stop')
+        if len(returncode_list) == 1:
+            print(f'stop, exit code {returncode_list[0]}')
+            return
+
+        for name, returncode in zip(self.instance_map, returncode_list):
+            print(f'{name} stop, exit code {returncode}')
 
 class FlatJarConfig(object):
     def __init__(self):
@@ -261,6 +713,23 @@ class FlatJarConfig(object):
         self.jvm_arg_list = []
         self.debug_port = None
         self.log_file_name = ''
+        self.ready_probe = None
+        self.depends_on = []
+        self.cds = False
+        # jar: java -jar, exploded: 解压后用 classpath + main class 启动
+        self.launch = 'jar'
+        self.main_class = None
+        self.class_path = None
+        self.memory_request = None
+        # memory_budget 分配的 -Xmx 等参数
+        self.memory_jvm_arg_list = []
+        self.jfr_jvm_arg_list = []
+        # context 里的 Project, 保存运行中的进程
+        self.project = None
+
+        # 运行时状态
+        self.ready_event = None
+        self.ready_status = None
 
 
 class FlatJarApplication(AbastApplication):
@@ -269,19 +738,20 @@ class FlatJarApplication(AbastApplication):
 
         self.logs_dir = os.path.join(self.context.dest_dir, 'logs')
         self.flatjar_config_list = []
+        self.max_parallel_starts = 0
+        self.default_launch = 'jar'
+        self.exploded_dir = os.path.join(self.context.dest_dir, 'exploded')
 
     def prepare_config(self):
+        flatjar_config = self.context.config.get('flatjar', None) or {}
+        self.max_parallel_starts = int(self.context.resolve_config_value(
+            flatjar_config.get('max_parallel_starts', 0)
+        ))
+        self.default_launch = self.context.resolve_config_value(
+            flatjar_config.get('launch', 'jar')
+        )
         return True
 
-    def build_project(self, project_config):
-        clear_cmds = project_config.get('clear_cmds', None)
-        if clear_cmds:
-            self.context.execute_cmds(clear_cmds)
-
-        build_cmds = project_config.get('build_cmds')
-        if build_cmds:
-            self.context.execute_cmds(build_cmds)
-
     def pre_handle(self):
         if self.context.no_config:
             return
@@ -291,7 +761,7 @@ class FlatJarApplication(AbastApplication):
     def handle_project(self, project_config):
 
         project_path = project_config.get('path')
-        name = os.path.basename(project_path)
+        name = self.context.get_project_name(project_config)
         jar_path = project_config.get('jar_path')
         jar_path = self.context.resolve_config_value(jar_path)
         jvm_arg_list = project_config.get('jvm_opts')
@@ -305,14 +775,36 @@ class FlatJarApplication(AbastApplication):
 
         c = FlatJarConfig()
         c.name = name
+        c.project = self.context.create_project(project_config)
         c.project_path = project_path
         c.jar_path = jar_path
-        c.jvm_arg_list = jvm_arg_list
+        c.jvm_arg_list = merge_jvm_opts(
+            get_project_profile_jvm_opts(self.context, project_config, name), jvm_arg_list
+        )
         c.debug_port = debug_port
         c.log_file_name = project_config.get('log_file_name')
         if not c.log_file_name:
             c.log_file_name = f'{name}.log'
 
+        c.depends_on = [str(d) for d in project_config.get('depends_on', [])]
+        c.cds = is_cds_enable(self.context, project_config)
+        c.launch = self.context.resolve_config_value(
+            project_config.get('launch', self.default_launch)
+        )
+        if c.launch not in LAUNCH_MODES:
+            print(f'{name} launch must be one of {", ".join(LAUNCH_MODES)}, but it is {c.launch}')
+            sys.exit(-1)
+        c.project.log_file = os.path.join(self.logs_dir, c.log_file_name)
+        c.jfr_jvm_arg_list = get_jfr_jvm_args(self.context, name, project_config)
+        c.memory_request = get_memory_request(
+            self.context, name, project_config,
+            merge_jvm_opts(self.context.jvm_arg_list, c.jvm_arg_list)
+        )
+        c.ready_probe = create_ready_probe(
+            self.context, name, project_config.get('ready', None),
+            None, os.path.join(self.logs_dir, c.log_file_name)
+        )
+
         self.flatjar_config_list.append(c)
 
         if c.debug_port and c.debug_port > 0:
@@ -320,66 +812,195 @@ class FlatJarApplication(AbastApplication):
             self.context.debug_port_info_list.append(di)
 
     def post_handle(self):
-        pass
+        name_set = set(c.name for c in self.flatjar_config_list)
+        for c in self.flatjar_config_list:
+            for dep in c.depends_on:
+                if dep not in name_set:
+                    print(f'{c.name} depends on unknown project {dep}')
+                    sys.exit(-1)
+
+        cycle = find_cycle(
+            dict((c.name, c.depends_on) for c in self.flatjar_config_list)
+        )
+        if cycle:
+            print('depends_on has cycle: %s' % ' -> '.join(cycle))
+            sys.exit(-1)
 
-    async def run_flatjar(self, config:FlatJarConfig):
-        p = os.path.join(self.logs_dir, config.log_file_name)
-        with open(p, 'w') as log_file:
-            jvm_args = []
-            if self.context.jvm_arg_list:
-                jvm_args.extend(self.context.jvm_arg_list)
-            if config.jvm_arg_list:
-                jvm_args.extend(config.jvm_arg_list)
-
-            if config.debug_port and config.debug_port > 0:
-                jvm_args.append('-Xdebug') 
-                jvm_args.append(
-                    '-Xrunjdwp:transport=dt_socket,server=y,suspend=n,address=127.0.0.1:%d' % config.debug_port
-                )
-
-            cmd_list = [self.context.java_bin, ]
-            if jvm_args:
-                cmd_list.extend(jvm_args)
+        allocation_map = plan_memory(
+            self.context, [c.memory_request for c in self.flatjar_config_list]
+        )
+        for c in self.flatjar_config_list:
+            allocation = allocation_map.get(c.name, None)
+            if allocation is not None:
+                c.memory_jvm_arg_list = allocation.get_jvm_args()
+
+            if c.launch == 'exploded':
+                self.explode_jar(c)
+
+    def explode_jar(self, config):
+        jar_path = os.path.join(self.context.work_dir, config.project_path, config.jar_path)
+        exploded_jar = ExplodedJar(jar_path, os.path.join(self.exploded_dir, config.name))
+        start = time.monotonic()
+        try:
+            changed = exploded_jar.extract()
+        except ExplodeError as e:
+            print(f'explode {config.name} failed: {e}, use java -jar')
+            config.launch = 'jar'
+            return
+
+        if changed:
+            print(f'explode {config.name} to {exploded_jar.dest_dir} in {time.monotonic() - start:.2f}s')
+        config.main_class = exploded_jar.main_class
+        config.class_path = exploded_jar.class_path
+
+    def get_flatjar_config(self, name):
+        for c in self.flatjar_config_list:
+            if c.name == name:
+                return c
+        return None
+
+    def set_ready_status(self, config, status):
+        config.ready_status = status
+        config.ready_event.set()
+
+    async def wait_depends(self, config, report):
+        for dep in config.depends_on:
+            dep_config = self.get_flatjar_config(dep)
+            await dep_config.ready_event.wait()
+            if dep_config.ready_status not in READY_STATUS:
+                print(f'{config.name} is not started, because {dep} is {dep_config.ready_status}')
+                report.add_result(ReadyResult(config.name, 'skipped', None))
+                self.set_ready_status(config, 'skipped')
+                return False
 
+        return True
+
+    def get_cmd_list(self, config, jvm_args):
+        cmd_list = [self.context.java_bin, ]
+        if jvm_args:
+            cmd_list.extend(jvm_args)
+
+        if config.launch == 'exploded':
+            cmd_list.append('-cp')
+            cmd_list.append(os.pathsep.join(config.class_path))
+            cmd_list.append(config.main_class)
+        else:
             cmd_list.append('-jar')
             cmd_list.append(config.jar_path)
 
-            cmd = ' '.join(cmd_list)
+        return cmd_list
 
-            cwd = os.path.join(self.context.work_dir, config.project_path)
+    def get_watch_patterns(self, project_config):
+        jar_path = self.context.resolve_config_value(project_config.get('jar_path', None))
+        if not jar_path:
+            return None
+        return [jar_path]
 
-            print(f'cwd is {cwd}')
-            print(f'execute cmd: {cmd}')
-            print('')
-            print(f'log file is {p}')
+    def redeploy(self, project_config):
+        config = self.get_flatjar_config(self.context.get_project_name(project_config))
+        if config.launch == 'exploded':
+            self.explode_jar(config)
+        self.supervisor.restart(config.name)
+
+    async def run_flatjar(self, config:FlatJarConfig, report:StartupReport, semaphore):
+        if not await self.wait_depends(config, report):
+            return
+
+        p = os.path.join(self.logs_dir, config.log_file_name)
+        self.log_mux.open(config.name, p)
+        jvm_args = merge_jvm_opts(
+            config.memory_jvm_arg_list, config.jfr_jvm_arg_list,
+            self.context.jvm_arg_list, config.jvm_arg_list
+        )
 
-            proc = await asyncio.create_subprocess_shell(
-                cmd, 
-                stdout=log_file,
-                stderr=log_file,
+        if config.debug_port and config.debug_port > 0:
+            jvm_args.append('-Xdebug') 
+            jvm_args.append(
+                '-Xrunjdwp:transport=dt_socket,server=y,suspend=n,address=127.0.0.1:%d' % config.debug_port
+            )
+
+        cwd = os.path.join(self.context.work_dir, config.project_path)
+
+        if config.cds:
+            # 归档只能用于生成时的 classpath, jar 和 exploded 启动的归档不能通用
+            extra = [config.launch]
+            if config.launch == 'exploded':
+                extra.extend(config.class_path)
+            jvm_args.extend(self.get_cds_jvm_args(
+                config.name, [os.path.join(cwd, config.jar_path)], extra
+            ))
+
+        cmd = ' '.join(self.get_cmd_list(config, jvm_args))
+
+        print(f'cwd is {cwd}')
+        print(f'execute cmd: {cmd}')
+        print('')
+        print(f'log file is {p}')
+
+        async def spawn():
+            # 重新部署后 exploded 的 classpath 可能变化, 每次启动时重新生成命令
+            proc = await asyncio.create_subprocess_exec(
+                *self.get_cmd_list(config, jvm_args),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
                 cwd = cwd,
-                env = self.context.environ
+                env = self.context.environ,
+                **new_process_group_kwargs()
+            )
+            self.log_mux.attach(config.name, proc)
+            config.project.proc = proc
+            return proc
+
+        # 限制同时处于启动中的服务数量, 服务就绪后才释放
+        async with semaphore:
+            if self.supervisor.stopping:
+                report.add_result(ReadyResult(config.name, 'skipped', None))
+                self.set_ready_status(config, 'skipped')
+                return
+
+            start = time.monotonic()
+            proc = await spawn()
+            self.supervisor.started(config.name, proc)
+            status = await report.watch(
+                config.name, config.ready_probe, proc, start
             )
-            await proc.wait()
-            print(f"{config.name} is stop")
 
+        self.set_ready_status(config, status)
+        await self.supervisor.supervise(config.name, proc, spawn)
+        self.finish_cds(config.name)
+        print(f"{config.name} is stop")
 
-    def run(self, **kwargs):
-        if self.context.no_run:
-            return
+
+    async def run_flatjars(self):
+        await self.start_runtime()
+        report = StartupReport(self.context.startup_listener)
+        max_parallel_starts = self.max_parallel_starts
+        if max_parallel_starts < 1:
+            max_parallel_starts = max(1, len(self.flatjar_config_list))
+        semaphore = asyncio.Semaphore(max_parallel_starts)
 
         ct_list = []
-        if sys.platform == 'win32':
-            asyncio.set_event_loop(asyncio.ProactorEventLoop())
+        for config in self.flatjar_config_list:
+            config.ready_event = asyncio.Event()
+            config.ready_status = None
+            self.supervisor.register(config.name, ports={'debug': config.debug_port})
 
-        loop = asyncio.get_event_loop()
         for config in self.flatjar_config_list:
-            ct = self.run_flatjar(config)
+            report.expect(config.name)
+            ct = self.run_flatjar(config, report, semaphore)
             print('')
             ct_list.append(ct)
 
-        loop.run_until_complete(asyncio.gather(*ct_list))
-        loop.close()
+        try:
+            await asyncio.gather(*ct_list)
+        finally:
+            await self.stop_runtime()
+
+    def run(self, **kwargs):
+        if self.context.no_run:
+            return
+
+        run_coroutine(self.run_flatjars(), self.shutdown)
 
 application_map = {
     'tomcat': TomcatApplication,
@@ -0,0 +1,269 @@
+import os
+import re
+import sys
+import shlex
+import subprocess
+
+
+BATCH_TOOLS = ('gradle', 'maven')
+
+TOOL_NAMES = {
+    'gradle': ('gradle', 'gradle.bat', 'gradlew', 'gradlew.bat'),
+    'maven': ('mvn', 'mvn.cmd', 'mvnw', 'mvnw.cmd'),
+}
+
+DEFAULT_BATCH_ARGS = {
+    'gradle': ['--parallel'],
+    'maven': ['-T', '1C'],
+}
+
+# 后面跟着参数的选项
+GRADLE_ARG_OPTIONS = ('-x', '--exclude-task')
+MAVEN_ARG_OPTIONS = (
+    '-D', '-P', '--activate-profiles', '-T', '--threads',
+    '-s', '--settings', '-rf', '--resume-from',
+)
+# 改变了构建根目录, 不能和其它项目合并
+GRADLE_UNSUPPORTED_OPTIONS = (
+    '-p', '--project-dir', '-b', '--build-file', '-c', '--settings-file',
+)
+
+# 包含这些字符的命令交给 shell 执行, 不合并
+SHELL_CHARS = set('&|;<>`')
+
+GRADLE_FAILED_RE = re.compile(r"Execution failed for task '(:[^']+)'")
+MAVEN_FAILED_RE = re.compile(r'Failed to execute goal .* on project ([^:\s]+)')
+
+
+def get_tool(program):
+    name = os.path.basename(program.replace('\\', '/')).lower()
+    for tool, names in TOOL_NAMES.items():
+        if name in names:
+            return tool
+    return None
+
+
+def split_cmd(cmd):
+    if any(c in SHELL_CHARS for c in cmd):
+        return None
+
+    try:
+        return shlex.split(cmd, posix=sys.platform != 'win32')
+    except ValueError:
+        return None
+
+
+def join_cmd(args):
+    if sys.platform == 'win32':
+        return subprocess.list2cmdline(args)
+    return shlex.join(args)
+
+
+def add_unique(result, items):
+    for item in items:
+        if item not in result:
+            result.append(item)
+
+
+class BatchCommand(object):
+    '''
+    一个项目的构建命令解析后的结果, 同一个 key 的项目可以合并成一次调用,
+    options 是选项的列表, 每一项是 (选项,) 或者 (选项, 值), 选项相同的项目才能合并
+      gradle: targets 是 task
+      maven: targets 是 goal, modules 是 -pl 的模块, goal 也要相同
+    '''
+    def __init__(self, tool, program, targets=None, options=None, modules=None):
+        self.tool = tool
+        self.program = program
+        self.targets = list(targets or [])
+        self.options = list(options or [])
+        # None 表示构建整个 reactor
+        self.modules = modules
+
+    def get_key(self):
+        if self.tool == 'gradle':
+            return (self.tool, self.program, tuple(self.options))
+        return (self.tool, self.program, tuple(self.targets), tuple(self.options))
+
+    def merge(self, other):
+        '''
+        合并同一个项目的多个命令, 不能合并时返回 None
+        '''
+        if (self.tool, self.program) != (other.tool, other.program):
+            return None
+
+        targets = self.targets + other.targets
+        options = list(self.options)
+        add_unique(options, other.options)
+        if self.modules is None or other.modules is None:
+            modules = None
+        else:
+            modules = list(self.modules)
+            add_unique(modules, other.modules)
+        return BatchCommand(self.tool, self.program, targets, options, modules)
+
+
+def parse_gradle_args(program, args):
+    targets = []
+    options = []
+    it = iter(args)
+    for arg in it:
+        if arg.split('=', 1)[0] in GRADLE_UNSUPPORTED_OPTIONS:
+            return None
+        if arg in GRADLE_ARG_OPTIONS:
+            options.append((arg, next(it, '')))
+        elif arg.startswith('-'):
+            options.append((arg,))
+        else:
+            targets.append(arg)
+
+    if not targets:
+        return None
+    return BatchCommand('gradle', program, targets, options)
+
+
+def parse_maven_args(program, args, work_dir):
+    targets = []
+    options = []
+    modules = None
+    it = iter(args)
+    for arg in it:
+        if arg in ('-pl', '--projects'):
+            modules = (modules or []) + next(it, '').split(',')
+        elif arg in ('-f', '--file'):
+            p = next(it, '')
+            if p.endswith('.xml'):
+                p = os.path.dirname(p)
+            p = os.path.relpath(os.path.join(work_dir, p), work_dir).replace(os.sep, '/')
+            modules = (modules or []) + [p]
+        elif arg in MAVEN_ARG_OPTIONS:
+            options.append((arg, next(it, '')))
+        elif arg.startswith('-'):
+            options.append((arg,))
+        else:
+            targets.append(arg)
+
+    if not targets:
+        return None
+    return BatchCommand('maven', program, targets, options, modules)
+
+
+def parse_build_cmd(cmd, work_dir, tools=BATCH_TOOLS):
+    '''
+    解析单个 gradle/maven 命令, 其它命令返回 None
+    '''
+    args = split_cmd(cmd)
+    if not args:
+        return None
+
+    tool = get_tool(args[0])
+    if tool is None or tool not in tools:
+        return None
+
+    if tool == 'gradle':
+        return parse_gradle_args(args[0], args[1:])
+    return parse_maven_args(args[0], args[1:], work_dir)
+
+
+class BuildBatcher(object):
+    '''
+    把多个项目的 gradle/maven 构建命令合并为一次调用, 只付出一次配置和守护进程握手的开销,
+    失败时按输出里的 task/project 找到失败的项目
+    '''
+    def __init__(self, work_dir, tools=BATCH_TOOLS, batch_args=None):
+        self.work_dir = work_dir
+        self.tools = tools
+        # tool -> 合并后追加的参数
+        self.batch_args = batch_args or DEFAULT_BATCH_ARGS
+
+    def parse(self, cmds):
+        '''
+        cmds 全部是同一个构建工具的命令时返回合并后的 BatchCommand, 否则返回 None
+        '''
+        result = None
+        for cmd in cmds:
+            batch = parse_build_cmd(str(cmd), self.work_dir, self.tools)
+            if batch is None:
+                return None
+            result = batch if result is None else result.merge(batch)
+            if result is None:
+                return None
+        return result
+
+    def get_cmd(self, batch_list):
+        first = batch_list[0]
+        args = [first.program]
+        # 同一个 key 的项目选项相同
+        options = [arg for option in first.options for arg in option]
+        if first.tool == 'gradle':
+            targets = []
+            for batch in batch_list:
+                add_unique(targets, batch.targets)
+            args.extend(targets)
+            args.extend(options)
+        else:
+            module_list = [batch.modules for batch in batch_list]
+            if all(modules for modules in module_list):
+                modules = []
+                for m in module_list:
+                    add_unique(modules, m)
+                args.extend(['-pl', ','.join(modules)])
+            args.extend(options)
+            args.extend(first.targets)
+
+        extra = list(self.batch_args.get(first.tool, []))
+        if not any(arg in args for arg in extra if arg.startswith('-')):
+            args.extend(extra)
+        return join_cmd(args)
+
+    def find_failed(self, member_list, lines):
+        '''
+        member_list: [(name, path, BatchCommand)], 返回失败的项目名, 找不到时返回全部
+        '''
+        failed = []
+        for line in lines:
+            m = GRADLE_FAILED_RE.search(line)
+            if m:
+                task_path = m.group(1)
+                for name, path, batch in member_list:
+                    project_path = ':' + path.replace('\\', '/').strip('/').replace('/', ':')
+                    if task_path in batch.targets or task_path.startswith(project_path + ':'):
+                        add_unique(failed, [name])
+                continue
+
+            m = MAVEN_FAILED_RE.search(line)
+            if m:
+                artifact = m.group(1)
+                for name, path, batch in member_list:
+                    names = [os.path.basename(p.rstrip('/')) for p in batch.modules or []]
+                    names.append(os.path.basename(path.rstrip('/\\')))
+                    if artifact in names or artifact == name:
+                        add_unique(failed, [name])
+
+        return failed or [name for name, _, _ in member_list]
+
+
+def create_batcher(context, build_config):
+    '''
+    [build] batch: false(默认)、true(gradle 和 maven)、"gradle" 或 "maven"
+    '''
+    batch = context.resolve_config_value(build_config.get('batch', False))
+    if not batch:
+        return None
+
+    if batch is True:
+        tools = BATCH_TOOLS
+    elif batch in BATCH_TOOLS:
+        tools = (batch,)
+    else:
+        print(f'build batch must be true, false or one of {", ".join(BATCH_TOOLS)}, but it is {batch}')
+        sys.exit(-1)
+
+    batch_args = dict(DEFAULT_BATCH_ARGS)
+    args = build_config.get('batch_args', None)
+    if args is not None:
+        args = [context.resolve_config_value(a) for a in args]
+        for tool in tools:
+            batch_args[tool] = args
+
+    return BuildBatcher(context.work_dir, tools, batch_args)
@@ -0,0 +1,188 @@
+import os
+import io
+import json
+import time
+import math
+import shlex
+import asyncio
+import statistics
+
+from .readiness import READY_STATUS
+from .profiles import merge_jvm_opts
+
+
+STAT_LIST = ('min', 'median', 'p95')
+
+
+def percentile(values, p):
+    '''
+    nearest-rank 百分位数
+    '''
+    values = sorted(values)
+    if not values:
+        return None
+    rank = max(1, math.ceil(p / 100.0 * len(values)))
+    return values[rank - 1]
+
+
+def summarize(sample_list):
+    '''
+    返回 {指标: {min, median, p95}}, 指标按第一次出现的顺序
+    '''
+    value_map = {}
+    for sample in sample_list:
+        for key, value in sample['metrics'].items():
+            if value is not None:
+                value_map.setdefault(key, []).append(value)
+
+    result = {}
+    for key, values in value_map.items():
+        result[key] = {
+            'min': min(values),
+            'median': statistics.median(values),
+            'p95': percentile(values, 95),
+        }
+    return result
+
+
+class Variant(object):
+    def __init__(self, name, jvm_opts):
+        self.name = name
+        self.jvm_opts = jvm_opts
+        self.sample_list = []
+
+
+def parse_variant(text):
+    '''
+    NAME=JVM_OPTS, 如 g1="-XX:+UseG1GC -Xss512k"
+    '''
+    name, sep, opts = text.partition('=')
+    if not sep or not name:
+        raise ValueError(f'variant must be NAME=JVM_OPTS, but it is {text}')
+    return Variant(name.strip(), shlex.split(opts))
+
+
+class BenchRunner(object):
+    '''
+    循环执行 加载配置 -> 构建 -> 生成配置 -> 启动 的流程, 所有服务启动完成后立即停止,
+    记录每一步的耗时、每个服务的就绪时间和停止时间; 有多个 variant 时交替执行, 减少环境变化的影响
+    pipeline 需要提供 load_context()、create_application(context)、build(context, app)、
+    handle_projects(context, app)
+    '''
+    def __init__(self, pipeline, iterations, variant_list, build=True):
+        self.pipeline = pipeline
+        self.iterations = iterations
+        self.variant_list = variant_list
+        self.build = build
+
+    def run(self):
+        for i in range(self.iterations):
+            for variant in self.variant_list:
+                print(f'bench iteration {i + 1}/{self.iterations}, variant {variant.name}')
+                sample = self.run_once(variant)
+                if sample is None:
+                    return False
+                variant.sample_list.append(sample)
+        return True
+
+    def run_once(self, variant):
+        pipeline = self.pipeline
+        metrics = {}
+        status_map = {}
+
+        start = time.monotonic()
+        context = pipeline.load_context()
+        if context is None:
+            return None
+        context.jvm_arg_list = merge_jvm_opts(context.jvm_arg_list, variant.jvm_opts)
+
+        app = pipeline.create_application(context)
+        if app is None or not app.prepare_config():
+            return None
+        metrics['config'] = time.monotonic() - start
+
+        if self.build:
+            t = time.monotonic()
+            if not pipeline.build(context, app):
+                return None
+            metrics['build'] = time.monotonic() - t
+
+        t = time.monotonic()
+        pipeline.handle_projects(context, app)
+        metrics['handle'] = time.monotonic() - t
+
+        stop_time = []
+
+        def on_complete(report):
+            metrics['startup'] = report.total
+            for name in report.name_list:
+                result = report.result_map[name]
+                status_map[name] = result.status
+                metrics[f'ready.{name}'] = result.seconds
+
+            stop_time.append(time.monotonic())
+            asyncio.ensure_future(app.shutdown())
+
+        context.startup_listener = on_complete
+        app.run()
+
+        if stop_time:
+            metrics['shutdown'] = time.monotonic() - stop_time[0]
+        if app.supervisor is not None:
+            for r in app.supervisor.shutdown_manager.result_list:
+                metrics[f'stop.{r.name}'] = r.seconds
+        metrics['total'] = time.monotonic() - start
+
+        return {
+            'metrics': metrics,
+            'status': status_map,
+        }
+
+    def get_result(self):
+        return {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'iterations': self.iterations,
+            'variants': [
+                {
+                    'name': v.name,
+                    'jvm_opts': v.jvm_opts,
+                    'samples': v.sample_list,
+                    'stats': summarize(v.sample_list),
+                }
+                for v in self.variant_list
+            ],
+        }
+
+    def print_summary(self):
+        print('')
+        print('bench summary:')
+        for variant in self.variant_list:
+            stats = summarize(variant.sample_list)
+            print(f'  {variant.name} ({" ".join(variant.jvm_opts) or "no extra jvm opts"}), '
+                  f'{len(variant.sample_list)} samples')
+            if not stats:
+                continue
+
+            width = max(len(key) for key in stats)
+            print(f'    {"".ljust(width)}  ' + '  '.join(s.rjust(9) for s in STAT_LIST))
+            for key, stat in stats.items():
+                print(f'    {key.ljust(width)}  ' + '  '.join(
+                    f'{stat[s]:8.2f}s' for s in STAT_LIST
+                ))
+
+            not_ready = set()
+            for sample in variant.sample_list:
+                for name, status in sample['status'].items():
+                    if status not in READY_STATUS:
+                        not_ready.add(name)
+            if not_ready:
+                print(f'    not ready in some iterations: {", ".join(sorted(not_ready))}')
+        print('')
+
+    def save(self, path):
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        with io.open(path, 'w', encoding='UTF-8') as f:
+            json.dump(self.get_result(), f, indent=2)
+        print(f'bench result is saved to {path}')
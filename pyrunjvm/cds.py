@@ -0,0 +1,169 @@
+import os
+import re
+import glob
+import hashlib
+import subprocess
+
+from .util import mkdir, file_digest
+
+
+# -XX:ArchiveClassesAtExit 从 JDK 13 开始支持
+MIN_JAVA_VERSION = 13
+
+ARCHIVE_SUFFIX = '.jsa'
+TMP_SUFFIX = '.tmp'
+STALE_RE = re.compile(r'^[0-9a-f]{16}\.jsa(\.tmp)?$')
+
+
+def parse_java_version(text):
+    '''
+    从 java -version 的输出中解析主版本号, 如 1.8.0_292 -> 8, 17.0.2 -> 17
+    '''
+    m = re.search(r'version "([^"]+)"', text)
+    if m is None:
+        return None
+
+    parts = re.split(r'[._+-]', m.group(1))
+    try:
+        major = int(parts[0])
+        if major == 1 and len(parts) > 1:
+            major = int(parts[1])
+    except ValueError:
+        return None
+
+    return major
+
+
+def get_java_version(java_bin, env=None):
+    '''
+    返回 (主版本号, java -version 的完整输出), 执行失败时返回 (None, None)
+    '''
+    try:
+        out = subprocess.run(
+            [java_bin, '-version'], env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=30
+        ).stdout.decode('utf-8', errors='replace')
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+
+    return parse_java_version(out), out.strip()
+
+
+class CdsManager(object):
+    '''
+    管理每个服务的 AppCDS 动态归档, 归档文件保存在 cds_dir 下,
+    文件名由服务名和 (jar 内容, jdk 版本) 的摘要组成, jar 或 jdk 变化后重新生成
+    '''
+    def __init__(self, cds_dir, java_bin, env=None):
+        self.cds_dir = cds_dir
+        self.java_bin = java_bin
+        self.env = env
+
+        # None 表示还没有检查 jdk 版本
+        self.enable = None
+        self._java_version = None
+        self._java_version_text = None
+        # name -> 本次运行生成的临时归档文件
+        self.training_map = {}
+
+    def check_java(self):
+        if self.enable is not None:
+            return self.enable
+
+        self.enable = False
+        self._java_version, self._java_version_text = get_java_version(
+            self.java_bin, self.env
+        )
+        if self._java_version is None:
+            print(f'cds: can not get version of {self.java_bin}, cds is disabled')
+        elif self._java_version < MIN_JAVA_VERSION:
+            print(f'cds: need jdk {MIN_JAVA_VERSION}+, current is {self._java_version}, cds is disabled')
+        else:
+            self.enable = True
+
+        return self.enable
+
+    def get_key(self, jar_list, extra=None):
+        '''
+        extra 是影响归档的其它字符串, 如启动方式和实际的 classpath
+        '''
+        h = hashlib.sha1()
+        h.update(self._java_version_text.encode('utf-8'))
+        for p in jar_list:
+            h.update(b'\0')
+            if os.path.isfile(p):
+                h.update(file_digest(p).encode('ascii'))
+            else:
+                h.update(p.encode('utf-8'))
+        for s in extra or []:
+            h.update(b'\1')
+            h.update(s.encode('utf-8'))
+        return h.hexdigest()[:16]
+
+    def remove_stale_archives(self, name, keep):
+        for p in glob.glob(os.path.join(self.cds_dir, f'{glob.escape(name)}-*')):
+            if os.path.basename(p) in keep:
+                continue
+            # 只删除 name-<key>.jsa 形式的文件, 避免误删名字有相同前缀的服务的归档
+            if not STALE_RE.match(os.path.basename(p)[len(name) + 1:]):
+                continue
+            print(f'cds: remove stale archive {p}')
+            os.unlink(p)
+
+    def get_jvm_args(self, name, jar_list, extra=None):
+        '''
+        返回要添加的 jvm 参数, 已有归档时使用归档, 否则本次运行作为训练运行, 退出时生成归档
+        '''
+        if not self.check_java():
+            return []
+
+        mkdir(self.cds_dir, True)
+        archive_name = f'{name}-{self.get_key(jar_list, extra)}{ARCHIVE_SUFFIX}'
+        archive = os.path.join(self.cds_dir, archive_name)
+        tmp = archive + TMP_SUFFIX
+        self.remove_stale_archives(name, (archive_name, archive_name + TMP_SUFFIX))
+
+        if os.path.isfile(archive):
+            print(f'cds: use archive {archive}')
+            return [f'-XX:SharedArchiveFile={archive}']
+
+        # 先写到临时文件, jvm 正常退出后再改名, 避免使用不完整的归档
+        if os.path.isfile(tmp):
+            os.unlink(tmp)
+        self.training_map[name] = (tmp, archive)
+        print(f'cds: no archive for {name}, it will be created when {name} exits')
+        return [f'-XX:ArchiveClassesAtExit={tmp}']
+
+    def finish(self, name):
+        '''
+        服务退出后调用, 保存训练运行生成的归档
+        '''
+        item = self.training_map.pop(name, None)
+        if item is None:
+            return
+
+        tmp, archive = item
+        if os.path.isfile(tmp) and os.path.getsize(tmp) > 0:
+            os.replace(tmp, archive)
+            print(f'cds: archive of {name} is created: {archive}')
+        else:
+            print(f'cds: {name} did not create archive, it will be retried on next run')
+
+
+def is_cds_enable(context, project_config=None):
+    '''
+    项目配置里的 cds 优先于 [cds] 的 enable 和命令行参数 --cds
+    '''
+    if project_config is not None:
+        value = context.resolve_config_value(project_config.get('cds', None))
+        if value is not None:
+            return bool(value)
+
+    config = context.config.get('cds', None) or {}
+    return bool(context.cds or context.resolve_config_value(config.get('enable', False)))
+
+
+def create_cds_manager(context):
+    return CdsManager(
+        os.path.join(context.dest_dir, 'cds'), context.java_bin, context.environ
+    )
@@ -1,39 +1,85 @@
 import os
 import sys
+import time
 import click
-import subprocess
+import importlib.util
 
-from .context import create_context
-from .application import create_application
+from .context import load_context
 import pyrunjvm
 
-from dotenv import dotenv_values
-
-try:
-    import psutil
-except ImportError as e:
-    psutil = None
-
+# 只检查是否安装了 psutil, 用到时再导入
+HAS_PSUTIL = importlib.util.find_spec('psutil') is not None
 
 
 CURRENT_WORK_DIR = os.path.abspath(os.getcwd())
 DEFAULT_CONFIG_FILE = os.path.join(CURRENT_WORK_DIR, '.pyrunjvm.toml')
+DEST_DIR = os.path.join(CURRENT_WORK_DIR, '.pyrunjvm')
+
+GLOBAL_BUILD_TASK = 'build'
+
+def build(context, app, jobs=None, force=False):
+    from .scheduler import BuildScheduler, BuildError, get_max_workers
+    from .fingerprint import BuildCache
+    from .batch import create_batcher
+
+    build_config = context.config.get('build', None) or {}
+
+    if jobs is None:
+        jobs = context.resolve_config_value(build_config.get('max_workers', None))
+
+    fingerprint_mode = context.resolve_config_value(
+        build_config.get('fingerprint', 'mtime')
+    )
+    cache = BuildCache(os.path.join(context.dest_dir, 'build_cache.json'))
+    env = {}
+    for k in context.env_keys:
+        env[k] = context.get_env(k)
 
-def build(context, app):
-    build_config = context.config.get('build', None)
-    if build_config:
-        clear_cmds = build_config.get('clear_cmds', None)
-        if clear_cmds:
-            context.execute_cmds(clear_cmds)
+    batcher = create_batcher(context, build_config)
+    scheduler = BuildScheduler(
+        context, get_max_workers(jobs), cache=cache, force=force,
+        fingerprint_mode=str(fingerprint_mode), env=env, batcher=batcher
+    )
 
-        build_cmds = build_config.get('build_cmds', None)
-        if build_cmds:
-            context.execute_cmds(build_cmds)
+    global_cmds = []
+    clear_cmds = build_config.get('clear_cmds', None)
+    if clear_cmds:
+        global_cmds.extend(clear_cmds)
+
+    build_cmds = build_config.get('build_cmds', None)
+    if build_cmds:
+        global_cmds.extend(build_cmds)
+
+    global_depends_on = []
+    if global_cmds:
+        scheduler.add_task(
+            GLOBAL_BUILD_TASK, global_cmds,
+            inputs=build_config.get('inputs', None), propagate=False
+        )
+        global_depends_on.append(GLOBAL_BUILD_TASK)
 
     projects_config = context.config.get('projects')
 
     for pro_config in projects_config:
-        app.build_project(pro_config)
+        name = context.get_project_name(pro_config)
+        depends_on = list(global_depends_on)
+        depends_on.extend(pro_config.get('depends_on', []))
+        cmds = app.get_build_cmds(pro_config)
+        batch = None
+        if batcher is not None and cmds and pro_config.get('batch', True):
+            batch = batcher.parse([context.resolve_cmd(cmd) for cmd in cmds])
+        scheduler.add_task(
+            name, cmds, depends_on,
+            inputs=pro_config.get('inputs', None),
+            base_dir=os.path.join(context.work_dir, pro_config.get('path')),
+            batch=batch
+        )
+
+    try:
+        return scheduler.run()
+    except BuildError as e:
+        print(f'build error: {e}')
+        return False
 
 def handle_projects(context, app):
     projects_config = context.config.get('projects')
@@ -44,15 +90,55 @@ def handle_projects(context, app):
 
     app.post_handle()
 
-@click.command()
+def print_version(ctx, param, value):
+    '''
+    在打印其它信息和读取配置之前处理 --version
+    '''
+    if not value or ctx.resilient_parsing:
+        return
+
+    print('version: %s' % pyrunjvm.__version__)
+    ctx.exit()
+
+@click.group(invoke_without_command=True)
 @click.option('-c', '--config', 'config_file', default=DEFAULT_CONFIG_FILE)
 @click.option('--env', 'env_file', default="")
 @click.option('--no-config', is_flag=True)
+@click.option('--no-config-cache', is_flag=True,
+              help='always parse config and env files, do not use cached config')
 @click.option('--no-build', is_flag=True)
+@click.option('-j', '--jobs', 'jobs', type=int, default=None,
+              help='max parallel build workers, -1 means cpu count')
+@click.option('--force-build', is_flag=True,
+              help='ignore build cache and rebuild all projects')
 @click.option('--no-run', is_flag=True)
-@click.option('--version', 'print_version', is_flag=True)
+@click.option('--supervise', is_flag=True,
+              help='restart exited jvm processes with backoff')
+@click.option('-f', '--follow', 'log_follow', is_flag=True,
+              help='print merged logs of all services to console')
+@click.option('--log-filter', 'log_filter', multiple=True,
+              help='only print logs of these services to console')
+@click.option('--monitor', is_flag=True,
+              help='sample cpu/memory of jvm processes, need psutil')
+@click.option('--watch', is_flag=True,
+              help='rebuild and redeploy a project when its files change')
+@click.option('--profile', default=None,
+              help='jvm flag profiles separated by comma, like fast-start or low-memory')
+@click.option('--jfr', is_flag=True,
+              help='start jvm with a continuous flight recording, need jdk 11+')
+@click.option('--cds', is_flag=True,
+              help='create and use AppCDS archives, need jdk 13+')
+@click.option('--print-env', is_flag=True,
+              help='print resolved env variables with their source and exit')
+@click.option('--version', is_flag=True, is_eager=True, expose_value=False,
+              callback=print_version)
 @click.option('--verbose', "verbose", is_flag=True)
-def main(config_file, env_file, no_config, no_build, no_run, print_version, verbose):
+@click.pass_context
+def main(ctx, config_file, env_file, no_config, no_config_cache, no_build, jobs, force_build, no_run, supervise,
+         log_follow, log_filter, monitor, watch, profile, jfr, cds, print_env, verbose):
+
+    if ctx.invoked_subcommand is not None:
+        return
 
     platform = sys.platform
 
@@ -64,41 +150,34 @@ def main(config_file, env_file, no_config, no_build, no_run, print_version, verb
     print(f'enable run: {not no_run}')
     print("")
 
-    if print_version:
-        print('version: %s' % pyrunjvm.__version__)
+    context = load_context(
+        platform, CURRENT_WORK_DIR, config_file, env_file, verbose, not no_config_cache
+        )
+    if context is None:
         return
-    
-    env_file_list = []
-    if env_file:
-        env_file_list.append(env_file)
-    else:
-        env_file_list.append(os.path.join(CURRENT_WORK_DIR, ".env." + platform))
-        env_file_list.append(os.path.join(CURRENT_WORK_DIR, ".env"))
 
-    env = None
-    for item in env_file_list:
-        print(f"check env file {item}")
-        if os.path.isfile(item):
-            env = dotenv_values(item, verbose=verbose)
-            break
-
-    print("")
-    if env is None:
-        print("not found any env file")
-    else:
-        print(f'env: {env}')
-
-    context = create_context(
-        platform, CURRENT_WORK_DIR, config_file, env
+    if print_env:
+        print("")
+        context.dump_env(
+            context.env_keys | {'WORK_DIR'} | set(context.referenced_env_names)
         )
-    if context is None:
         return
 
     context.no_config = no_config
     context.no_run = no_run
-    context.enable_psutil = False if psutil is None else True
+    context.supervise = supervise
+    context.log_follow = log_follow
+    context.log_filter = list(log_filter)
+    context.monitor = monitor
+    context.watch = watch
+    context.cds = cds
+    context.jfr = jfr
+    context.enable_psutil = HAS_PSUTIL
     context.verbose = verbose
 
+    if not context.apply_profile(profile):
+        sys.exit(-1)
+
     print("")
     if context.enable_psutil:
         print("psutil module is installed")
@@ -107,13 +186,15 @@ def main(config_file, env_file, no_config, no_build, no_run, print_version, verb
     print("")
 
 
+    from .application import create_application
     app = create_application(context)
 
     if not app.prepare_config():
         return
 
     if not no_build:
-        build(context, app)
+        if not build(context, app, jobs, force_build):
+            sys.exit(1)
 
     handle_projects(context, app)
 
@@ -121,5 +202,170 @@ def main(config_file, env_file, no_config, no_build, no_run, print_version, verb
 
     app.run()
 
+def format_size(value):
+    if value is None:
+        return '-'
+
+    for unit in ('B', 'KB', 'MB'):
+        if value < 1024:
+            return f'{value:.0f}{unit}'
+        value /= 1024
+
+    return f'{value:.1f}GB'
+
+def format_duration(seconds):
+    if seconds is None:
+        return '-'
+
+    seconds = int(seconds)
+    h, m, s = seconds // 3600, seconds // 60 % 60, seconds % 60
+    if h:
+        return f'{h}h{m:02d}m'
+    if m:
+        return f'{m}m{s:02d}s'
+    return f'{s}s'
+
+def control(cmd, name=None, **kwargs):
+    from .control import send_command, ControlError
+
+    try:
+        return send_command(DEST_DIR, cmd, name, **kwargs)
+    except ControlError as e:
+        print(f'error: {e}')
+        sys.exit(1)
+
+@main.command()
+def status():
+    '''
+    list services of the running pyrunjvm
+    '''
+    response = control('status')
+
+    row_list = [('NAME', 'PID', 'STATE', 'RESTARTS', 'UPTIME', 'RSS', 'PORTS')]
+    for item in response['services']:
+        ports = item.get('ports') or {}
+        port_str = ' '.join(f'{k}={v}' for k, v in ports.items() if v and v > 0)
+        row_list.append((
+            item['name'],
+            str(item['pid'] or '-'),
+            item['state'],
+            str(item['restarts']),
+            format_duration(item['uptime']),
+            format_size(item['rss']),
+            port_str or '-',
+        ))
+
+    width_list = [max(len(row[i]) for row in row_list) for i in range(len(row_list[0]))]
+    for row in row_list:
+        print('  '.join(v.ljust(w) for v, w in zip(row, width_list)).rstrip())
+
+@main.command()
+@click.argument('name')
+def stop(name):
+    '''
+    stop one service of the running pyrunjvm
+    '''
+    control('stop', name)
+    print(f'{name} is stopping')
+
+@main.command()
+@click.argument('name')
+def restart(name):
+    '''
+    restart one service of the running pyrunjvm
+    '''
+    control('restart', name)
+    print(f'{name} is restarting')
+
+@main.command()
+@click.argument('name')
+@click.argument('kinds', nargs=-1, type=click.Choice(['threads', 'histo', 'jfr']))
+@click.option('--timeout', type=click.IntRange(min=1), default=120,
+              help='seconds to wait for each jcmd')
+def dump(name, kinds, timeout):
+    '''
+    save thread dump(default), heap histogram or jfr recording of one service
+    '''
+    kinds = list(kinds) or ['threads']
+    # 每种类型执行一次 jcmd, 多等一会儿, 让服务端先报告超时
+    response = control(
+        'dump', name, socket_timeout=timeout * len(kinds) + 10,
+        timeout=timeout, kinds=kinds
+    )
+
+    for kind, path in response['files'].items():
+        print(f'{kind}: {path}')
+    for kind, error in response['errors'].items():
+        print(f'{kind} failed: {error}')
+    if response['errors']:
+        sys.exit(1)
+
+class BenchPipeline(object):
+    '''
+    bench 每次循环执行的流程, 和 main 相同
+    '''
+    def __init__(self, params):
+        self.params = params
+
+    def load_context(self):
+        params = self.params
+        context = load_context(
+            sys.platform, CURRENT_WORK_DIR, params['config_file'], params['env_file'],
+            False, not params['no_config_cache']
+        )
+        if context is not None:
+            context.enable_psutil = HAS_PSUTIL
+            context.cds = params['cds']
+            context.jfr = params['jfr']
+            if not context.apply_profile(params['profile']):
+                return None
+        return context
+
+    def create_application(self, context):
+        from .application import create_application
+        return create_application(context)
+
+    def build(self, context, app):
+        return build(context, app, self.params['jobs'], self.params['force_build'])
+
+    def handle_projects(self, context, app):
+        handle_projects(context, app)
+        context.gen_vscode_launch_file()
+
+@main.command()
+@click.option('-n', '--iterations', type=int, default=5, help='number of iterations')
+@click.option('--variant', 'variant_list', multiple=True,
+              help='NAME=JVM_OPTS, extra jvm opts to compare, can be repeated')
+@click.option('-o', '--output', default=None,
+              help='json result file, default is .pyrunjvm/bench/<time>.json')
+@click.option('--no-build', is_flag=True)
+@click.pass_context
+def bench(ctx, iterations, variant_list, output, no_build):
+    '''
+    start and stop all services repeatedly, report min/median/p95 of each step
+    '''
+    from .bench import BenchRunner, Variant, parse_variant
+
+    try:
+        variant_list = [parse_variant(v) for v in variant_list]
+    except ValueError as e:
+        print(f'error: {e}')
+        sys.exit(1)
+    if not variant_list:
+        variant_list = [Variant('default', [])]
+
+    runner = BenchRunner(
+        BenchPipeline(ctx.parent.params), max(1, iterations), variant_list, not no_build
+    )
+    ok = runner.run()
+    runner.print_summary()
+
+    if output is None:
+        output = os.path.join(DEST_DIR, 'bench', time.strftime('%Y%m%d-%H%M%S') + '.json')
+    runner.save(output)
+    if not ok:
+        print('bench is stopped, because config, build or startup failed')
+        sys.exit(1)
+
 if __name__ == '__main__':
     main()
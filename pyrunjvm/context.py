@@ -1,16 +1,17 @@
 
-from string import Template
 import os
-import sys
 import logging
 import subprocess
 
-import tomlkit
-from tomlkit.toml_file import TOMLFile
-
 from .util import is_str, mkdir
-import jinja2
-import io
+from .ports import PortAllocator
+from .interpolate import Resolver, InterpolationError
+from .profiles import ProfileResolver, ProfileError, merge_jvm_opts, filter_jvm_opts, check_flag
+from .loader import (
+    ConfigCache, ConfigError, CACHE_FILE_NAME,
+    read_config, get_env_file_list, read_env_file, get_referenced_env_names
+)
+
 
 class Project(object):
     def __init__(self, name, path, config):
@@ -21,7 +22,7 @@ class Project(object):
         self.jvm_arg_list = []
 
         self.log_file = None
-        # Popen 对象
+        # 运行中的 asyncio Process 对象, 重启后更新, tomcat 项目是所在实例的进程
         self.proc = None
 
 
@@ -38,24 +39,70 @@ class Context(object):
 
         self.no_config = False
         self.no_run = False
+        self.supervise = False
+        self.log_follow = False
+        self.monitor = False
+        self.watch = False
+        # 所有服务启动完成后调用, 参数为 StartupReport
+        self.startup_listener = None
+        self.cds = False
+        self.jfr = False
+        self.log_filter = []
 
         self.project_list = []
 
         mkdir(self.dest_dir, True)
         mkdir(self.logs_dir, True)
 
+        self.env_file = None
+        # 配置文件和 .env 文件引用的环境变量名
+        self.referenced_env_names = []
+
+        self.set_config(config, env)
+        self.debug_port_info_list = []
+
+        self.port_allocator = None
+        self.template_renderer = None
+        # java -version 的主版本号, 第一次使用时获取
+        self._java_version = None
+
+    def set_config(self, config, env=None):
+        '''
+        根据配置和 .env 的环境变量设置环境变量和 jvm_opts, 配置解析后要重新调用
+        '''
         self.config = config
-        self.environ = {}
-        self.environ.update(os.environ)
+        # 未解析的环境变量, environ 是解析后传给子进程的环境变量
+        self.raw_environ = {}
+        self.raw_environ.update(os.environ)
+
+        # 配置文件和 .env 文件里定义的环境变量名
+        self.env_keys = set()
+        # 环境变量名 -> 来源, 没有记录的是系统环境变量
+        self.env_source = {}
 
         default_env = config.get('env', None)
         if default_env:
-            self.environ.update(default_env)
+            self.raw_environ.update(default_env)
+            self.env_keys.update(default_env.keys())
+            self.env_source.update((k, '[env]') for k in default_env)
 
         if env:
-            self.environ.update(env)
-
-        self.environ['WORK_DIR'] = work_dir
+            self.raw_environ.update(env)
+            self.env_keys.update(env.keys())
+            self.env_source.update((k, '.env') for k in env)
+
+        self.raw_environ['WORK_DIR'] = self.work_dir
+        self.env_source['WORK_DIR'] = 'pyrunjvm'
+        self.environ = dict(self.raw_environ)
+        # 变量解析时按顺序查找, PATH=${PATH}:/opt/bin 引用的是下一层的 PATH
+        self.env_layer_list = [
+            {'WORK_DIR': self.work_dir}, env or {}, default_env or {}, dict(os.environ)
+        ]
+
+        # 变量解析器, 第一次使用时创建
+        self._env_resolver = None
+        self._config_resolver = None
+        self.resolve_env()
 
         self.jvm_arg_list = []
 
@@ -73,15 +120,14 @@ class Context(object):
             java_bin = 'java'
 
         self.java_bin = java_bin
-        self.debug_port_info_list = []
 
     def get_env(self, name, default=None, convert_func=None):
-        value = self.environ.get(name, None)
+        value = self.raw_environ.get(name, None)
         if value is None:
             return default
 
         if is_str(value):
-            value = self.resolve_str_value(value, self.environ)
+            value = self.get_env_resolver().resolve_var(name)
 
         if convert_func is not None:
             value = convert_func(value)
@@ -92,58 +138,169 @@ class Context(object):
         if not is_str(value):
             return value
 
-        return self.resolve_str_value(value, self.config, **self.environ)
+        return self.get_config_resolver().resolve(value)
+
+    def resolve_config_tree(self, value, resolver=None):
+        '''
+        解析 value 里所有的字符串, 返回新的 dict/list,
+        结果里保留 $$, 使用时再次解析也不会改变含义
+        '''
+        if resolver is None:
+            resolver = Resolver(self.env_layer_list + [self.config], keep_escape=True)
+
+        if isinstance(value, dict):
+            return dict((k, self.resolve_config_tree(v, resolver)) for k, v in value.items())
+        if isinstance(value, list):
+            return [self.resolve_config_tree(v, resolver) for v in value]
+        if is_str(value):
+            return resolver.resolve(value)
+        return value
 
-    def resolve_str_value(self, value, mapping, **kwds):
-        old_v = value
-        while True:
-            if '$' not in old_v:
-                return old_v 
+    def get_env_resolver(self):
+        if self._env_resolver is None:
+            self._env_resolver = Resolver(self.env_layer_list)
+        return self._env_resolver
 
-            t = Template(old_v)
-            v = t.safe_substitute(mapping, **kwds)
-            if old_v == v:
-                return v
+    def get_config_resolver(self):
+        '''
+        配置里的值可以引用环境变量和配置文件顶层的值, 环境变量优先
+        '''
+        if self._config_resolver is None:
+            self._config_resolver = Resolver(self.env_layer_list + [self.config])
+        return self._config_resolver
 
-            old_v = v
+    def resolve_env(self):
+        '''
+        解析所有在配置文件和 .env 文件里定义的环境变量, 有循环引用时抛出 InterpolationError
+        '''
+        for name in self.env_keys:
+            value = self.get_env(name)
+            if value is not None:
+                self.environ[name] = str(value)
+
+    def dump_env(self, names):
+        '''
+        打印环境变量解析后的值和来源
+        '''
+        env_file = os.path.basename(self.env_file) if self.env_file else '.env'
+        row_list = [('NAME', 'VALUE', 'SOURCE')]
+        for name in sorted(names):
+            value = self.get_env(name)
+            if value is None:
+                row_list.append((name, '-', 'unset'))
+                continue
+
+            source = self.env_source.get(name, 'os')
+            if source == '.env':
+                source = env_file
+            row_list.append((name, str(value), source))
+
+        width_list = [max(len(row[i]) for row in row_list) for i in range(2)]
+        for row in row_list:
+            print(f'{row[0].ljust(width_list[0])}  {row[1].ljust(width_list[1])}  {row[2]}')
+
+    def get_project_name(self, project_config):
+        name = project_config.get('name', None)
+        if name:
+            return self.resolve_config_value(name)
+
+        path = project_config.get('path')
+        return os.path.basename(path)
+
+    def get_java_version(self):
+        if self._java_version is None:
+            from .cds import get_java_version
+            self._java_version, _ = get_java_version(self.java_bin, self.environ)
+            # 获取失败时不再重试
+            self._java_version = self._java_version or 0
+        return self._java_version or None
+
+    def get_profile_jvm_opts(self, names):
+        '''
+        返回 profile 展开后的参数, 去掉当前 jdk 不支持的参数, profile 不存在时抛出 ProfileError
+        '''
+        resolver = ProfileResolver(self.config.get('profiles', None), self.resolve_config_value)
+        opts = resolver.resolve(names)
+
+        java_version = self.get_java_version()
+        opts, reason_list = filter_jvm_opts(opts, java_version)
+        for reason in reason_list:
+            print(f'profile {names}: {reason}, current is jdk {java_version}, skip it')
+        return opts
+
+    def apply_profile(self, names=None):
+        '''
+        names 为空时使用配置文件顶层的 profile, profile 的参数放在 jvm_opts 前面,
+        相同的参数以 jvm_opts 为准
+        '''
+        if not names:
+            names = self.resolve_config_value(self.config.get('profile', None))
+        if not names:
+            return True
+
+        try:
+            opts = self.get_profile_jvm_opts(names)
+        except ProfileError as e:
+            print(f'error: {e}')
+            return False
+
+        java_version = self.get_java_version()
+        for arg in self.jvm_arg_list:
+            reason = check_flag(arg, java_version)
+            if reason:
+                print(f'warning: jvm_opts {reason}, current is jdk {java_version}')
+
+        self.jvm_arg_list = merge_jvm_opts(opts, self.jvm_arg_list)
+        print(f'jvm profile {names}: {" ".join(opts)}')
+        return True
+
+    def get_port_allocator(self):
+        if self.port_allocator is None:
+            ports_config = self.config.get('ports', None) or {}
+            port_range = self.resolve_config_value(ports_config.get('range', None))
+            self.port_allocator = PortAllocator(
+                os.path.join(self.dest_dir, 'ports.json'),
+                port_range, self.enable_psutil
+            )
+
+        return self.port_allocator
+
+    def allocate_ports(self, names, exclude=None):
+        return self.get_port_allocator().allocate(names, exclude)
+
+    def get_assigned_port(self, name, default=None):
+        '''
+        返回上次分配给 name 的端口, 不检查端口是否空闲
+        '''
+        if default is not None and default > 0:
+            return default
+
+        return self.get_port_allocator().get_assigned(name, default)
 
-        return None
-    
     def create_project(self, project_config):
         path = project_config.get('path')
-        name = os.path.dirname(path)
-        name = project_config.get('name', name)
+        name = self.get_project_name(project_config)
         p = Project(name, path, project_config)
         self.project_list.append(p)
         return p
 
+    def get_template_renderer(self):
+        if self.template_renderer is None:
+            from .templates import create_template_renderer
+            self.template_renderer = create_template_renderer(self)
+
+        return self.template_renderer
+
     def gen_vscode_launch_file(self):
         '''
         vscode launch file format:
         https://code.visualstudio.com/Docs/editor/debugging#_compound-launch-configurations
-        '''
-        launch_tpl = '''{
-  "version": "0.2.0",
-  "configurations": [
-      {% for info in debug_port_info_list %}
-    {
-      "type": "java",
-      "request": "attach",
-      "name": "{{ info.name }}",
-      "port": {{ info.port }}
-    }
-    {% endfor %}
-  ]
-}
         '''
         p = os.path.join(self.dest_dir, 'launch.json')
-        t = jinja2.Template(launch_tpl) 
         m = {
             "debug_port_info_list": self.debug_port_info_list
         }
-        s = t.render(m)
-        with io.open(p, 'w', encoding='UTF-8') as f:
-            f.write(s)
+        self.get_template_renderer().render_to_file('vscode/launch.json', p, m)
 
     def resolve_cmd(self, cmd):
 
@@ -169,19 +326,72 @@ class Context(object):
 
 
 
-def create_context(platform, work_dir, config_file, env):
-    if not os.path.isfile(config_file):
-        logging.error("config file %s is not exist", config_file)
-        return None
+def print_env(env):
+    print("")
+    if env is None:
+        print("not found any env file")
+    else:
+        print(f'env: {env}')
 
+
+def load_context(platform, work_dir, config_file, env_file=None, verbose=False, use_cache=True, env=None):
+    '''
+    合并配置文件(包括 include 的文件)、env 文件和系统环境变量, 解析后的配置缓存在 .pyrunjvm 下,
+    这些文件和配置里引用的系统环境变量都没有变化时直接使用缓存
+    env 是已经读取的环境变量, 不为 None 时不读取 env 文件
+    '''
     if not os.path.isabs(config_file):
         config_file = os.path.abspath(config_file)
 
-    toml = TOMLFile(config_file)
-    config = toml.read()
-    logging.debug('config file content:')
-    logging.debug(config)
+    # 缓存只记录 env 文件的变化, 传入 env 时不使用缓存
+    use_cache = use_cache and env is None
+    env_file_list = get_env_file_list(platform, work_dir, env_file)
+    cache = ConfigCache(os.path.join(work_dir, '.pyrunjvm', CACHE_FILE_NAME))
+    data = None
+    if use_cache and os.path.isfile(config_file):
+        data = cache.load(platform, work_dir, env_file_list)
+
+    try:
+        if data is not None:
+            print(f'use config cache {cache.path}')
+            print_env(data['env'])
+            context = Context(platform, work_dir, data['config'], data['env'])
+            context.env_file = data.get('env_file', None)
+            context.referenced_env_names = data['env_names']
+            return context
+
+        if env is None:
+            env, context_env_file = read_env_file(env_file_list, verbose)
+        else:
+            context_env_file = None
+        print_env(env)
+
+        try:
+            config, file_list = read_config(config_file)
+        except ConfigError as e:
+            logging.error(str(e))
+            return None
+
+        context = Context(platform, work_dir, config, env)
+        context.env_file = context_env_file
+        context.referenced_env_names = get_referenced_env_names(config, env)
+        # 和使用缓存时一样, 环境变量和 jvm_opts 都来自解析后的配置
+        context.set_config(context.resolve_config_tree(config), env)
+    except InterpolationError as e:
+        logging.error(str(e))
+        return None
+
+    if use_cache:
+        cache.save(
+            platform, work_dir, file_list, env_file_list, context.referenced_env_names,
+            context.config, env, context.env_file
+        )
 
-    return Context(
-        platform, work_dir, 
-        config, env)
\ No newline at end of file
+    return context
+
+
+def create_context(platform, work_dir, config_file, env):
+    '''
+    兼容旧版本的入口, env 是已经读取的环境变量 dict, 不读取 env 文件, 不使用缓存
+    '''
+    return load_context(platform, work_dir, config_file, use_cache=False, env=env or {})
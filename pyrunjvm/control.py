@@ -0,0 +1,185 @@
+import os
+import io
+import json
+import time
+import socket
+import asyncio
+import secrets
+
+from .supervisor import SupervisorError
+from .diagnostics import DiagnosticsError
+
+
+CONTROL_FILE_NAME = 'control.json'
+
+
+class ControlError(Exception):
+    pass
+
+
+def get_process_rss(pid):
+    '''
+    返回进程的 RSS(字节), 获取不到时返回 None
+    '''
+    if not pid:
+        return None
+
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+
+    status_file = f'/proc/{pid}/status'
+    if not os.path.isfile(status_file):
+        return None
+
+    try:
+        with io.open(status_file, 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return None
+
+
+class ControlServer(object):
+    '''
+    在 127.0.0.1 上监听的控制端口, 协议为一行 JSON 请求、一行 JSON 响应,
+    端口和 token 写在 .pyrunjvm/control.json 里
+    '''
+    def __init__(self, supervisor, dest_dir, diagnostics=None):
+        self.supervisor = supervisor
+        self.diagnostics = diagnostics
+        self.path = os.path.join(dest_dir, CONTROL_FILE_NAME)
+        self.token = secrets.token_hex(16)
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle_client, '127.0.0.1', 0
+        )
+        port = self.server.sockets[0].getsockname()[1]
+
+        data = {
+            'pid': os.getpid(),
+            'port': port,
+            'token': self.token,
+        }
+        # 文件里有 token, 创建时就只允许当前用户读写,
+        # 上次异常退出留下的文件权限可能不对, 先删除
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with io.open(fd, 'w', encoding='UTF-8') as f:
+            json.dump(data, f)
+
+    async def close(self):
+        if self.server is None:
+            return
+
+        self.server.close()
+        await self.server.wait_closed()
+        self.server = None
+        if os.path.isfile(self.path):
+            os.unlink(self.path)
+
+    async def handle_client(self, reader, writer):
+        try:
+            line = await reader.readline()
+            try:
+                request = json.loads(line.decode('utf-8'))
+                response = await self.handle_request(request)
+            except (ValueError, ControlError, SupervisorError, DiagnosticsError) as e:
+                response = {'ok': False, 'error': str(e)}
+
+            writer.write(json.dumps(response).encode('utf-8') + b'\n')
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def handle_request(self, request):
+        if not secrets.compare_digest(str(request.get('token', '')), self.token):
+            raise ControlError('invalid token')
+
+        cmd = request.get('cmd')
+        if cmd == 'status':
+            return {'ok': True, 'services': self.get_status()}
+
+        name = request.get('name')
+        if cmd == 'dump':
+            if self.diagnostics is None:
+                raise ControlError('diagnostics is not available')
+            timeout = request.get('timeout', None)
+            if timeout is not None:
+                timeout = float(timeout)
+                if timeout <= 0:
+                    raise ControlError('timeout must be greater than 0')
+            result = await self.diagnostics.dump(name, request.get('kinds'), timeout)
+            result['ok'] = True
+            return result
+
+        if cmd == 'stop':
+            self.supervisor.stop(name)
+        elif cmd == 'restart':
+            self.supervisor.restart(name)
+        else:
+            raise ControlError(f'unknown cmd {cmd}')
+
+        return {'ok': True}
+
+    def get_status(self):
+        service_list = []
+        now = time.time()
+        for item in self.supervisor.get_status():
+            item = dict(item)
+            item['uptime'] = None
+            if item['pid'] and item['start_time']:
+                item['uptime'] = now - item['start_time']
+            item['rss'] = get_process_rss(item['pid'])
+            service_list.append(item)
+        return service_list
+
+
+def send_command(dest_dir, cmd, name=None, socket_timeout=10, **kwargs):
+    '''
+    kwargs 是命令的其它参数, 如 dump 的 kinds 和 timeout,
+    socket_timeout 是等待响应的时间, 要大于命令执行的时间
+    '''
+    path = os.path.join(dest_dir, CONTROL_FILE_NAME)
+    if not os.path.isfile(path):
+        raise ControlError('pyrunjvm is not running in this directory')
+
+    with io.open(path, 'r', encoding='UTF-8') as f:
+        info = json.load(f)
+
+    request = {
+        'token': info['token'],
+        'cmd': cmd,
+        'name': name,
+    }
+    request.update(kwargs)
+    try:
+        with socket.create_connection(('127.0.0.1', info['port']), socket_timeout) as s:
+            s.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            f = s.makefile('rb')
+            line = f.readline()
+    except OSError as e:
+        raise ControlError(f'connect to pyrunjvm(pid {info["pid"]}) failed: {e}')
+
+    if not line.endswith(b'\n'):
+        # 服务端没有返回完整的一行就关闭了连接
+        raise ControlError(f'pyrunjvm(pid {info["pid"]}) closed the connection without a response')
+    try:
+        response = json.loads(line.decode('utf-8'))
+    except ValueError as e:
+        raise ControlError(f'invalid response from pyrunjvm(pid {info["pid"]}): {e}')
+
+    if not response.get('ok'):
+        raise ControlError(response.get('error'))
+
+    return response
@@ -0,0 +1,197 @@
+import os
+import time
+import asyncio
+
+from .util import mkdir, get_jdk_tool
+from .profiles import check_flag
+
+
+JFR_RECORDING_NAME = 'pyrunjvm'
+
+DEFAULT_JFR_MAX_SIZE = '250m'
+DEFAULT_JFR_MAX_AGE = '30m'
+DEFAULT_JFR_SETTINGS = 'default'
+
+DEFAULT_DUMP_TIMEOUT = 120
+
+# 类型 -> 保存的文件名
+DUMP_KINDS = {
+    'threads': 'threads.txt',
+    'histo': 'histo.txt',
+    'jfr': 'recording.jfr',
+}
+
+
+class DiagnosticsError(Exception):
+    pass
+
+
+def get_jfr_config(context):
+    return context.config.get('jfr', None) or {}
+
+
+def is_jfr_enable(context, config=None):
+    '''
+    项目或 tomcat 实例配置里的 jfr 优先于 [jfr] 的 enable 和命令行参数 --jfr
+    '''
+    if config is not None:
+        value = context.resolve_config_value(config.get('jfr', None))
+        if value is not None:
+            return bool(value)
+
+    jfr_config = get_jfr_config(context)
+    return bool(context.jfr or context.resolve_config_value(jfr_config.get('enable', False)))
+
+
+def get_jfr_jvm_args(context, name, config=None):
+    '''
+    持续记录的 JFR 参数, 记录只保存最近 max_size/max_age 的数据, 用 pyrunjvm dump <name> jfr 导出
+    '''
+    if not is_jfr_enable(context, config):
+        return []
+
+    jfr_config = get_jfr_config(context)
+
+    def get(key, default):
+        return context.resolve_config_value(jfr_config.get(key, default))
+
+    options = [
+        f'name={JFR_RECORDING_NAME}',
+        f'settings={get("settings", DEFAULT_JFR_SETTINGS)}',
+        f'maxsize={get("max_size", DEFAULT_JFR_MAX_SIZE)}',
+        f'maxage={get("max_age", DEFAULT_JFR_MAX_AGE)}',
+        'disk=true',
+    ]
+    arg = '-XX:StartFlightRecording=' + ','.join(options)
+
+    java_version = context.get_java_version()
+    if check_flag(arg, java_version):
+        print(f'{name}: jfr needs jdk 11+, current is jdk {java_version}, skip it')
+        return []
+    return [arg]
+
+
+def strip_pid_line(pid, out):
+    '''
+    jcmd 输出的第一行是 "<pid>:"
+    '''
+    lines = out.strip().splitlines()
+    if lines and lines[0].strip() == f'{pid}:':
+        lines = lines[1:]
+    return '\n'.join(lines).strip()
+
+
+def get_jcmd_args(kind, out_file):
+    if kind == 'threads':
+        return ['Thread.print', '-l']
+    if kind == 'histo':
+        return ['GC.class_histogram']
+    return ['JFR.dump', f'name={JFR_RECORDING_NAME}', f'filename={out_file}']
+
+
+class Diagnostics(object):
+    '''
+    通过 jcmd 导出运行中服务的线程栈、堆直方图和 JFR 记录,
+    保存到 .pyrunjvm/diagnostics/<service>/<时间>/ 下
+    name 可以是服务名(tomcat 实例名)或者项目名
+    '''
+    def __init__(self, supervisor, project_list, diagnostics_dir, jcmd_bin,
+                 timeout=DEFAULT_DUMP_TIMEOUT, env=None):
+        self.supervisor = supervisor
+        self.project_list = project_list
+        self.diagnostics_dir = diagnostics_dir
+        self.jcmd_bin = jcmd_bin
+        self.timeout = timeout
+        self.env = env
+
+    def find_proc(self, name):
+        proc = self.supervisor.proc_map.get(name, None)
+        if proc is None:
+            for project in self.project_list:
+                if project.name == name:
+                    proc = project.proc
+                    break
+
+        if proc is None:
+            raise DiagnosticsError(f'unknown service {name}')
+        if proc.returncode is not None:
+            raise DiagnosticsError(f'{name} is not running')
+        return proc
+
+    async def jcmd(self, pid, args, timeout=None):
+        '''
+        返回 (退出码, 输出), 超过 timeout 秒时 kill jcmd
+        '''
+        timeout = timeout or self.timeout
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                self.jcmd_bin, str(pid), *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                env=self.env,
+            )
+        except OSError as e:
+            raise DiagnosticsError(f'execute {self.jcmd_bin} failed: {e}')
+
+        try:
+            out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise DiagnosticsError(f'jcmd {args[0]} timeout after {timeout}s')
+
+        return proc.returncode, out.decode('utf-8', errors='replace')
+
+    async def dump_one(self, pid, kind, out_dir, timeout=None):
+        out_file = os.path.join(out_dir, DUMP_KINDS[kind])
+        returncode, out = await self.jcmd(pid, get_jcmd_args(kind, out_file), timeout)
+        if returncode != 0:
+            raise DiagnosticsError(f'jcmd exit code {returncode}: {strip_pid_line(pid, out)}')
+
+        if kind == 'jfr':
+            # 文件由 jvm 写入, 失败时 jcmd 的退出码也是 0
+            if not os.path.isfile(out_file):
+                raise DiagnosticsError(
+                    f'{strip_pid_line(pid, out) or "no recording is dumped"}, '
+                    'start pyrunjvm with --jfr or [jfr] enable = true'
+                )
+        else:
+            with open(out_file, 'w', encoding='UTF-8') as f:
+                f.write(out)
+
+        return out_file
+
+    async def dump(self, name, kinds, timeout=None):
+        '''
+        timeout 是每次执行 jcmd 的超时时间, 默认 DEFAULT_DUMP_TIMEOUT
+        返回 {'dir': 目录, 'files': {类型: 文件}, 'errors': {类型: 原因}}
+        '''
+        kinds = kinds or ['threads']
+        for kind in kinds:
+            if kind not in DUMP_KINDS:
+                raise DiagnosticsError(
+                    f'unknown dump type {kind}, must be one of {", ".join(DUMP_KINDS)}'
+                )
+
+        proc = self.find_proc(name)
+        out_dir = os.path.join(
+            self.diagnostics_dir, name, time.strftime('%Y%m%d-%H%M%S')
+        )
+        mkdir(out_dir, True)
+
+        result = {'dir': out_dir, 'files': {}, 'errors': {}}
+        for kind in kinds:
+            try:
+                result['files'][kind] = await self.dump_one(proc.pid, kind, out_dir, timeout)
+            except DiagnosticsError as e:
+                result['errors'][kind] = str(e)
+        return result
+
+
+def create_diagnostics(context, supervisor):
+    return Diagnostics(
+        supervisor, context.project_list,
+        os.path.join(context.dest_dir, 'diagnostics'),
+        get_jdk_tool(context.java_bin, 'jcmd'),
+        env=context.environ,
+    )
@@ -0,0 +1,236 @@
+import os
+import io
+import json
+import shutil
+import hashlib
+import zipfile
+
+from .util import mkdir, file_digest
+
+
+LAUNCH_MODES = ('jar', 'exploded')
+
+STATE_VERSION = 1
+STATE_FILE_NAME = 'state.json'
+CLASSES_JAR_NAME = 'classes.jar'
+LIB_DIR_NAME = 'lib'
+
+
+class ExplodeError(Exception):
+    pass
+
+
+def parse_manifest(text):
+    '''
+    解析 MANIFEST.MF, 以空格开头的行是上一行的续行
+    '''
+    result = {}
+    key = None
+    for line in text.splitlines():
+        if line.startswith(' ') and key is not None:
+            result[key] += line[1:]
+            continue
+
+        key, sep, value = line.partition(':')
+        if not sep:
+            key = None
+            continue
+        key = key.strip()
+        result[key] = value.strip()
+
+    return result
+
+
+def parse_classpath_index(text):
+    '''
+    解析 spring boot 的 classpath.idx, 每行的格式为: - "BOOT-INF/lib/xxx.jar"
+    '''
+    result = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('- '):
+            result.append(line[2:].strip().strip('"'))
+    return result
+
+
+class ExplodedJar(object):
+    '''
+    把 spring boot 的 fat jar 解压到 dest_dir, 用 classpath + Start-Class 启动, 跳过 nested jar 的加载:
+      classes.jar  BOOT-INF/classes 重新打包成的不压缩的 jar(CDS 不支持 classpath 里有目录)
+      lib/         BOOT-INF/lib 下的 jar
+    jar 的 size/mtime 没有变化时不读取 jar, 内容变化时只重写 CRC 变化的文件,
+    没有变化的文件保持 mtime 不变, 已生成的 CDS 归档仍然可用
+    '''
+    def __init__(self, jar_path, dest_dir):
+        self.jar_path = jar_path
+        self.dest_dir = dest_dir
+        self.state_file = os.path.join(dest_dir, STATE_FILE_NAME)
+        self.state = {}
+
+        self.main_class = None
+        self.class_path = []
+
+    def load_state(self):
+        self.state = {}
+        if not os.path.isfile(self.state_file):
+            return
+
+        try:
+            with io.open(self.state_file, 'r', encoding='UTF-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if state.get('version') == STATE_VERSION:
+            self.state = state
+
+    def save_state(self):
+        tmp = self.state_file + '.tmp'
+        with io.open(tmp, 'w', encoding='UTF-8') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.state_file)
+
+    def use_state(self):
+        self.main_class = self.state['main_class']
+        self.class_path = [
+            os.path.join(self.dest_dir, p) for p in self.state['class_path']
+        ]
+
+    def is_up_to_date(self, st):
+        if not self.state:
+            return False
+
+        for p in self.state.get('class_path', []):
+            if not os.path.isfile(os.path.join(self.dest_dir, p)):
+                return False
+
+        if self.state.get('size') == st.st_size and self.state.get('mtime') == st.st_mtime_ns:
+            return True
+
+        # 只是 mtime 变了(如重新构建但内容相同)
+        if self.state.get('digest') == file_digest(self.jar_path):
+            self.state['size'] = st.st_size
+            self.state['mtime'] = st.st_mtime_ns
+            self.save_state()
+            return True
+
+        return False
+
+    def extract(self):
+        '''
+        返回 True 表示有文件被重新解压
+        '''
+        if not os.path.isfile(self.jar_path):
+            raise ExplodeError(f'{self.jar_path} is not exist')
+
+        mkdir(self.dest_dir, True)
+        self.load_state()
+        st = os.stat(self.jar_path)
+        if self.is_up_to_date(st):
+            self.use_state()
+            return False
+
+        try:
+            with zipfile.ZipFile(self.jar_path) as zf:
+                changed = self._extract(zf)
+        except zipfile.BadZipFile as e:
+            raise ExplodeError(f'{self.jar_path} is not a valid jar: {e}')
+
+        self.state['version'] = STATE_VERSION
+        self.state['size'] = st.st_size
+        self.state['mtime'] = st.st_mtime_ns
+        self.state['digest'] = file_digest(self.jar_path)
+        self.save_state()
+        self.use_state()
+        return changed
+
+    def _extract(self, zf):
+        try:
+            manifest = parse_manifest(
+                zf.read('META-INF/MANIFEST.MF').decode('utf-8', errors='replace')
+            )
+        except KeyError:
+            raise ExplodeError(f'{self.jar_path} has no META-INF/MANIFEST.MF')
+
+        main_class = manifest.get('Start-Class', None)
+        if not main_class:
+            raise ExplodeError(f'{self.jar_path} is not a spring boot jar, Start-Class not found in MANIFEST.MF')
+
+        classes_prefix = manifest.get('Spring-Boot-Classes', 'BOOT-INF/classes/')
+        lib_prefix = manifest.get('Spring-Boot-Lib', 'BOOT-INF/lib/')
+
+        classes_list = []
+        lib_map = {}
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            if info.filename.startswith(classes_prefix):
+                classes_list.append(info)
+            elif info.filename.startswith(lib_prefix) and info.filename.endswith('.jar'):
+                lib_map[info.filename] = info
+
+        changed = self._extract_lib(zf, lib_map)
+        changed = self._pack_classes(zf, classes_list, classes_prefix) or changed
+
+        # 按 classpath.idx 的顺序, 没有时按 jar 里的顺序
+        lib_order = list(lib_map)
+        index = manifest.get('Spring-Boot-Classpath-Index', None)
+        if index and index in zf.namelist():
+            index_list = [
+                p for p in parse_classpath_index(zf.read(index).decode('utf-8')) if p in lib_map
+            ]
+            lib_order = index_list + [p for p in lib_order if p not in index_list]
+
+        class_path = [CLASSES_JAR_NAME]
+        for p in lib_order:
+            class_path.append(f'{LIB_DIR_NAME}/{os.path.basename(p)}')
+
+        self.state['main_class'] = main_class
+        self.state['class_path'] = class_path
+        return changed
+
+    def _extract_lib(self, zf, lib_map):
+        lib_dir = os.path.join(self.dest_dir, LIB_DIR_NAME)
+        mkdir(lib_dir, True)
+
+        old_lib = self.state.get('lib', {})
+        new_lib = {}
+        changed = False
+        for info in lib_map.values():
+            name = os.path.basename(info.filename)
+            new_lib[name] = [info.CRC, info.file_size]
+            p = os.path.join(lib_dir, name)
+            if old_lib.get(name) == new_lib[name] and os.path.isfile(p):
+                continue
+
+            with zf.open(info) as src, io.open(p, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            changed = True
+
+        for name in os.listdir(lib_dir):
+            if name not in new_lib:
+                os.unlink(os.path.join(lib_dir, name))
+                changed = True
+
+        self.state['lib'] = new_lib
+        return changed
+
+    def _pack_classes(self, zf, classes_list, prefix):
+        h = hashlib.sha1()
+        for info in classes_list:
+            h.update(f'{info.filename}\0{info.CRC}\0'.encode('utf-8'))
+        digest = h.hexdigest()
+
+        p = os.path.join(self.dest_dir, CLASSES_JAR_NAME)
+        if self.state.get('classes') == digest and os.path.isfile(p):
+            return False
+
+        tmp = p + '.tmp'
+        with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_STORED) as out:
+            for info in classes_list:
+                new_info = zipfile.ZipInfo(info.filename[len(prefix):], info.date_time)
+                out.writestr(new_info, zf.read(info))
+        os.replace(tmp, p)
+
+        self.state['classes'] = digest
+        return True
@@ -0,0 +1,128 @@
+import os
+import io
+import glob
+import json
+import time
+import fnmatch
+import hashlib
+
+from .util import file_digest
+
+
+CACHE_VERSION = 1
+
+FINGERPRINT_MODES = ('mtime', 'hash')
+
+
+def collect_files(base_dir, patterns):
+    '''
+    patterns 支持 glob 的 ** 写法，以 ! 开头的表示排除
+    '''
+    include_list = []
+    exclude_list = []
+    for pattern in patterns:
+        pattern = str(pattern)
+        if pattern.startswith('!'):
+            exclude_list.append(pattern[1:])
+        else:
+            include_list.append(pattern)
+
+    file_set = set()
+    for pattern in include_list:
+        if not os.path.isabs(pattern):
+            pattern = os.path.join(base_dir, pattern)
+
+        for p in glob.iglob(pattern, recursive=True):
+            if os.path.isfile(p):
+                file_set.add(os.path.normpath(p))
+
+    file_list = []
+    for p in sorted(file_set):
+        rel = os.path.relpath(p, base_dir).replace(os.sep, '/')
+        if any(fnmatch.fnmatch(rel, e) for e in exclude_list):
+            continue
+        file_list.append((rel, p))
+
+    return file_list
+
+
+def compute_fingerprint(base_dir, patterns, cmds, env=None, mode='mtime'):
+    if mode not in FINGERPRINT_MODES:
+        raise ValueError(f'unknown fingerprint mode {mode}')
+
+    h = hashlib.sha1()
+    for cmd in cmds:
+        h.update(b'cmd\0')
+        h.update(str(cmd).encode('utf-8'))
+        h.update(b'\0')
+
+    if env:
+        for k in sorted(env):
+            h.update(f'env\0{k}={env[k]}\0'.encode('utf-8'))
+
+    for rel, p in collect_files(base_dir, patterns):
+        h.update(b'file\0')
+        h.update(rel.encode('utf-8'))
+        if mode == 'hash':
+            h.update(file_digest(p).encode('ascii'))
+        else:
+            st = os.stat(p)
+            h.update(f'{st.st_size}:{st.st_mtime_ns}'.encode('ascii'))
+        h.update(b'\0')
+
+    return h.hexdigest()
+
+
+class BuildCache(object):
+    def __init__(self, path):
+        self.path = path
+        self.task_map = {}
+        self.changed = False
+
+        self.load()
+
+    def load(self):
+        if not os.path.isfile(self.path):
+            return
+
+        try:
+            with io.open(self.path, 'r', encoding='UTF-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get('version') != CACHE_VERSION:
+            return
+
+        self.task_map = data.get('tasks', {})
+
+    def get(self, name):
+        item = self.task_map.get(name, None)
+        if item is None:
+            return None
+        return item.get('fingerprint')
+
+    def set(self, name, fingerprint):
+        self.task_map[name] = {
+            'fingerprint': fingerprint,
+            'time': time.time(),
+        }
+        self.changed = True
+
+    def remove(self, name):
+        if self.task_map.pop(name, None) is not None:
+            self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+
+        data = {
+            'version': CACHE_VERSION,
+            'tasks': self.task_map,
+        }
+        tmp = self.path + '.tmp'
+        with io.open(tmp, 'w', encoding='UTF-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+        self.changed = False
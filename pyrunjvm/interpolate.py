@@ -0,0 +1,181 @@
+import re
+
+
+# $$ 转义为 $, 支持 $NAME、${NAME} 和 ${NAME:-default}
+TOKEN_RE = re.compile(r'\$(?:(\$)|([A-Za-z_][A-Za-z0-9_]*)|\{([A-Za-z_][A-Za-z0-9_]*)(?:(:-)|\}))')
+
+
+class InterpolationError(Exception):
+    pass
+
+
+# $$ 编译后的标记
+ESCAPE = object()
+
+
+class Var(object):
+    def __init__(self, name, text, default=None):
+        self.name = name
+        # 解析不到时原样输出
+        self.text = text
+        # 编译后的默认值, None 表示没有默认值
+        self.default = default
+
+
+def find_close_brace(text, pos):
+    '''
+    返回与 ${ 匹配的 } 的位置, 默认值里可以嵌套 ${...}
+    '''
+    depth = 1
+    while pos < len(text):
+        c = text[pos]
+        if c == '$' and text.startswith('${', pos):
+            depth += 1
+            pos += 2
+            continue
+        if c == '}':
+            depth -= 1
+            if depth == 0:
+                return pos
+        pos += 1
+    return -1
+
+
+def compile_template(text):
+    '''
+    把字符串编译为由 str、Var 和 ESCAPE 组成的列表
+    '''
+    parts = []
+    pos = 0
+    while True:
+        m = TOKEN_RE.search(text, pos)
+        if m is None:
+            break
+
+        if m.start() > pos:
+            parts.append(text[pos:m.start()])
+
+        escape, name, brace_name, has_default = m.groups()
+        if escape:
+            parts.append(ESCAPE)
+            pos = m.end()
+        elif name:
+            parts.append(Var(name, m.group(0)))
+            pos = m.end()
+        elif has_default:
+            end = find_close_brace(text, m.end())
+            if end < 0:
+                # 没有闭合的 }, 原样输出
+                parts.append(text[m.start():])
+                pos = len(text)
+                break
+            default = compile_template(text[m.end():end])
+            parts.append(Var(brace_name, text[m.start():end + 1], default))
+            pos = end + 1
+        else:
+            parts.append(Var(brace_name, m.group(0)))
+            pos = m.end()
+
+    if pos < len(text):
+        parts.append(text[pos:])
+
+    return parts
+
+
+class Resolver(object):
+    '''
+    按 layer_list 的顺序查找变量(前面的优先), 变量的值里引用的变量会递归解析,
+    解析结果会被缓存. 变量引用正在解析的自己时(如 PATH=${PATH}:/opt/bin)使用下面一层的值,
+    下面的层里没有时和其它循环引用一样抛出 InterpolationError.
+    keep_escape 为 True 时 $$ 保持不变, 结果可以再次解析而不改变含义
+    '''
+    def __init__(self, layer_list, keep_escape=False):
+        self.layer_list = layer_list
+        self.keep_escape = keep_escape
+        self._template_cache = {}
+        self._value_cache = {}
+        # [(变量名, 值所在的层)]
+        self._stack = []
+        # 解析时用到的下一层的值属于调用栈的哪一项, 用到了外面的项时结果和调用栈有关, 不缓存
+        self._shadow_pos = None
+
+    def lookup(self, name, start=0):
+        '''
+        从第 start 层开始查找, 返回 (值, 所在的层), 找不到时返回 (None, -1)
+        '''
+        for i in range(start, len(self.layer_list)):
+            value = self.layer_list[i].get(name, None)
+            if value is None:
+                continue
+            if isinstance(value, str):
+                return value, i
+            if isinstance(value, (int, float)):
+                return str(value), i
+        return None, -1
+
+    def compile(self, text):
+        parts = self._template_cache.get(text, None)
+        if parts is None:
+            parts = self._template_cache[text] = compile_template(text)
+        return parts
+
+    def resolve_var(self, name):
+        '''
+        返回变量解析后的值, 变量不存在时返回 None
+        '''
+        depth = len(self._stack)
+        start = 0
+        shadow_pos = None
+        for pos in range(depth - 1, -1, -1):
+            if self._stack[pos][0] == name:
+                start = self._stack[pos][1] + 1
+                shadow_pos = pos
+                break
+        else:
+            if name in self._value_cache:
+                return self._value_cache[name]
+
+        value, index = self.lookup(name, start)
+        if shadow_pos is not None and value is None:
+            cycle = [n for n, _ in self._stack[shadow_pos:]] + [name]
+            raise InterpolationError('variable has cycle: %s' % ' -> '.join(cycle))
+
+        outer_pos = self._shadow_pos
+        self._shadow_pos = None
+        if value is not None and '$' in value:
+            self._stack.append((name, index))
+            try:
+                value = self.render(self.compile(value))
+            finally:
+                self._stack.pop()
+        inner_pos = self._shadow_pos
+
+        if shadow_pos is None and (inner_pos is None or inner_pos >= depth):
+            self._value_cache[name] = value
+
+        pos_list = [p for p in (outer_pos, inner_pos, shadow_pos) if p is not None]
+        self._shadow_pos = min(pos_list) if pos_list else None
+        return value
+
+    def render(self, parts):
+        result = []
+        for p in parts:
+            if p is ESCAPE:
+                result.append('$$' if self.keep_escape else '$')
+                continue
+            if not isinstance(p, Var):
+                result.append(p)
+                continue
+
+            value = self.resolve_var(p.name)
+            if value is None or (value == '' and p.default is not None):
+                value = p.text if p.default is None else self.render(p.default)
+            result.append(value)
+
+        return ''.join(result)
+
+    def resolve(self, text):
+        if '$' not in text:
+            return text
+        self._shadow_pos = None
+        return self.render(self.compile(text))
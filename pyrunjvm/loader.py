@@ -0,0 +1,255 @@
+import os
+import io
+import re
+import json
+import hashlib
+from collections.abc import Mapping
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+CACHE_VERSION = 2
+CACHE_FILE_NAME = 'config_cache.json'
+
+VAR_RE = re.compile(r'\$\{?([A-Za-z_][A-Za-z0-9_]*)')
+
+
+class ConfigError(Exception):
+    pass
+
+
+def to_plain(value):
+    '''
+    把 tomlkit 的 item 对象转换为普通的 dict/list/str/int...
+    '''
+    if isinstance(value, Mapping):
+        return dict((str(k), to_plain(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [to_plain(v) for v in value]
+    if isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    if isinstance(value, str):
+        return str(value)
+    return value
+
+
+def read_toml_file(path):
+    try:
+        if tomllib is not None:
+            with io.open(path, 'rb') as f:
+                return tomllib.load(f)
+
+        import tomlkit
+        with io.open(path, 'r', encoding='UTF-8') as f:
+            return to_plain(tomlkit.parse(f.read()))
+    except OSError as e:
+        raise ConfigError(f'read config file {path} failed: {e}')
+    except Exception as e:
+        raise ConfigError(f'parse config file {path} failed: {e}')
+
+
+def merge_config(base, override):
+    '''
+    table 递归合并, 表数组(如 [[projects]]) 依次拼接, 其它值由 override 覆盖
+    '''
+    result = dict(base)
+    for k, v in override.items():
+        old = result.get(k, None)
+        if isinstance(old, dict) and isinstance(v, dict):
+            result[k] = merge_config(old, v)
+        elif is_table_array(old) and is_table_array(v):
+            result[k] = old + v
+        else:
+            result[k] = v
+    return result
+
+
+def is_table_array(value):
+    return isinstance(value, list) and value and all(isinstance(v, dict) for v in value)
+
+
+def read_config(path, file_list=None, _stack=None):
+    '''
+    读取配置文件, 先合并 include 的文件(相对当前文件所在目录), 再用当前文件的值覆盖,
+    返回 (config, file_list), file_list 是读取过的所有文件
+    '''
+    path = os.path.abspath(os.path.expanduser(path))
+    if file_list is None:
+        file_list = []
+    if _stack is None:
+        _stack = []
+
+    if path in _stack:
+        raise ConfigError('include has cycle: %s' % ' -> '.join(_stack + [path]))
+
+    if not os.path.isfile(path):
+        raise ConfigError(f'config file {path} is not exist')
+
+    file_list.append(path)
+    config = read_toml_file(path)
+
+    include = config.pop('include', None) or []
+    if isinstance(include, str):
+        include = [include]
+
+    result = {}
+    base_dir = os.path.dirname(path)
+    for p in include:
+        p = os.path.expanduser(os.path.expandvars(str(p)))
+        if not os.path.isabs(p):
+            p = os.path.join(base_dir, p)
+        included, _ = read_config(p, file_list, _stack + [path])
+        result = merge_config(result, included)
+
+    return merge_config(result, config), file_list
+
+
+def get_env_file_list(platform, work_dir, env_file=None):
+    if env_file:
+        return [env_file]
+
+    return [
+        os.path.join(work_dir, '.env.' + platform),
+        os.path.join(work_dir, '.env'),
+    ]
+
+
+def read_env_file(env_file_list, verbose=False):
+    '''
+    返回第一个存在的 env 文件的 (内容, 路径), 都不存在时返回 (None, None)
+    '''
+    from dotenv import dotenv_values
+
+    for item in env_file_list:
+        print(f"check env file {item}")
+        if os.path.isfile(item):
+            # 变量由 Context 统一解析
+            return dotenv_values(item, verbose=verbose, interpolate=False), item
+
+    return None, None
+
+
+def find_var_names(value, result=None):
+    '''
+    返回 value 里所有字符串引用的变量名($NAME 或 ${NAME})
+    '''
+    if result is None:
+        result = set()
+
+    if isinstance(value, dict):
+        for v in value.values():
+            find_var_names(v, result)
+    elif isinstance(value, list):
+        for v in value:
+            find_var_names(v, result)
+    elif isinstance(value, str):
+        result.update(VAR_RE.findall(value))
+
+    return result
+
+
+def get_referenced_env_names(config, env, environ=None):
+    '''
+    配置和 env 文件引用的系统环境变量名, 包括这些环境变量的值里间接引用的
+    '''
+    if environ is None:
+        environ = os.environ
+
+    names = find_var_names([config, env or {}])
+    pending = list(names)
+    while pending:
+        value = environ.get(pending.pop(), None)
+        if value is None:
+            continue
+        for name in VAR_RE.findall(value):
+            if name not in names:
+                names.add(name)
+                pending.append(name)
+
+    return sorted(names)
+
+
+def stat_file(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    return [st.st_mtime_ns, st.st_size]
+
+
+class ConfigCache(object):
+    '''
+    缓存合并、解析后的配置, key 由配置文件、include 文件、env 文件的 mtime/size,
+    以及配置里引用的系统环境变量计算, 任意一个变化后重新读取
+    '''
+    def __init__(self, path):
+        self.path = path
+
+    def get_key(self, platform, work_dir, file_list, env_names, environ=None):
+        if environ is None:
+            environ = os.environ
+
+        return hashlib.sha1(json.dumps([
+            CACHE_VERSION, platform, work_dir,
+            [[p, stat_file(p)] for p in file_list],
+            [[k, environ.get(k, None)] for k in env_names],
+        ]).encode('utf-8')).hexdigest()
+
+    def load(self, platform, work_dir, env_file_list):
+        if not os.path.isfile(self.path):
+            return None
+
+        try:
+            with io.open(self.path, 'r', encoding='UTF-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if data.get('version') != CACHE_VERSION:
+            return None
+
+        if data.get('env_file_list') != env_file_list:
+            return None
+
+        key = self.get_key(
+            platform, work_dir, data.get('file_list', []) + env_file_list,
+            data.get('env_names', [])
+        )
+        if data.get('key') != key:
+            return None
+
+        return data
+
+    def save(self, platform, work_dir, file_list, env_file_list, env_names, config, env, env_file=None):
+        data = {
+            'version': CACHE_VERSION,
+            'key': self.get_key(platform, work_dir, file_list + env_file_list, env_names),
+            'file_list': file_list,
+            'env_file_list': env_file_list,
+            'env_names': env_names,
+            'config': config,
+            'env': env,
+            'env_file': env_file,
+        }
+        try:
+            text = json.dumps(data, indent=1)
+        except (TypeError, ValueError):
+            # 配置里有 json 不支持的值(如日期), 不缓存
+            return False
+
+        tmp = self.path + '.tmp'
+        with io.open(tmp, 'w', encoding='UTF-8') as f:
+            f.write(text)
+        os.replace(tmp, self.path)
+        return True
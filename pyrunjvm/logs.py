@@ -0,0 +1,265 @@
+import os
+import io
+import sys
+import time
+import queue
+import asyncio
+import threading
+
+
+COLOR_LIST = (
+    '\033[36m', '\033[32m', '\033[33m', '\033[35m', '\033[34m',
+    '\033[96m', '\033[92m', '\033[93m', '\033[95m', '\033[94m',
+)
+COLOR_RESET = '\033[0m'
+
+READ_CHUNK_SIZE = 64 * 1024
+
+SIZE_UNITS = {
+    'K': 1024,
+    'M': 1024 * 1024,
+    'G': 1024 * 1024 * 1024,
+}
+
+
+def parse_size(value):
+    '''
+    支持 1024, "512K", "50MB", "1G" 这样的写法
+    '''
+    if value is None or value == '':
+        return 0
+
+    if isinstance(value, int):
+        return value
+
+    s = str(value).strip().upper()
+    if s.endswith('B'):
+        s = s[:-1]
+
+    unit = 1
+    if s and s[-1] in SIZE_UNITS:
+        unit = SIZE_UNITS[s[-1]]
+        s = s[:-1]
+
+    return int(float(s) * unit)
+
+
+class RotatingLogFile(object):
+    '''
+    按大小(max_bytes)或时间(interval 秒)轮转的日志文件,
+    打开时如果已经有内容, 先轮转一次, 保留上次运行的日志
+    '''
+    def __init__(self, path, max_bytes=0, backup_count=5, interval=0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.interval = interval
+
+        self._file = None
+        self._size = 0
+        self._open_time = 0
+
+    def open(self):
+        if os.path.isfile(self.path) and os.path.getsize(self.path) > 0:
+            self.rotate_file()
+
+        self._open()
+        return self
+
+    def _open(self):
+        self._file = io.open(self.path, 'ab')
+        self._size = self._file.tell()
+        self._open_time = time.monotonic()
+
+    def rotate_file(self):
+        if self.backup_count < 1:
+            os.unlink(self.path)
+            return
+
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f'{self.path}.{i}'
+            if os.path.exists(src):
+                os.replace(src, f'{self.path}.{i + 1}')
+        os.replace(self.path, f'{self.path}.1')
+
+    def rotate(self):
+        self.close()
+        self.rotate_file()
+        self._open()
+
+    def need_rotate(self):
+        if self._size == 0:
+            return False
+
+        if self.max_bytes > 0 and self._size >= self.max_bytes:
+            return True
+
+        if self.interval > 0 and time.monotonic() - self._open_time >= self.interval:
+            return True
+
+        return False
+
+    def write(self, data):
+        if self.need_rotate():
+            self.rotate()
+
+        self._file.write(data)
+        # 就绪检查会读取日志文件
+        self._file.flush()
+        self._size += len(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ConsoleWriter(object):
+    '''
+    在单独的线程里输出合并后的日志, 队列满时丢弃日志,
+    控制台输出慢时不会阻塞读取 jvm 的输出
+    '''
+    def __init__(self, name_filter=None, color=None, max_queue=10000):
+        self.name_filter = set(name_filter or [])
+        if color is None:
+            color = sys.stdout.isatty() and 'NO_COLOR' not in os.environ
+        self.color = color
+
+        self._queue = queue.Queue(max_queue)
+        self._color_map = {}
+        self._dropped = 0
+        self._thread = None
+
+    def enabled(self, name):
+        return not self.name_filter or name in self.name_filter
+
+    def get_prefix(self, name):
+        prefix = self._color_map.get(name, None)
+        if prefix is None:
+            prefix = f'{name} | '
+            if self.color:
+                color = COLOR_LIST[len(self._color_map) % len(COLOR_LIST)]
+                prefix = f'{color}{name}{COLOR_RESET} | '
+            self._color_map[name] = prefix
+        return prefix
+
+    def put(self, name, line):
+        if not self.enabled(name):
+            return
+
+        try:
+            self._queue.put_nowait(self.get_prefix(name) + line)
+        except queue.Full:
+            self._dropped += 1
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            line = self._queue.get()
+            if line is None:
+                break
+
+            if self._dropped:
+                dropped, self._dropped = self._dropped, 0
+                sys.stdout.write(f'... {dropped} lines dropped, console is too slow\n')
+            sys.stdout.write(line + '\n')
+            if self._queue.empty():
+                sys.stdout.flush()
+
+        sys.stdout.flush()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        # 这里阻塞等待, 保证退出前把剩下的日志输出
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+
+class LogMultiplexer(object):
+    def __init__(self, max_bytes=0, backup_count=5, interval=0, console=None):
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.interval = interval
+        self.console = console
+
+        self.file_map = {}
+        self.task_list = []
+
+    def open(self, name, path):
+        log_file = self.file_map.get(name, None)
+        if log_file is None:
+            log_file = RotatingLogFile(
+                path, self.max_bytes, self.backup_count, self.interval
+            ).open()
+            self.file_map[name] = log_file
+
+        if self.console is not None:
+            self.console.start()
+
+        return log_file
+
+    def attach(self, name, proc):
+        '''
+        proc 需要以 stdout=PIPE, stderr=STDOUT 启动
+        '''
+        task = asyncio.ensure_future(self._pump(name, proc.stdout))
+        self.task_list.append(task)
+        return task
+
+    async def _pump(self, name, stream):
+        log_file = self.file_map[name]
+        tail = b''
+        while True:
+            data = await stream.read(READ_CHUNK_SIZE)
+            if not data:
+                break
+
+            log_file.write(data)
+            if self.console is None or not self.console.enabled(name):
+                continue
+
+            lines = (tail + data).split(b'\n')
+            tail = lines.pop()
+            for line in lines:
+                self.console.put(name, line.rstrip(b'\r').decode('utf-8', errors='replace'))
+
+        if tail and self.console is not None:
+            self.console.put(name, tail.decode('utf-8', errors='replace'))
+
+    async def close(self):
+        if self.task_list:
+            await asyncio.gather(*self.task_list, return_exceptions=True)
+
+        for log_file in self.file_map.values():
+            log_file.close()
+
+        if self.console is not None:
+            self.console.stop()
+
+
+def create_log_multiplexer(context):
+    config = context.config.get('log', None) or {}
+
+    def get(key, default):
+        return context.resolve_config_value(config.get(key, default))
+
+    console = None
+    if context.log_follow or get('console', False):
+        name_filter = list(context.log_filter or get('filter', []))
+        console = ConsoleWriter(name_filter, get('color', None))
+
+    return LogMultiplexer(
+        max_bytes=parse_size(get('max_size', '100MB')),
+        backup_count=int(get('backup_count', 5)),
+        interval=float(get('rotate_interval', 0)),
+        console=console,
+    )
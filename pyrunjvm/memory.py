@@ -0,0 +1,264 @@
+import re
+import sys
+
+
+MB = 1024 * 1024
+
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)b?\s*$', re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': MB, 'g': 1024 * MB, 't': 1024 * 1024 * MB}
+
+DEFAULT_METASPACE = '128m'
+DEFAULT_CODE_CACHE = '64m'
+# 线程栈、GC 数据结构等堆外内存
+DEFAULT_OVERHEAD = '96m'
+DEFAULT_MIN_HEAP = '64m'
+
+# jvm 参数前缀 -> 内存项
+SIZE_FLAGS = (
+    ('-Xmx', 'heap'),
+    ('-XX:MaxHeapSize=', 'heap'),
+    ('-XX:MaxMetaspaceSize=', 'metaspace'),
+    ('-XX:ReservedCodeCacheSize=', 'code_cache'),
+)
+
+
+class MemoryBudgetError(Exception):
+    pass
+
+
+def parse_size(value):
+    '''
+    512m、2g、1.5G、1048576 -> 字节数
+    '''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+
+    m = SIZE_RE.match(str(value))
+    if m is None:
+        raise MemoryBudgetError(f'invalid memory size {value}')
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2).lower()])
+
+
+def format_size(value):
+    if value >= 1024 * MB and value % (1024 * MB) == 0:
+        return f'{value // (1024 * MB)}g'
+    return f'{value // MB}m'
+
+
+def get_jvm_sizes(jvm_args):
+    '''
+    返回 jvm 参数里已经指定的 {heap, metaspace, code_cache}
+    '''
+    result = {}
+    for arg in jvm_args or []:
+        for prefix, key in SIZE_FLAGS:
+            if arg.startswith(prefix):
+                try:
+                    result[key] = parse_size(arg[len(prefix):])
+                except MemoryBudgetError:
+                    pass
+    return result
+
+
+class MemoryRequest(object):
+    '''
+    一个 jvm 进程的内存需求, jvm_args 里已经指定的大小保持不变, 不参与分配
+    '''
+    def __init__(self, name, jvm_args=None, weight=1, min_heap=None):
+        self.name = name
+        try:
+            self.weight = float(weight)
+        except (TypeError, ValueError):
+            self.weight = 0
+        # 权重为 0 时无法按比例分配
+        if not self.weight > 0:
+            raise MemoryBudgetError(f'memory_weight must be a positive number, but it is {weight!r}')
+        self.min_heap = None if min_heap is None else parse_size(min_heap)
+        self.fixed = get_jvm_sizes(jvm_args)
+
+
+class MemoryAllocation(object):
+    def __init__(self, name, heap, metaspace, code_cache, overhead, fixed):
+        self.name = name
+        self.heap = heap
+        self.metaspace = metaspace
+        self.code_cache = code_cache
+        self.overhead = overhead
+        # jvm 参数里已经指定的项
+        self.fixed = fixed
+
+    @property
+    def total(self):
+        return self.heap + self.metaspace + self.code_cache + self.overhead
+
+    def get_jvm_args(self):
+        '''
+        只返回 jvm 参数里没有指定的项
+        '''
+        args = []
+        if 'heap' not in self.fixed:
+            args.append(f'-Xmx{format_size(self.heap)}')
+        if 'metaspace' not in self.fixed:
+            args.append(f'-XX:MaxMetaspaceSize={format_size(self.metaspace)}')
+        if 'code_cache' not in self.fixed:
+            args.append(f'-XX:ReservedCodeCacheSize={format_size(self.code_cache)}')
+        return args
+
+
+class MemoryPlanner(object):
+    '''
+    把 budget 分配给所有 jvm 进程: 先扣除每个进程的元空间、代码缓存、堆外开销和已经指定的堆大小,
+    剩下的按 weight 分配为堆, 分到的堆小于 min_heap 的进程使用 min_heap, 其余的进程重新按 weight 分配
+    '''
+    def __init__(self, budget, metaspace=DEFAULT_METASPACE, code_cache=DEFAULT_CODE_CACHE,
+                 overhead=DEFAULT_OVERHEAD, min_heap=DEFAULT_MIN_HEAP):
+        self.budget = parse_size(budget)
+        self.metaspace = parse_size(metaspace)
+        self.code_cache = parse_size(code_cache)
+        self.overhead = parse_size(overhead)
+        self.min_heap = parse_size(min_heap)
+
+    def plan(self, request_list):
+        allocation_map = {}
+        rest = self.budget
+        flexible = []
+        for r in request_list:
+            a = MemoryAllocation(
+                r.name, r.fixed.get('heap', 0),
+                r.fixed.get('metaspace', self.metaspace),
+                r.fixed.get('code_cache', self.code_cache),
+                self.overhead, r.fixed,
+            )
+            allocation_map[r.name] = a
+            rest -= a.total
+            if 'heap' not in r.fixed:
+                flexible.append(r)
+
+        # 分到的堆小于最小值的进程固定为最小值, 直到所有进程都满足
+        while flexible:
+            weight_sum = sum(r.weight for r in flexible)
+            below = [
+                r for r in flexible
+                if rest * r.weight / weight_sum < self.get_min_heap(r)
+            ]
+            if not below:
+                break
+            for r in below:
+                allocation_map[r.name].heap = self.get_min_heap(r)
+                rest -= self.get_min_heap(r)
+                flexible.remove(r)
+
+        if flexible:
+            weight_sum = sum(r.weight for r in flexible)
+            for r in flexible:
+                # 按 MB 向下取整, 保证总和不超过 budget
+                allocation_map[r.name].heap = int(rest * r.weight / weight_sum) // MB * MB
+
+        allocation_list = [allocation_map[r.name] for r in request_list]
+        if rest < 0:
+            raise MemoryBudgetError(self.format_report(allocation_list, rest))
+        return allocation_list
+
+    def get_min_heap(self, request):
+        if request.min_heap is None:
+            return self.min_heap
+        return request.min_heap
+
+    def format_report(self, allocation_list, rest=None):
+        row_list = [('NAME', 'HEAP', 'METASPACE', 'CODE CACHE', 'OVERHEAD', 'TOTAL')]
+        for a in allocation_list:
+            row_list.append((
+                a.name,
+                format_size(a.heap) + ('*' if 'heap' in a.fixed else ''),
+                format_size(a.metaspace) + ('*' if 'metaspace' in a.fixed else ''),
+                format_size(a.code_cache) + ('*' if 'code_cache' in a.fixed else ''),
+                format_size(a.overhead),
+                format_size(a.total),
+            ))
+
+        width_list = [max(len(row[i]) for row in row_list) for i in range(len(row_list[0]))]
+        line_list = []
+        for row in row_list:
+            line_list.append('  ' + '  '.join(v.ljust(w) for v, w in zip(row, width_list)).rstrip())
+
+        used = sum(a.total for a in allocation_list)
+        if rest is not None and rest < 0:
+            line_list.append(
+                f'  need at least {format_size(used)}, budget is {format_size(self.budget)}, '
+                f'short of {format_size(-rest + MB - 1)}'
+            )
+        else:
+            line_list.append(f'  used {format_size(used)} of {format_size(self.budget)}')
+        line_list.append('  (* is set by jvm_opts)')
+        return '\n'.join(line_list)
+
+
+def get_total_memory():
+    import psutil
+    return psutil.virtual_memory().total
+
+
+def create_memory_planner(context):
+    '''
+    memory_budget 可以是大小(如 "12g"), 或者物理内存的百分比(如 "75%", 需要 psutil)
+    '''
+    budget = context.resolve_config_value(context.config.get('memory_budget', None))
+    if not budget:
+        return None
+
+    config = context.config.get('memory', None) or {}
+
+    def get(key, default):
+        return context.resolve_config_value(config.get(key, default))
+
+    try:
+        if isinstance(budget, str) and budget.strip().endswith('%'):
+            if not context.enable_psutil:
+                raise MemoryBudgetError(f'memory_budget {budget} needs psutil module')
+            budget = int(get_total_memory() * float(budget.strip()[:-1]) / 100)
+
+        return MemoryPlanner(
+            budget,
+            get('metaspace', DEFAULT_METASPACE),
+            get('code_cache', DEFAULT_CODE_CACHE),
+            get('overhead', DEFAULT_OVERHEAD),
+            get('min_heap', DEFAULT_MIN_HEAP),
+        )
+    except MemoryBudgetError as e:
+        print(f'error: {e}')
+        sys.exit(-1)
+
+
+def plan_memory(context, request_list):
+    '''
+    返回 {name: MemoryAllocation}, 没有配置 memory_budget 时返回空 dict, 内存不够时打印报告并退出
+    '''
+    planner = create_memory_planner(context)
+    if planner is None or not request_list:
+        return {}
+
+    try:
+        allocation_list = planner.plan(request_list)
+    except MemoryBudgetError as e:
+        print('memory budget can not be met:')
+        print(str(e))
+        sys.exit(-1)
+
+    print('memory budget:')
+    print(planner.format_report(allocation_list))
+    return dict((a.name, a) for a in allocation_list)
+
+
+def get_memory_request(context, name, config, jvm_args):
+    '''
+    config 是项目或 tomcat 实例的配置, memory_weight 默认 1, memory_min 是最小的堆
+    '''
+    try:
+        return MemoryRequest(
+            name, jvm_args,
+            context.resolve_config_value(config.get('memory_weight', 1)),
+            context.resolve_config_value(config.get('memory_min', None)),
+        )
+    except (MemoryBudgetError, ValueError) as e:
+        print(f'error: {name} {e}')
+        sys.exit(-1)
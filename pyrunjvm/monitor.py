@@ -0,0 +1,211 @@
+import os
+import io
+import sys
+import time
+import asyncio
+
+from .util import get_jdk_tool
+
+
+DEFAULT_INTERVAL = 5
+
+FIELD_LIST = ('time', 'name', 'pid', 'cpu', 'rss', 'threads', 'fds', 'gct', 'old')
+
+
+class ServiceStat(object):
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.cpu_sum = 0.0
+        self.cpu_max = 0.0
+        self.rss_sum = 0
+        self.rss_max = 0
+        self.threads_max = 0
+        self.fds_max = 0
+        self.gct = None
+
+    def add(self, sample):
+        self.count += 1
+        self.cpu_sum += sample['cpu']
+        self.cpu_max = max(self.cpu_max, sample['cpu'])
+        self.rss_sum += sample['rss']
+        self.rss_max = max(self.rss_max, sample['rss'])
+        self.threads_max = max(self.threads_max, sample['threads'])
+        self.fds_max = max(self.fds_max, sample['fds'] or 0)
+        if sample.get('gct') is not None:
+            self.gct = sample['gct']
+
+
+def parse_jstat_output(text):
+    '''
+    解析 jstat -gcutil 的输出, 返回 (GCT, O)
+    '''
+    lines = [l.split() for l in text.strip().splitlines() if l.strip()]
+    if len(lines) < 2:
+        return None, None
+
+    row = dict(zip(lines[0], lines[-1]))
+
+    def get(key):
+        try:
+            return float(row[key])
+        except (KeyError, ValueError):
+            return None
+
+    return get('GCT'), get('O')
+
+
+class Monitor(object):
+    '''
+    按 interval 采样每个 jvm 进程的 CPU%、RSS、线程数、打开的文件数,
+    gc 为 True 时通过 jstat 采样 GC 总耗时和老年代使用率,
+    采样数据以 CSV 格式写到 path, 退出时打印峰值和平均值
+    '''
+    def __init__(self, supervisor, path, interval=DEFAULT_INTERVAL, jstat_bin=None):
+        import psutil
+        self.psutil = psutil
+
+        self.supervisor = supervisor
+        self.path = path
+        self.interval = interval
+        self.jstat_bin = jstat_bin
+
+        self.stat_map = {}
+        self._process_map = {}
+        self._file = None
+        self._task = None
+
+    def start(self):
+        self._file = io.open(self.path, 'w', encoding='UTF-8')
+        self._file.write(','.join(FIELD_LIST) + '\n')
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._file.close()
+
+    async def _run(self):
+        while True:
+            await self.sample()
+            await asyncio.sleep(self.interval)
+
+    def get_process(self, pid):
+        p = self._process_map.get(pid, None)
+        if p is None:
+            p = self.psutil.Process(pid)
+            # 第一次调用 cpu_percent 总是返回 0
+            p.cpu_percent(None)
+            self._process_map[pid] = p
+        return p
+
+    async def jstat(self, pid):
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                self.jstat_bin, '-gcutil', str(pid),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            out, _ = await asyncio.wait_for(proc.communicate(), self.interval)
+        except (OSError, asyncio.TimeoutError):
+            return None, None
+
+        return parse_jstat_output(out.decode('utf-8', errors='replace'))
+
+    async def sample(self):
+        now = time.time()
+        for name, proc in list(self.supervisor.proc_map.items()):
+            if proc.returncode is not None:
+                continue
+
+            try:
+                p = self.get_process(proc.pid)
+                with p.oneshot():
+                    sample = {
+                        'cpu': p.cpu_percent(None),
+                        'rss': p.memory_info().rss,
+                        'threads': p.num_threads(),
+                        'fds': p.num_handles() if sys.platform == 'win32' else p.num_fds(),
+                    }
+            except (self.psutil.NoSuchProcess, self.psutil.AccessDenied):
+                self._process_map.pop(proc.pid, None)
+                continue
+
+            sample['gct'], sample['old'] = None, None
+            if self.jstat_bin:
+                sample['gct'], sample['old'] = await self.jstat(proc.pid)
+
+            stat = self.stat_map.get(name, None)
+            if stat is None:
+                stat = self.stat_map[name] = ServiceStat(name)
+            stat.add(sample)
+
+            row = [f'{now:.0f}', name, str(proc.pid), f'{sample["cpu"]:.1f}',
+                   str(sample['rss']), str(sample['threads']), str(sample['fds'])]
+            for key in ('gct', 'old'):
+                row.append('' if sample[key] is None else f'{sample[key]:.3f}')
+            self._file.write(','.join(row) + '\n')
+
+        self._file.flush()
+
+    def print_summary(self):
+        if not self.stat_map:
+            return
+
+        mb = 1024 * 1024
+        row_list = [('NAME', 'SAMPLES', 'CPU AVG', 'CPU MAX', 'RSS AVG', 'RSS MAX', 'THREADS', 'FDS', 'GC TIME')]
+        for stat in self.stat_map.values():
+            row_list.append((
+                stat.name,
+                str(stat.count),
+                f'{stat.cpu_sum / stat.count:.1f}%',
+                f'{stat.cpu_max:.1f}%',
+                f'{stat.rss_sum / stat.count / mb:.0f}MB',
+                f'{stat.rss_max / mb:.0f}MB',
+                str(stat.threads_max),
+                str(stat.fds_max),
+                '-' if stat.gct is None else f'{stat.gct:.2f}s',
+            ))
+
+        width_list = [max(len(row[i]) for row in row_list) for i in range(len(row_list[0]))]
+        print('')
+        print(f'resource summary (samples in {self.path}):')
+        for row in row_list:
+            print('  ' + '  '.join(v.ljust(w) for v, w in zip(row, width_list)).rstrip())
+        print('')
+
+
+def get_jstat_bin(java_bin):
+    return get_jdk_tool(java_bin, 'jstat')
+
+
+def create_monitor(context, supervisor):
+    config = context.config.get('monitor', None) or {}
+
+    def get(key, default):
+        return context.resolve_config_value(config.get(key, default))
+
+    if not (context.monitor or get('enable', False)):
+        return None
+
+    if not context.enable_psutil:
+        print('psutil module not installed, resource monitor is disabled')
+        return None
+
+    jstat_bin = None
+    if get('gc', False):
+        jstat_bin = get_jstat_bin(context.java_bin)
+
+    return Monitor(
+        supervisor,
+        os.path.join(context.dest_dir, 'monitor.csv'),
+        float(get('interval', DEFAULT_INTERVAL)),
+        jstat_bin,
+    )
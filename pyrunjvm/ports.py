@@ -0,0 +1,157 @@
+import os
+import io
+import json
+import random
+import socket
+
+
+MAX_PORT = 65535
+DEFAULT_PORT_RANGE = (50000, 60000)
+
+
+class PortError(Exception):
+    pass
+
+
+def probe_port(port, host=''):
+    '''
+    通过 bind 判断端口是否可用
+    '''
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        s.bind((host, port))
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+    return True
+
+
+def parse_port_range(value):
+    if not value:
+        return DEFAULT_PORT_RANGE
+
+    if isinstance(value, str):
+        low, _, high = value.partition('-')
+    else:
+        low, high = value
+
+    low, high = int(low), int(high)
+    if low < 1 or high > MAX_PORT or low > high:
+        raise PortError(f'invalid port range {value}')
+
+    return low, high
+
+
+class PortAllocator(object):
+    '''
+    端口分配器, 每次分配只获取一次系统端口快照(psutil 不可用时改为 bind 探测),
+    分配结果保存在 state_file 里, 下次启动时端口仍然空闲就继续使用
+    '''
+    def __init__(self, state_file=None, port_range=None, use_psutil=True):
+        self.state_file = state_file
+        self.port_range = parse_port_range(port_range)
+        self.use_psutil = use_psutil
+
+        # None 表示还没有获取快照, False 表示无法获取快照
+        self._in_use_ports = None
+        self.reserved = set()
+        self.assigned = {}
+
+        self.load()
+
+    def load(self):
+        if not self.state_file or not os.path.isfile(self.state_file):
+            return
+
+        try:
+            with io.open(self.state_file, 'r', encoding='UTF-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        for k, v in data.items():
+            if isinstance(v, int):
+                self.assigned[k] = v
+
+    def save(self):
+        if not self.state_file:
+            return
+
+        tmp = self.state_file + '.tmp'
+        with io.open(tmp, 'w', encoding='UTF-8') as f:
+            json.dump(self.assigned, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.state_file)
+
+    def get_assigned(self, name, default=None):
+        return self.assigned.get(name, default)
+
+    def get_in_use_ports(self):
+        if self._in_use_ports is None:
+            self._in_use_ports = False
+            if self.use_psutil:
+                try:
+                    import psutil
+                    self._in_use_ports = set(
+                        c.laddr.port for c in psutil.net_connections() if c.laddr
+                    )
+                except Exception:
+                    # 没有安装 psutil 或者没有权限(如 macOS)
+                    pass
+
+        if self._in_use_ports is False:
+            return None
+
+        return self._in_use_ports
+
+    def is_free(self, port):
+        if port in self.reserved:
+            return False
+
+        in_use_ports = self.get_in_use_ports()
+        if in_use_ports is not None:
+            return port not in in_use_ports
+
+        return probe_port(port)
+
+    def reserve(self, *ports):
+        for port in ports:
+            if port and int(port) > 0:
+                self.reserved.add(int(port))
+
+    def _find_free_port(self):
+        low, high = self.port_range
+        for _ in range(min(high - low + 1, 200)):
+            port = random.randint(low, high)
+            if self.is_free(port):
+                return port
+
+        for port in range(low, high + 1):
+            if self.is_free(port):
+                return port
+
+        raise PortError(f'no free port in range {low}-{high}')
+
+    def allocate(self, names, exclude=None):
+        '''
+        给每个 name 分配一个不重复的空闲端口, 返回 {name: port}
+        '''
+        if exclude:
+            self.reserve(*exclude)
+
+        low, high = self.port_range
+        result = {}
+        for name in names:
+            port = self.assigned.get(name, None)
+            if port is None or not low <= port <= high or not self.is_free(port):
+                port = self._find_free_port()
+
+            self.reserved.add(port)
+            self.assigned[name] = port
+            result[name] = port
+
+        if result:
+            self.save()
+
+        return result
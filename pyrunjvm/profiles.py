@@ -0,0 +1,212 @@
+import re
+
+
+# 内置的 jvm 参数组合, 可以在配置文件的 [profiles.<name>] 里覆盖或者扩展
+BUILTIN_PROFILES = {
+    # 开发时快速启动: 只使用 C1 编译, 单线程 GC, 使用 jdk 自带的 CDS 归档
+    'fast-start': {
+        'jvm_opts': [
+            '-XX:TieredStopAtLevel=1',
+            '-Xshare:auto',
+            '-XX:+UseSerialGC',
+            '-XX:-UsePerfData',
+        ],
+    },
+    # 在一台机器上运行很多服务: 限制堆、元空间、代码缓存和线程栈
+    'low-memory': {
+        'jvm_opts': [
+            '-XX:+UseSerialGC',
+            '-XX:TieredStopAtLevel=1',
+            '-Xss512k',
+            '-XX:MaxRAMPercentage=5',
+            '-XX:MaxMetaspaceSize=256m',
+            '-XX:ReservedCodeCacheSize=64m',
+            '-XX:MaxDirectMemorySize=64m',
+            '-XX:CICompilerCount=2',
+        ],
+    },
+    # 压力测试: 并行 GC, 启动时分配好堆内存
+    'throughput': {
+        'jvm_opts': [
+            '-XX:+UseParallelGC',
+            '-XX:+AlwaysPreTouch',
+            '-XX:+UseNUMA',
+            '-Xms2g',
+            '-Xmx2g',
+        ],
+    },
+}
+
+# 选项名 -> (最低版本, 最高版本), None 表示不限制
+FLAG_VERSIONS = {
+    'MaxRAMPercentage': (10, None),
+    'UseContainerSupport': (10, None),
+    'UseZGC': (15, None),
+    'ZGenerational': (21, None),
+    'UseShenandoahGC': (12, None),
+    'UseEpsilonGC': (11, None),
+    'AutoCreateSharedArchive': (19, None),
+    'ArchiveClassesAtExit': (13, None),
+    'UseCompactObjectHeaders': (24, None),
+    'StartFlightRecording': (11, None),
+    'UseConcMarkSweepGC': (None, 13),
+    'UseParallelOldGC': (None, 14),
+    'UseBiasedLocking': (None, 17),
+    'MaxPermSize': (None, 7),
+    'PermSize': (None, 7),
+}
+
+# 值是下一个参数的选项, 和值一起原样保留
+TWO_TOKEN_OPTIONS = (
+    '-cp', '-classpath', '--class-path', '-p', '--module-path', '--upgrade-module-path',
+    '--add-modules', '--add-opens', '--add-exports', '--add-reads', '--patch-module',
+    '--limit-modules',
+)
+
+GC_RE = re.compile(r'^Use(Serial|Parallel|ParallelOld|G1|Z|Shenandoah|ConcMarkSweep|Epsilon)GC$')
+
+
+class ProfileError(Exception):
+    pass
+
+
+def get_flag_name(arg):
+    '''
+    -XX:+UseSerialGC -> UseSerialGC, -XX:MaxRAMPercentage=5 -> MaxRAMPercentage, 其它返回 None
+    '''
+    if not arg.startswith('-XX:'):
+        return None
+    name = arg[4:]
+    if name[:1] in ('+', '-'):
+        name = name[1:]
+    return name.split('=', 1)[0]
+
+
+def get_option_key(arg):
+    '''
+    同一个 key 的参数后面的覆盖前面的, GC 选择互斥, 只保留一个,
+    只有 -XX:、-Xmx 等格式确定的单个参数有 key, 其它参数返回 None, 不去重
+    '''
+    name = get_flag_name(arg)
+    if name is not None:
+        if GC_RE.match(name) and not arg.startswith('-XX:-'):
+            return '-XX:gc'
+        return '-XX:' + name
+
+    for prefix in ('-Xmx', '-Xms', '-Xss', '-Xmn', '-Xshare:'):
+        if arg.startswith(prefix):
+            return prefix
+    if arg.startswith('-D') and len(arg) > 2:
+        return arg.split('=', 1)[0]
+    return None
+
+
+def get_option_keys(opts):
+    '''
+    返回每个参数的 key, TWO_TOKEN_OPTIONS 后面的值没有 key
+    '''
+    keys = []
+    is_value = False
+    for arg in opts:
+        keys.append(None if is_value else get_option_key(arg))
+        is_value = not is_value and arg in TWO_TOKEN_OPTIONS
+    return keys
+
+
+def merge_jvm_opts(*opts_list):
+    '''
+    依次合并参数列表, 后面的列表里有相同 key 的参数时删除前面的参数, 没有 key 的参数都保留
+    '''
+    result = []
+    for opts in opts_list:
+        if not opts:
+            continue
+        key_set = set(get_option_keys(opts))
+        key_set.discard(None)
+        result = [
+            arg for arg, key in zip(result, get_option_keys(result))
+            if key is None or key not in key_set
+        ]
+        result.extend(opts)
+    return result
+
+
+def check_flag(arg, java_version):
+    '''
+    参数不能用于 java_version 时返回原因, 否则返回 None
+    '''
+    name = get_flag_name(arg)
+    if name is None or java_version is None:
+        return None
+
+    version_range = FLAG_VERSIONS.get(name, None)
+    if version_range is None:
+        return None
+
+    low, high = version_range
+    if low is not None and java_version < low:
+        return f'{arg} needs jdk {low}+'
+    if high is not None and java_version > high:
+        return f'{arg} is removed after jdk {high}'
+    return None
+
+
+def filter_jvm_opts(opts, java_version):
+    '''
+    返回 (可用的参数, [不可用的原因])
+    '''
+    result = []
+    reason_list = []
+    for arg in opts:
+        reason = check_flag(arg, java_version)
+        if reason is None:
+            result.append(arg)
+        else:
+            reason_list.append(reason)
+    return result, reason_list
+
+
+class ProfileResolver(object):
+    '''
+    合并内置的和配置文件里定义的 profile, profile 可以用 extends 继承其它 profile
+    '''
+    def __init__(self, profiles_config=None, resolve_func=None):
+        self.profile_map = dict(BUILTIN_PROFILES)
+        self.profile_map.update(profiles_config or {})
+        self.resolve_func = resolve_func or (lambda v: v)
+
+    def get_names(self):
+        return sorted(self.profile_map)
+
+    def get_jvm_opts(self, name, _stack=None):
+        _stack = _stack or []
+        if name in _stack:
+            raise ProfileError('profile extends has cycle: %s' % ' -> '.join(_stack + [name]))
+
+        profile = self.profile_map.get(name, None)
+        if profile is None:
+            raise ProfileError(
+                f'unknown profile {name}, available profiles: {", ".join(self.get_names())}'
+            )
+
+        opts = []
+        extends = profile.get('extends', None) or []
+        if isinstance(extends, str):
+            extends = [extends]
+        for parent in extends:
+            opts = merge_jvm_opts(opts, self.get_jvm_opts(parent, _stack + [name]))
+
+        own = [self.resolve_func(arg) for arg in profile.get('jvm_opts', None) or []]
+        return merge_jvm_opts(opts, own)
+
+    def resolve(self, names):
+        '''
+        names: profile 名列表或者用逗号分隔的字符串, 后面的 profile 覆盖前面的
+        '''
+        if isinstance(names, str):
+            names = [n.strip() for n in names.split(',') if n.strip()]
+
+        opts = []
+        for name in names:
+            opts = merge_jvm_opts(opts, self.get_jvm_opts(name))
+        return opts
@@ -0,0 +1,279 @@
+import io
+import os
+import re
+import sys
+import time
+import asyncio
+
+
+DEFAULT_TIMEOUT = 300
+DEFAULT_INTERVAL = 1
+
+PROBE_TYPES = ('tcp', 'http', 'log')
+
+
+class Probe(object):
+    def __init__(self, timeout=DEFAULT_TIMEOUT, interval=DEFAULT_INTERVAL):
+        self.timeout = timeout
+        self.interval = interval
+
+    async def check(self):
+        raise NotImplementedError()
+
+    def describe(self):
+        raise NotImplementedError()
+
+
+class TcpProbe(Probe):
+    def __init__(self, host, port, **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+
+    async def check(self):
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), 2
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False
+
+        writer.close()
+        return True
+
+    def describe(self):
+        return f'tcp {self.host}:{self.port}'
+
+
+class HttpProbe(Probe):
+    def __init__(self, url, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+
+    def _get(self):
+        # urllib.request 导入较慢, 只在使用 http 检查时导入
+        import urllib.request
+
+        try:
+            with urllib.request.urlopen(self.url, timeout=2) as resp:
+                return 200 <= resp.status < 300
+        except Exception:
+            return False
+
+    async def check(self):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._get)
+
+    def describe(self):
+        return f'http {self.url}'
+
+
+class LogProbe(Probe):
+    def __init__(self, path, pattern, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+
+        self._offset = 0
+        self._tail = ''
+
+    def reset(self):
+        self._offset = 0
+        self._tail = ''
+
+    async def check(self):
+        if not os.path.isfile(self.path):
+            return False
+
+        if os.path.getsize(self.path) < self._offset:
+            # 日志文件被截断或者轮转了
+            self.reset()
+
+        with io.open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        self._offset += len(data)
+
+        text = self._tail + data.decode('utf-8', errors='replace')
+        lines = text.split('\n')
+        self._tail = lines.pop()
+        for line in lines:
+            if self.regex.search(line):
+                return True
+
+        return False
+
+    def describe(self):
+        return f'log {self.pattern!r}'
+
+
+def create_probe(context, ready_config, default_port=None, log_file=None):
+    '''
+    ready_config:
+        type = "tcp" | "http" | "log"
+        host, port      tcp/http
+        url, path       http
+        pattern         log
+        timeout, interval
+    配置错误时抛出 ValueError
+    '''
+    if not ready_config:
+        return None
+    if not isinstance(ready_config, dict):
+        raise ValueError(f'ready must be a table, but it is {ready_config!r}')
+
+    def get(key, default=None):
+        return context.resolve_config_value(ready_config.get(key, default))
+
+    def get_number(key, default, convert_func=float):
+        value = get(key, default)
+        try:
+            number = convert_func(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'ready {key} must be a number, but it is {value!r}')
+        if number <= 0:
+            raise ValueError(f'ready {key} must be positive, but it is {value!r}')
+        return number
+
+    probe_type = str(get('type', 'tcp'))
+    if probe_type not in PROBE_TYPES:
+        raise ValueError(
+            f'unknown ready probe type {probe_type}, must be one of {", ".join(PROBE_TYPES)}'
+        )
+
+    kwargs = {
+        'timeout': get_number('timeout', DEFAULT_TIMEOUT),
+        'interval': get_number('interval', DEFAULT_INTERVAL),
+    }
+    host = str(get('host', '127.0.0.1'))
+    port = get('port', default_port)
+
+    if probe_type == 'tcp':
+        if not port:
+            raise ValueError('tcp ready probe needs port')
+        return TcpProbe(host, get_number('port', port, int), **kwargs)
+
+    if probe_type == 'http':
+        url = get('url')
+        if not url:
+            if not port:
+                raise ValueError('http ready probe needs url or port')
+            path = str(get('path', '/'))
+            if not path.startswith('/'):
+                path = '/' + path
+            url = f'http://{host}:{get_number("port", port, int)}{path}'
+        return HttpProbe(str(url), **kwargs)
+
+    pattern = get('pattern')
+    if not pattern:
+        raise ValueError('log ready probe needs pattern')
+    path = get('path', log_file)
+    try:
+        return LogProbe(str(path), str(pattern), **kwargs)
+    except re.error as e:
+        raise ValueError(f'ready pattern {pattern!r} is invalid: {e}')
+
+
+def create_ready_probe(context, name, ready_config, default_port=None, log_file=None):
+    '''
+    和 create_probe 一样, 配置错误时打印错误并退出
+    '''
+    try:
+        return create_probe(context, ready_config, default_port, log_file)
+    except ValueError as e:
+        print(f'error: {name} {e}')
+        sys.exit(-1)
+
+
+# 可以启动依赖它的服务的状态
+READY_STATUS = ('ready', 'unchecked')
+
+
+class ReadyResult(object):
+    def __init__(self, name, status, seconds):
+        self.name = name
+        # ready, timeout, exited, unchecked, skipped
+        self.status = status
+        self.seconds = seconds
+
+
+async def wait_ready(probe, proc, start):
+    '''
+    proc 为 asyncio 的 Process 对象, 进程退出后不再检查
+    返回 (status, seconds)
+    '''
+    while True:
+        if proc.returncode is not None:
+            return 'exited', time.monotonic() - start
+
+        if await probe.check():
+            return 'ready', time.monotonic() - start
+
+        cost = time.monotonic() - start
+        if cost > probe.timeout:
+            return 'timeout', cost
+
+        await asyncio.sleep(probe.interval)
+
+
+class StartupReport(object):
+    def __init__(self, on_complete=None):
+        self.start = time.monotonic()
+        self.name_list = []
+        self.result_map = {}
+        self.printed = False
+        # 所有服务都有检查结果后调用 on_complete(report)
+        self.on_complete = on_complete
+        self.total = None
+
+    def expect(self, name):
+        self.name_list.append(name)
+
+    def add_result(self, result):
+        self.result_map[result.name] = result
+        if len(self.result_map) >= len(self.name_list) and not self.printed:
+            self.total = time.monotonic() - self.start
+            self.print_summary()
+            if self.on_complete is not None:
+                self.on_complete(self)
+
+    async def watch(self, name, probe, proc, start):
+        if probe is None:
+            self.add_result(ReadyResult(name, 'unchecked', None))
+            return 'unchecked'
+
+        status, seconds = await wait_ready(probe, proc, start)
+        if status == 'ready':
+            print(f'{name} is ready in {seconds:.2f}s ({probe.describe()})')
+        else:
+            print(f'{name} is not ready: {status} after {seconds:.2f}s ({probe.describe()})')
+
+        self.add_result(ReadyResult(name, status, seconds))
+        return status
+
+    def print_summary(self):
+        if self.printed:
+            return
+        self.printed = True
+
+        width = max(len(name) for name in self.name_list)
+        print('')
+        print('startup summary:')
+        all_ready = True
+        for name in self.name_list:
+            result = self.result_map[name]
+            if result.seconds is None:
+                cost = '-'.rjust(9)
+            else:
+                cost = f'{result.seconds:8.2f}s'
+            print(f'  {name.ljust(width)}  {cost}  {result.status}')
+            if result.status not in READY_STATUS:
+                all_ready = False
+
+        total = self.total if self.total is not None else time.monotonic() - self.start
+        if all_ready:
+            print(f'all services ready in {total:.2f}s')
+        else:
+            print(f'some services are not ready, {total:.2f}s')
+        print('')
@@ -0,0 +1,443 @@
+import os
+import time
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .fingerprint import compute_fingerprint
+
+
+class BuildError(Exception):
+    pass
+
+
+def find_cycle(graph):
+    '''
+    graph: {name: [depends_on name, ...]}
+    有环时返回环上的节点列表, 否则返回 None
+    '''
+    # 0: 未访问, 1: 访问中, 2: 已完成
+    state = {}
+
+    def visit(name, path):
+        s = state.get(name, 0)
+        if s == 2:
+            return None
+        if s == 1:
+            return path[path.index(name):] + [name]
+
+        state[name] = 1
+        path.append(name)
+        for dep in graph.get(name, []):
+            cycle = visit(dep, path)
+            if cycle:
+                return cycle
+        path.pop()
+        state[name] = 2
+        return None
+
+    for name in graph:
+        cycle = visit(name, [])
+        if cycle:
+            return cycle
+
+    return None
+
+
+class BuildTask(object):
+    def __init__(self, name, cmds, depends_on=None, cwd=None,
+                 inputs=None, base_dir=None, propagate=True, batch=None):
+        self.name = str(name)
+        self.cmds = list(cmds or [])
+        self.depends_on = [str(d) for d in depends_on or []]
+        self.cwd = cwd
+
+        # 用于计算指纹的输入文件 glob 列表, 为空时每次都构建
+        self.inputs = list(inputs or [])
+        self.base_dir = base_dir
+        # 为 False 时, 本任务重新构建不会导致依赖它的任务重新构建
+        self.propagate = propagate
+        # BatchCommand, 同一个 key 的任务合并为一次构建调用
+        self.batch = batch
+
+        # (cmd, seconds)
+        self.cmd_timings = []
+        self.duration = 0.0
+        self.ok = None
+        self.skipped = False
+        self.up_to_date = False
+        self.fingerprint = None
+        # 和其它项目合并构建
+        self.batched = False
+
+
+class BuildScheduler(object):
+    '''
+    按 depends_on 组成的 DAG 并行执行构建命令，
+    任意命令失败后不再启动新的命令，并终止正在执行的命令
+    '''
+    def __init__(self, context, max_workers=1, cache=None,
+                 force=False, fingerprint_mode='mtime', env=None, batcher=None):
+        self.context = context
+        self.max_workers = max(1, int(max_workers))
+        self.task_map = {}
+
+        self.cache = cache
+        self.force = force
+        self.fingerprint_mode = fingerprint_mode
+        self.env = env
+        self.batcher = batcher
+        # (cmd, seconds, [task name])
+        self.batch_timings = []
+
+        self._lock = threading.Lock()
+        self._proc_set = set()
+        self._failed = False
+
+    def add_task(self, name, cmds, depends_on=None, cwd=None, **kwargs):
+        task = BuildTask(name, cmds, depends_on, cwd, **kwargs)
+        if task.name in self.task_map:
+            raise BuildError(f'duplicate build task {task.name}')
+
+        self.task_map[task.name] = task
+        return task
+
+    def check(self):
+        for task in self.task_map.values():
+            for dep in task.depends_on:
+                if dep not in self.task_map:
+                    raise BuildError(
+                        f'{task.name} depends on unknown project {dep}'
+                    )
+
+        cycle = find_cycle(
+            dict((name, task.depends_on) for name, task in self.task_map.items())
+        )
+        if cycle:
+            raise BuildError('depends_on has cycle: %s' % ' -> '.join(cycle))
+
+    def _print(self, name, msg):
+        with self._lock:
+            if self.max_workers > 1:
+                print(f'[{name}] {msg}', flush=True)
+            else:
+                print(msg, flush=True)
+
+    def _execute_cmd(self, name, cmd, cwd=None, line_func=None):
+        '''
+        line_func 不为 None 时每一行输出都会传给 line_func
+        '''
+        cmd = self.context.resolve_cmd(cmd)
+        self._print(name, f'execute cmd {cmd}')
+
+        kwargs = {
+            'shell': True,
+            'env': self.context.environ,
+            'cwd': cwd,
+        }
+        if self.max_workers > 1 or line_func is not None:
+            # 并行时输出加上项目名前缀，避免混在一起无法分辨
+            kwargs['stdout'] = subprocess.PIPE
+            kwargs['stderr'] = subprocess.STDOUT
+            kwargs['universal_newlines'] = True
+            kwargs['errors'] = 'replace'
+
+        proc = subprocess.Popen(cmd, **kwargs)
+        with self._lock:
+            self._proc_set.add(proc)
+
+        try:
+            if proc.stdout is not None:
+                for line in proc.stdout:
+                    line = line.rstrip('\r\n')
+                    self._print(name, line)
+                    if line_func is not None:
+                        line_func(line)
+            returncode = proc.wait()
+        finally:
+            with self._lock:
+                self._proc_set.discard(proc)
+
+        return returncode
+
+    def _is_up_to_date(self, task):
+        if self.cache is None or not task.inputs or not task.cmds:
+            return False
+
+        cmds = [self.context.resolve_cmd(cmd) for cmd in task.cmds]
+        base_dir = task.base_dir or self.context.work_dir
+        task.fingerprint = compute_fingerprint(
+            base_dir, task.inputs, cmds, self.env, self.fingerprint_mode
+        )
+
+        if self.force:
+            return False
+
+        for dep in task.depends_on:
+            dep_task = self.task_map[dep]
+            if dep_task.propagate and not dep_task.up_to_date:
+                return False
+
+        return self.cache.get(task.name) == task.fingerprint
+
+    def _run_task(self, task):
+        start = time.monotonic()
+        task.ok = True
+
+        if self._is_up_to_date(task):
+            task.up_to_date = True
+            self._print(task.name, f'{task.name} is up to date, skip build')
+            return task
+
+        for cmd in task.cmds:
+            if self._failed:
+                task.ok = False
+                task.skipped = True
+                break
+
+            cmd_start = time.monotonic()
+            returncode = self._execute_cmd(task.name, cmd, task.cwd)
+            cost = time.monotonic() - cmd_start
+            task.cmd_timings.append((cmd, cost))
+            self._print(task.name, f'cmd finished in {cost:.2f}s, exit code {returncode}')
+
+            if returncode != 0:
+                task.ok = False
+                self._fail(task, cmd, returncode)
+                break
+
+        task.duration = time.monotonic() - start
+        self._update_cache(task)
+        return task
+
+    def _update_cache(self, task):
+        if self.cache is not None and task.fingerprint:
+            with self._lock:
+                if task.ok:
+                    self.cache.set(task.name, task.fingerprint)
+                else:
+                    self.cache.remove(task.name)
+
+    def _get_batch_group(self, task, pending, done):
+        '''
+        返回和 task 可以合并构建的所有任务, 它们依赖的任务已经完成或者也在这次合并构建里,
+        合并构建的任务之间的顺序由构建工具保证
+        '''
+        key = task.batch.get_key()
+        group = set(
+            name for name in pending
+            if self.task_map[name].batch is not None and self.task_map[name].batch.get_key() == key
+        )
+
+        changed = True
+        while changed:
+            changed = False
+            for name in list(group):
+                depends_on = self.task_map[name].depends_on
+                if not all(dep in done or dep in group for dep in depends_on):
+                    group.discard(name)
+                    changed = True
+
+        return [self.task_map[name] for name in pending if name in group]
+
+    def _run_batch(self, group):
+        start = time.monotonic()
+        name_set = set(task.name for task in group)
+
+        # 按依赖顺序检查指纹, 依赖的任务是否重新构建会影响检查结果
+        stale_list = []
+        checked = set()
+        while len(checked) < len(group):
+            for task in group:
+                if task.name in checked:
+                    continue
+                if any(dep in name_set and dep not in checked for dep in task.depends_on):
+                    continue
+
+                checked.add(task.name)
+                task.ok = True
+                if self._is_up_to_date(task):
+                    task.up_to_date = True
+                    self._print(task.name, f'{task.name} is up to date, skip build')
+                else:
+                    stale_list.append(task)
+
+        if not stale_list:
+            return group
+
+        if self._failed:
+            for task in stale_list:
+                task.ok = False
+                task.skipped = True
+            return group
+
+        cmd = self.batcher.get_cmd([task.batch for task in stale_list])
+        label = stale_list[0].batch.tool
+        names = [task.name for task in stale_list]
+        self._print(label, f'batch build {", ".join(names)}')
+
+        line_list = []
+        returncode = self._execute_cmd(label, cmd, line_func=line_list.append)
+        cost = time.monotonic() - start
+        self.batch_timings.append((cmd, cost, names))
+        self._print(label, f'cmd finished in {cost:.2f}s, exit code {returncode}')
+
+        failed = []
+        if returncode != 0:
+            failed = self.batcher.find_failed([
+                (task.name, self._get_task_path(task), task.batch) for task in stale_list
+            ], line_list)
+
+        for task in stale_list:
+            task.batched = True
+            task.duration = cost
+            task.ok = returncode == 0
+            # 失败时不能确定其它项目是否构建完成, 标记为 skipped, 都不缓存
+            task.skipped = not task.ok and task.name not in failed
+            self._update_cache(task)
+
+        if returncode != 0:
+            self._fail(self.task_map[failed[0]], cmd, returncode)
+
+        return group
+
+    def _get_task_path(self, task):
+        if task.base_dir is None:
+            return task.name
+        return os.path.relpath(task.base_dir, self.batcher.work_dir)
+
+    def _fail(self, task, cmd, returncode):
+        with self._lock:
+            if self._failed:
+                return
+            self._failed = True
+            proc_list = list(self._proc_set)
+
+        print(f'build {task.name} failed, cmd: {cmd}, exit code: {returncode}', flush=True)
+        for proc in proc_list:
+            if proc.poll() is None:
+                proc.terminate()
+
+    def run(self):
+        self.check()
+
+        done = set()
+        pending = list(self.task_map.keys())
+        # future -> [task name]
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                if not self._failed:
+                    for name in list(pending):
+                        if name not in pending:
+                            # 已经加入了合并构建
+                            continue
+                        task = self.task_map[name]
+                        if len(running) >= self.max_workers:
+                            break
+
+                        if task.batch is not None and self.batcher is not None:
+                            group = self._get_batch_group(task, pending, done)
+                            if group:
+                                for t in group:
+                                    pending.remove(t.name)
+                                running[executor.submit(self._run_batch, group)] = [t.name for t in group]
+                            continue
+
+                        if all(dep in done for dep in task.depends_on):
+                            pending.remove(name)
+                            running[executor.submit(self._run_task, task)] = [name]
+
+                if not running:
+                    break
+
+                finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    names = running.pop(future)
+                    future.result()
+                    for name in names:
+                        if self.task_map[name].ok:
+                            done.add(name)
+
+        for name in pending:
+            self.task_map[name].skipped = True
+
+        if self.cache is not None:
+            self.cache.save()
+
+        self.print_summary()
+        return not self._failed
+
+    def critical_path(self):
+        finish = {}
+        prev = {}
+
+        def finish_time(name):
+            if name in finish:
+                return finish[name]
+
+            task = self.task_map[name]
+            start = 0.0
+            prev[name] = None
+            for dep in task.depends_on:
+                t = finish_time(dep)
+                if t > start:
+                    start = t
+                    prev[name] = dep
+
+            finish[name] = start + task.duration
+            return finish[name]
+
+        if not self.task_map:
+            return [], 0.0
+
+        last = max(self.task_map, key=finish_time)
+        path = []
+        name = last
+        while name is not None:
+            path.append(name)
+            name = prev[name]
+        path.reverse()
+        return path, finish[last]
+
+    def print_summary(self):
+        if not any(task.cmds for task in self.task_map.values()):
+            return
+
+        width = max(len(name) for name in self.task_map)
+        print('')
+        print('build summary:')
+        for task in self.task_map.values():
+            if task.skipped and not task.cmd_timings:
+                status = 'skipped'
+            elif task.up_to_date:
+                status = 'up to date'
+            elif task.ok:
+                status = 'ok (batched)' if task.batched else 'ok'
+            elif task.batched:
+                status = 'failed (batched)'
+            else:
+                status = 'failed'
+            print(f'  {task.name.ljust(width)}  {task.duration:8.2f}s  {status}')
+            for cmd, cost in task.cmd_timings:
+                print(f'  {"".ljust(width)}    {cost:8.2f}s  {self.context.resolve_cmd(cmd)}')
+
+        for cmd, cost, names in self.batch_timings:
+            print(f'  batch {", ".join(names)}')
+            print(f'  {"".ljust(width)}    {cost:8.2f}s  {cmd}')
+
+        path, total = self.critical_path()
+        print(f'critical path: {" -> ".join(path)} ({total:.2f}s)')
+        print('')
+
+
+def get_max_workers(value):
+    if value in (None, '', 0):
+        return 1
+
+    value = int(value)
+    if value < 0:
+        return os.cpu_count() or 1
+
+    return value
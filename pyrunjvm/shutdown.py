@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+import signal
+import asyncio
+import subprocess
+
+
+DEFAULT_GRACE_PERIOD = 30
+
+
+def new_process_group_kwargs():
+    '''
+    让 jvm 运行在单独的进程组里, 终端的 Ctrl-C 不会直接发给 jvm,
+    停止时可以把信号发给整个进程组, 避免留下孤儿进程
+    '''
+    if sys.platform == 'win32':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+
+    return {'start_new_session': True}
+
+
+def signal_process(proc, kill=False):
+    '''
+    posix 下向进程组发送 SIGTERM/SIGKILL, windows 下没有 SIGTERM, 直接结束进程
+    '''
+    if proc.returncode is not None:
+        return
+
+    try:
+        if sys.platform == 'win32':
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL if kill else signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def send_tomcat_shutdown(port, command='SHUTDOWN', host='127.0.0.1'):
+    '''
+    向 tomcat 的 shutdown 端口发送 shutdown 命令, 成功发送返回 True
+    '''
+    if not port or port < 1:
+        return False
+
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), 5
+        )
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+    writer.write(command.encode('ascii'))
+    await writer.drain()
+    writer.close()
+    return True
+
+
+class StopResult(object):
+    def __init__(self, name, seconds, method):
+        self.name = name
+        self.seconds = seconds
+        self.method = method
+
+
+class ShutdownManager(object):
+    def __init__(self, grace_period=DEFAULT_GRACE_PERIOD):
+        self.grace_period = grace_period
+        # name -> 协程函数, 优雅停止的方式, 如 tomcat 的 shutdown 端口
+        self.graceful_map = {}
+        self.result_list = []
+
+    def set_graceful(self, name, func):
+        self.graceful_map[name] = func
+
+    async def stop(self, name, proc, force=False):
+        if proc.returncode is not None:
+            return None
+
+        start = time.monotonic()
+        method = 'SIGKILL'
+        if force:
+            signal_process(proc, kill=True)
+        else:
+            method = 'SIGTERM'
+            func = self.graceful_map.get(name, None)
+            if func is not None and await func():
+                method = 'SHUTDOWN'
+            else:
+                signal_process(proc)
+
+            try:
+                await asyncio.wait_for(proc.wait(), self.grace_period)
+            except asyncio.TimeoutError:
+                print(f'{name} did not stop in {self.grace_period:.0f}s, kill it')
+                method += '+SIGKILL'
+                signal_process(proc, kill=True)
+
+        await proc.wait()
+        result = StopResult(name, time.monotonic() - start, method)
+        self.result_list.append(result)
+        print(f'{name} stopped in {result.seconds:.2f}s ({method})')
+        return result
+
+    async def stop_all(self, proc_map, force=False):
+        self.result_list = []
+        ct_list = []
+        for name, proc in proc_map.items():
+            ct_list.append(self.stop(name, proc, force))
+
+        await asyncio.gather(*ct_list)
+        self.print_summary()
+
+    def print_summary(self):
+        if not self.result_list:
+            return
+
+        width = max(len(r.name) for r in self.result_list)
+        print('')
+        print('shutdown summary:')
+        for r in self.result_list:
+            print(f'  {r.name.ljust(width)}  {r.seconds:8.2f}s  {r.method}')
+        print('')
+
+
+def create_shutdown_manager(context):
+    config = context.config.get('shutdown', None) or {}
+    grace_period = context.resolve_config_value(
+        config.get('grace_period', DEFAULT_GRACE_PERIOD)
+    )
+    return ShutdownManager(float(grace_period))
@@ -0,0 +1,283 @@
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+from collections import deque
+
+
+MAX_EXIT_HISTORY = 10
+
+RESTART_MODES = ('on-failure', 'always')
+
+
+class SupervisorError(Exception):
+    pass
+
+
+class RestartPolicy(object):
+    def __init__(self, enable=False, restart='on-failure', max_restarts=5,
+                 window=300.0, backoff=1.0, max_backoff=60.0):
+        self.enable = enable
+        # on-failure: 只在退出码不为 0 时重启, always: 总是重启
+        self.restart = restart
+        # window 秒内最多重启 max_restarts 次, 超过后不再重启
+        self.max_restarts = max_restarts
+        self.window = window
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def should_restart(self, returncode):
+        if not self.enable:
+            return False
+
+        if self.restart == 'always':
+            return True
+
+        return returncode != 0
+
+
+def create_restart_policy(context, enable=False):
+    '''
+    [supervise] 配置错误时打印错误并退出
+    '''
+    config = context.config.get('supervise', None) or {}
+
+    def get(key, default):
+        return context.resolve_config_value(config.get(key, default))
+
+    def get_number(key, default, convert_func=float):
+        value = get(key, default)
+        try:
+            number = convert_func(value)
+        except (TypeError, ValueError):
+            number = -1
+        if number < 0:
+            print(f'error: supervise {key} must be a non-negative number, but it is {value!r}')
+            sys.exit(-1)
+        return number
+
+    restart = str(get('restart', 'on-failure'))
+    if restart not in RESTART_MODES:
+        print(f'error: supervise restart must be one of {", ".join(RESTART_MODES)}, but it is {restart}')
+        sys.exit(-1)
+
+    return RestartPolicy(
+        enable=enable or bool(get('enable', False)),
+        restart=restart,
+        max_restarts=get_number('max_restarts', 5, int),
+        window=get_number('window', 300),
+        backoff=get_number('backoff', 1),
+        max_backoff=get_number('max_backoff', 60),
+    )
+
+
+class StatusFile(object):
+    '''
+    记录每个进程的 pid、状态、重启次数以及退出码/运行时长
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.process_map = {}
+
+    def get(self, name):
+        item = self.process_map.get(name, None)
+        if item is None:
+            item = {
+                'name': name,
+                'pid': None,
+                'state': 'pending',
+                'start_time': None,
+                'restarts': 0,
+                'exits': [],
+            }
+            self.process_map[name] = item
+        return item
+
+    def started(self, name, pid):
+        item = self.get(name)
+        if item['start_time'] is not None:
+            item['restarts'] += 1
+        item['pid'] = pid
+        item['state'] = 'running'
+        item['start_time'] = time.time()
+        self.save()
+
+    def exited(self, name, returncode, uptime):
+        item = self.get(name)
+        item['pid'] = None
+        item['state'] = 'exited'
+        item['exits'].append({
+            'code': returncode,
+            'uptime': round(uptime, 3),
+            'time': time.time(),
+        })
+        del item['exits'][:-MAX_EXIT_HISTORY]
+        self.save()
+
+    def set_info(self, name, **kwargs):
+        self.get(name).update(kwargs)
+        self.save()
+
+    def set_state(self, name, state):
+        self.get(name)['state'] = state
+        self.save()
+
+    def save(self):
+        data = {
+            'pid': os.getpid(),
+            'update_time': time.time(),
+            'processes': list(self.process_map.values()),
+        }
+        tmp = self.path + '.tmp'
+        with io.open(tmp, 'w', encoding='UTF-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+class Supervisor(object):
+    def __init__(self, policy, status_file, shutdown_manager=None):
+        self.policy = policy
+        self.status_file = status_file
+        self.shutdown_manager = shutdown_manager
+        self.stopping = False
+        self._stop_event = None
+        self.proc_map = {}
+        self._start_time_map = {}
+        # 通过控制端口要求停止/重启的进程
+        self._stop_set = set()
+        self._restart_set = set()
+
+    def register(self, name, **kwargs):
+        '''
+        kwargs 为进程的附加信息, 如 ports
+        '''
+        self.status_file.set_info(name, **kwargs)
+
+    def started(self, name, proc):
+        self.proc_map[name] = proc
+        self._start_time_map[name] = time.monotonic()
+        self.status_file.started(name, proc.pid)
+
+    def get_status(self):
+        return list(self.status_file.process_map.values())
+
+    def _get_proc(self, name):
+        proc = self.proc_map.get(name, None)
+        if proc is None:
+            raise SupervisorError(f'unknown service {name}')
+        return proc
+
+    def _terminate(self, name, proc):
+        if proc.returncode is not None:
+            return
+
+        if self.shutdown_manager is not None:
+            asyncio.ensure_future(self.shutdown_manager.stop(name, proc))
+            return
+
+        try:
+            proc.terminate()
+        except ProcessLookupError:
+            pass
+
+    def stop(self, name):
+        proc = self._get_proc(name)
+        self._stop_set.add(name)
+        self._terminate(name, proc)
+
+    def restart(self, name):
+        proc = self._get_proc(name)
+        if name in self._stop_set:
+            raise SupervisorError(f'{name} is stopped by pyrunjvm stop, restart pyrunjvm to start it again')
+        if proc.returncode is not None:
+            raise SupervisorError(f'{name} is not running')
+
+        self._restart_set.add(name)
+        self._terminate(name, proc)
+
+    async def shutdown(self):
+        '''
+        停止所有进程, 正在停止时再次调用会直接 kill
+        '''
+        force = self.stopping
+        if force:
+            print('kill all services')
+        else:
+            print('stop all services')
+
+        self.stopping = True
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+        proc_map = {}
+        for name, proc in self.proc_map.items():
+            if proc.returncode is None:
+                proc_map[name] = proc
+
+        await self.shutdown_manager.stop_all(proc_map, force)
+
+    async def _sleep(self, delay):
+        if self.stopping:
+            return
+
+        if self._stop_event is None:
+            self._stop_event = asyncio.Event()
+
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def supervise(self, name, proc, spawn):
+        '''
+        等待 proc 退出, 按重启策略用 spawn() 重新启动
+        spawn: 返回 asyncio Process 对象的协程函数
+        返回最后一次的退出码
+        '''
+        policy = self.policy
+        restart_time_list = deque()
+        delay = policy.backoff
+
+        while True:
+            returncode = await proc.wait()
+            uptime = time.monotonic() - self._start_time_map.get(name, time.monotonic())
+            self.status_file.exited(name, returncode, uptime)
+
+            if name in self._restart_set and not self.stopping:
+                self._restart_set.discard(name)
+                print(f'{name} exited with code {returncode} after {uptime:.1f}s, restart by request')
+                proc = await spawn()
+                self.started(name, proc)
+                continue
+
+            if self.stopping or name in self._stop_set or not policy.should_restart(returncode):
+                self.status_file.set_state(name, 'stopped')
+                return returncode
+
+            now = time.monotonic()
+            while restart_time_list and now - restart_time_list[0] > policy.window:
+                restart_time_list.popleft()
+
+            if len(restart_time_list) >= policy.max_restarts:
+                print(f'{name} restarted {len(restart_time_list)} times in {policy.window:.0f}s, give up')
+                self.status_file.set_state(name, 'failed')
+                return returncode
+
+            # 运行时间足够长就认为已经恢复, 重置退避时间
+            if uptime >= policy.window:
+                delay = policy.backoff
+
+            print(f'{name} exited with code {returncode} after {uptime:.1f}s, restart in {delay:.1f}s')
+            self.status_file.set_state(name, 'backoff')
+            await self._sleep(delay)
+            delay = min(delay * 2, policy.max_backoff)
+
+            if self.stopping or name in self._stop_set:
+                self.status_file.set_state(name, 'stopped')
+                return returncode
+
+            restart_time_list.append(time.monotonic())
+            proc = await spawn()
+            self.started(name, proc)
@@ -0,0 +1,67 @@
+import os
+
+from .util import mkdir, resource_path, write_file_if_changed
+
+
+class TemplateRenderer(object):
+    '''
+    共用一个 jinja2 Environment, 编译后的模板缓存在 cache_dir 下,
+    override_dir 里同名的模板(如 tomcat/server.xml)优先于 pyrunjvm 自带的模板
+    '''
+    def __init__(self, cache_dir=None, override_dir=None):
+        self.cache_dir = cache_dir
+        self.override_dir = override_dir
+        self._env = None
+
+    def get_env(self):
+        if self._env is not None:
+            return self._env
+
+        import jinja2
+
+        search_path = []
+        if self.override_dir:
+            search_path.append(self.override_dir)
+        search_path.append(resource_path('config'))
+
+        bytecode_cache = None
+        if self.cache_dir:
+            mkdir(self.cache_dir, True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(self.cache_dir)
+
+        self._env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(search_path, encoding='UTF-8'),
+            bytecode_cache=bytecode_cache,
+            autoescape=jinja2.select_autoescape(['xml']),
+            keep_trailing_newline=True,
+        )
+        return self._env
+
+    def get_template_file(self, name):
+        '''
+        返回实际使用的模板文件
+        '''
+        return self.get_env().get_template(name).filename
+
+    def render(self, name, mapping=None, **kwds):
+        return self.get_env().get_template(name).render(mapping or {}, **kwds)
+
+    def render_to_file(self, name, out_path, mapping=None, encoding='UTF-8', **kwds):
+        '''
+        内容没有变化时不写文件, 返回是否写了文件
+        '''
+        return write_file_if_changed(out_path, self.render(name, mapping, **kwds), encoding)
+
+
+def create_template_renderer(context):
+    config = context.config.get('templates', None) or {}
+    override_dir = context.resolve_config_value(config.get('dir', None))
+    if override_dir:
+        override_dir = os.path.join(context.work_dir, override_dir)
+        if not os.path.isdir(override_dir):
+            print(f'template dir {override_dir} is not exist')
+            override_dir = None
+
+    return TemplateRenderer(
+        os.path.join(context.dest_dir, 'template_cache'), override_dir
+    )
@@ -1,59 +1,35 @@
 
-import tomlkit
-import random
 import os
 import shutil
 import io
-import jinja2
+import hashlib
 
-def is_str(v):
-    if type(v) in (str, tomlkit.items.String):
-        return True
-
-    return False
-
-MAX_PORT = 65535
-
-def get_in_use_ports():
-    import psutil
-    sconns = psutil.net_connections()
-    port_list = []
-    for s in sconns:
-        p = s.laddr.port
-        if p in port_list:
-            continue
-        port_list.append(p)
+# 包所在目录, 用于查找 config 目录下的模板
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-    return port_list
-
-def random_port(use_port_list=[]):
-    port_list = get_in_use_ports()
-    while True:
-        port_list = []
-
-        x = random.choice((5, 6))
-        port_list.append(str(x))
-
-        if x == 5:
-            x = random.choice(range(2, 10))
-            port_list.append(str(x))
-        else:
-            x = random.choice(range(0, 6))
-            port_list.append(str(x))
-
-        numbers = range(0, 10)
-        for i in range(0, 3):
-            x = random.choice(numbers)
-            port_list.append(str(x))
-
-        port = int(''.join(port_list))
-        if port > MAX_PORT:
-            continue
-
-        if port in port_list or port in use_port_list:
-            continue
-
-        return port
+def is_str(v):
+    # tomlkit 的 String 也是 str 的子类
+    return isinstance(v, str)
+
+def resource_path(*names):
+    '''
+    返回包内资源文件的路径, 如 resource_path('config', 'tomcat', 'server.xml')
+    '''
+    return os.path.join(PACKAGE_DIR, *names)
+
+def get_jdk_tool(java_bin, name):
+    '''
+    返回和 java_bin 同一个目录下的 jdk 工具(如 jstat、jcmd), 找不到时返回工具名, 从 PATH 查找
+    '''
+    if os.name == 'nt':
+        name += '.exe'
+    bin_dir = os.path.dirname(java_bin)
+    if bin_dir:
+        p = os.path.join(bin_dir, name)
+        if os.path.isfile(p):
+            return p
+
+    return name
 
 def mkdir(path, recursive=False, **kwargs):
     if recursive:
@@ -74,15 +50,140 @@ def rmtree(path):
         else:
             shutil.rmtree(m)
 
+SYNC_MODES = ('mtime', 'hash', 'copy')
+
+def _same_file(src, dst, mode):
+    try:
+        dst_st = os.stat(dst)
+    except FileNotFoundError:
+        return False
+
+    src_st = os.stat(src)
+    if src_st.st_size != dst_st.st_size:
+        return False
+
+    if mode == 'hash':
+        return file_digest(src) == file_digest(dst)
+
+    # 有些文件系统的 mtime 精度只有 2 秒
+    return abs(src_st.st_mtime - dst_st.st_mtime) < 2
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with io.open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class SyncResult(object):
+    def __init__(self):
+        self.copied = []
+        self.removed = []
+        self.unchanged = 0
+
+    def __str__(self):
+        return '%d copied, %d removed, %d unchanged' % (
+            len(self.copied), len(self.removed), self.unchanged
+        )
+
+def sync_tree(src_dir, dest_dir, mode='mtime', exclude=None, keep=None):
+    '''
+    增量同步目录, 只复制 size/mtime(或内容)不同的文件, 只删除 src_dir 里已不存在的文件
+    exclude: 不同步的相对路径(或其父目录), 既不复制也不删除
+    keep: 不删除的相对路径(或其父目录), 但会从 src_dir 复制
+    '''
+    result = SyncResult()
+    if mode == 'copy':
+        mkdir(dest_dir, True)
+        rmtree(dest_dir)
+        shutil.copytree(src_dir, dest_dir, dirs_exist_ok=True)
+        return result
+
+    if mode not in SYNC_MODES:
+        raise ValueError('unknown sync mode %s' % mode)
+
+    def match(rel, prefix_list):
+        for prefix in prefix_list or []:
+            if rel == prefix or rel.startswith(prefix + '/'):
+                return True
+        return False
+
+    mkdir(dest_dir, True)
+    src_set = set()
+    for root, dirs, files in os.walk(src_dir):
+        rel_root = os.path.relpath(root, src_dir)
+        rel_root = '' if rel_root == '.' else rel_root.replace(os.sep, '/') + '/'
+
+        dirs[:] = [d for d in dirs if not match(rel_root + d, exclude)]
+        for d in dirs:
+            src_set.add(rel_root + d)
+            mkdir(os.path.join(dest_dir, rel_root, d))
+
+        for name in files:
+            rel = rel_root + name
+            if match(rel, exclude):
+                continue
+
+            src_set.add(rel)
+            src = os.path.join(root, name)
+            dst = os.path.join(dest_dir, rel)
+            if _same_file(src, dst, mode):
+                result.unchanged += 1
+                continue
+
+            if os.path.isdir(dst):
+                shutil.rmtree(dst)
+            shutil.copy2(src, dst)
+            result.copied.append(rel)
+
+    for root, dirs, files in os.walk(dest_dir, topdown=True):
+        rel_root = os.path.relpath(root, dest_dir)
+        rel_root = '' if rel_root == '.' else rel_root.replace(os.sep, '/') + '/'
+
+        for d in list(dirs):
+            rel = rel_root + d
+            if match(rel, exclude) or match(rel, keep):
+                dirs.remove(d)
+                continue
+            if rel not in src_set:
+                shutil.rmtree(os.path.join(root, d))
+                result.removed.append(rel)
+                dirs.remove(d)
+
+        for name in files:
+            rel = rel_root + name
+            if rel in src_set or match(rel, exclude) or match(rel, keep):
+                continue
+            os.unlink(os.path.join(root, name))
+            result.removed.append(rel)
+
+    return result
+
 def write_file_with_encoding(path, text, encoding='UTF-8'):
     with io.open(path, 'w', encoding=encoding) as f:
             f.write(text)
 
+def write_file_if_changed(path, text, encoding='UTF-8'):
+    '''
+    内容没有变化时不写文件, 避免更新 mtime 触发 tomcat/IDE 重新加载
+    返回是否写了文件
+    '''
+    if os.path.isfile(path):
+        try:
+            if read_text_file(path, encoding) == text:
+                return False
+        except UnicodeDecodeError:
+            pass
+
+    write_file_with_encoding(path, text, encoding)
+    return True
+
 def read_text_file(fpath, encoding='UTF-8'):
     with io.open(fpath, 'r', encoding=encoding) as f:
         return f.read()
 
 def render_str_by_jinja_template(text, *mapping, **kwds):
+    import jinja2
     t = jinja2.Template(text)
     return t.render(*mapping, **kwds)
 
@@ -93,4 +194,4 @@ def render_by_jinja_template(
 
     text = read_text_file(tmp_path, encoding)
     s = render_str_by_jinja_template(text, mapping, **kwds)
-    write_file_with_encoding(out_path, s, encoding)
\ No newline at end of file
+    return write_file_if_changed(out_path, s, encoding)
@@ -0,0 +1,179 @@
+import os
+import time
+import asyncio
+import subprocess
+
+from .fingerprint import collect_files
+
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_DEBOUNCE = 0.5
+
+
+def take_snapshot(base_dir, patterns):
+    '''
+    返回 {相对路径: (mtime_ns, size)}
+    '''
+    result = {}
+    for rel, p in collect_files(base_dir, patterns):
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        result[rel] = (st.st_mtime_ns, st.st_size)
+    return result
+
+
+def diff_snapshot(old, new):
+    '''
+    返回新增、删除和修改的文件
+    '''
+    changed = set(old.keys() ^ new.keys())
+    for k in old.keys() & new.keys():
+        if old[k] != new[k]:
+            changed.add(k)
+    return sorted(changed)
+
+
+class WatchTarget(object):
+    def __init__(self, name, base_dir, patterns, project_config, build=True):
+        self.name = name
+        self.base_dir = base_dir
+        self.patterns = patterns
+        self.project_config = project_config
+        # 为 False 时只重新部署, 用于监控 IDE 编译输出的目录
+        self.build = build
+
+        self.snapshot = None
+        self.changed = set()
+        # 最后一次检查到变化的时间
+        self.change_time = None
+
+
+class Watcher(object):
+    '''
+    轮询每个项目 watch 配置的文件, 有变化并且 debounce 秒内没有新的变化时,
+    只重新构建这个项目, 再调用 app.redeploy 重新部署, 构建失败时保持原来的服务运行
+    '''
+    def __init__(self, app, target_list, interval=DEFAULT_INTERVAL, debounce=DEFAULT_DEBOUNCE):
+        self.app = app
+        self.target_list = target_list
+        self.interval = interval
+        self.debounce = debounce
+
+        self._task = None
+
+    def start(self):
+        for target in self.target_list:
+            print(f'watch {target.name}: {", ".join(target.patterns)}')
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _snapshot(self, target):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, take_snapshot, target.base_dir, target.patterns
+        )
+
+    async def _run(self):
+        for target in self.target_list:
+            target.snapshot = await self._snapshot(target)
+
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    async def check(self):
+        for target in self.target_list:
+            snapshot = await self._snapshot(target)
+            changed = diff_snapshot(target.snapshot, snapshot)
+            target.snapshot = snapshot
+            now = time.monotonic()
+            if changed:
+                target.changed.update(changed)
+                target.change_time = now
+                continue
+
+            if target.changed and now - target.change_time >= self.debounce:
+                await self.reload(target)
+
+    def build(self, target):
+        cmds = self.app.get_build_cmds(target.project_config)
+        try:
+            self.app.context.execute_cmds(cmds)
+        except subprocess.CalledProcessError as e:
+            print(f'build {target.name} failed, exit code {e.returncode}, keep running')
+            return False
+        return True
+
+    async def reload(self, target):
+        changed = sorted(target.changed)
+        target.changed = set()
+        more = f' and {len(changed) - 3} more' if len(changed) > 3 else ''
+        print(f'{target.name} changed: {", ".join(changed[:3])}{more}')
+
+        start = time.monotonic()
+        if target.build:
+            loop = asyncio.get_event_loop()
+            if not await loop.run_in_executor(None, self.build, target):
+                return
+
+        try:
+            self.app.redeploy(target.project_config)
+        except Exception as e:
+            print(f'redeploy {target.name} failed: {e}')
+            return
+
+        print(f'redeploy {target.name} in {time.monotonic() - start:.2f}s')
+
+
+def get_watch_config(context):
+    return context.config.get('watch', None) or {}
+
+
+def is_watch_enable(context):
+    config = get_watch_config(context)
+    return context.watch or bool(context.resolve_config_value(config.get('enable', False)))
+
+
+def create_watcher(context, app):
+    if not is_watch_enable(context):
+        return None
+
+    config = get_watch_config(context)
+    target_list = []
+    for project_config in context.config.get('projects', None) or []:
+        name = context.get_project_name(project_config)
+        base_dir = os.path.join(context.work_dir, project_config.get('path'))
+
+        # 默认监控 inputs, 都没有配置时只监控构建输出, 变化后直接重新部署
+        build = True
+        patterns = project_config.get('watch', None) or project_config.get('inputs', None)
+        if not patterns:
+            build = False
+            patterns = app.get_watch_patterns(project_config)
+        if not patterns:
+            continue
+
+        patterns = [context.resolve_config_value(p) for p in patterns]
+        target_list.append(WatchTarget(name, base_dir, patterns, project_config, build))
+
+    if not target_list:
+        print('no project to watch')
+        return None
+
+    return Watcher(
+        app, target_list,
+        float(context.resolve_config_value(config.get('interval', DEFAULT_INTERVAL))),
+        float(context.resolve_config_value(config.get('debounce', DEFAULT_DEBOUNCE))),
+    )
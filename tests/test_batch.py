@@ -0,0 +1,63 @@
+from pyrunjvm.batch import BuildBatcher, parse_build_cmd
+
+
+def test_parse_build_cmd(tmp_path):
+    work_dir = str(tmp_path)
+
+    batch = parse_build_cmd('./gradlew :a:explodedWar -x test --offline', work_dir)
+    assert batch.tool == 'gradle'
+    assert batch.targets == [':a:explodedWar']
+    assert batch.options == [('-x', 'test'), ('--offline',)]
+
+    batch = parse_build_cmd('mvn -f b/pom.xml -DskipTests package', work_dir)
+    assert batch.tool == 'maven'
+    assert batch.modules == ['b']
+    assert batch.targets == ['package']
+
+    assert parse_build_cmd('gradle -p sub build', work_dir) is None
+    assert parse_build_cmd('gradle build && echo ok', work_dir) is None
+    assert parse_build_cmd('npm run build', work_dir) is None
+
+
+def test_merge_gradle_and_maven(tmp_path):
+    batcher = BuildBatcher(str(tmp_path))
+    a = batcher.parse(['gradle :a:clean', 'gradle :a:explodedWar'])
+    b = batcher.parse(['gradle :b:bootJar'])
+    assert batcher.get_cmd([a, b]) == 'gradle :a:clean :a:explodedWar :b:bootJar --parallel'
+
+    a = batcher.parse(['mvn -pl a package'])
+    b = batcher.parse(['mvn -pl b package'])
+    c = batcher.parse(['mvn -pl c install'])
+    assert a.get_key() == b.get_key() != c.get_key()
+    assert batcher.get_cmd([a, b]) == 'mvn -pl a,b package -T 1C'
+
+    # 选项不同的 gradle 命令不合并, 同一个项目的选项按 (选项, 值) 合并
+    a = batcher.parse(['gradle :a:build -x test'])
+    b = batcher.parse(['gradle :b:build -x javadoc'])
+    assert a.get_key() != b.get_key()
+    c = batcher.parse(['gradle :c:build -x test', 'gradle :c:check -x javadoc -x test'])
+    assert c.options == [('-x', 'test'), ('-x', 'javadoc')]
+    assert batcher.get_cmd([a, batcher.parse(['gradle :d:build -x test'])]) == (
+        'gradle :a:build :d:build -x test --parallel'
+    )
+
+    # 不同的构建工具不合并
+    assert batcher.parse(['gradle :a:war', 'mvn package']) is None
+
+
+def test_find_failed(tmp_path):
+    batcher = BuildBatcher(str(tmp_path))
+    member_list = [
+        ('a', 'a', batcher.parse(['gradle explodedWar'])),
+        ('b', 'libs/b', batcher.parse(['gradle :libs:b:jar'])),
+    ]
+    lines = ["Execution failed for task ':libs:b:compileJava'."]
+    assert batcher.find_failed(member_list, lines) == ['b']
+    assert batcher.find_failed(member_list, ['BUILD FAILED']) == ['a', 'b']
+
+    member_list = [
+        ('web', 'web', batcher.parse(['mvn -pl web package'])),
+        ('api', 'api', batcher.parse(['mvn -pl api package'])),
+    ]
+    lines = ['[ERROR] Failed to execute goal org.apache.maven.plugins:maven-compiler-plugin:3.8.1:compile (default-compile) on project api: Compilation failure']
+    assert batcher.find_failed(member_list, lines) == ['api']
@@ -0,0 +1,99 @@
+import sys
+import socket
+
+from pyrunjvm.bench import BenchRunner, Variant, percentile, summarize, parse_variant
+from pyrunjvm.context import load_context
+
+
+def test_percentile_and_summarize():
+    assert percentile([], 95) is None
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(list(range(1, 21)), 95) == 19
+
+    stats = summarize([
+        {'metrics': {'config': 1.0, 'build': None}},
+        {'metrics': {'config': 3.0}},
+    ])
+    assert stats == {'config': {'min': 1.0, 'median': 2.0, 'p95': 3.0}}
+
+
+def test_parse_variant():
+    v = parse_variant('g1=-XX:+UseG1GC "-Dname=a b"')
+    assert v.name == 'g1'
+    assert v.jvm_opts == ['-XX:+UseG1GC', '-Dname=a b']
+    assert parse_variant('base=').jvm_opts == []
+
+
+# 只打开端口的 java, 收到 SIGTERM 后退出
+STUB_JAVA = '''#!%s
+import sys, socket, time
+port = [int(a.split('=', 1)[1]) for a in sys.argv if a.startswith('-Dserver.port=')][0]
+s = socket.socket()
+s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+s.bind(('127.0.0.1', port))
+s.listen(5)
+time.sleep(60)
+'''
+
+CONFIG = '''app_type = "flatjar"
+
+[[projects]]
+path = "app"
+jar_path = "app.jar"
+jvm_opts = ["-Dserver.port=%d"]
+ready = { type = "tcp", port = %d, interval = 0.05 }
+
+[env]
+JAVA_BIN = "%s"
+
+[shutdown]
+grace_period = 5
+'''
+
+
+class Pipeline(object):
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+
+    def load_context(self):
+        return load_context(
+            sys.platform, self.work_dir, self.work_dir + '/.pyrunjvm.toml', use_cache=False
+        )
+
+    def create_application(self, context):
+        from pyrunjvm.application import create_application
+        return create_application(context)
+
+    def build(self, context, app):
+        return True
+
+    def handle_projects(self, context, app):
+        app.pre_handle()
+        for project_config in context.config['projects']:
+            app.handle_project(project_config)
+        app.post_handle()
+
+
+def test_bench_with_stub_jvm(tmp_path):
+    java = tmp_path / 'java'
+    java.write_text(STUB_JAVA % sys.executable)
+    java.chmod(0o755)
+    (tmp_path / 'app').mkdir()
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    (tmp_path / '.pyrunjvm.toml').write_text(CONFIG % (port, port, java))
+
+    variant_list = [Variant('base', []), Variant('small', ['-Xss512k'])]
+    runner = BenchRunner(Pipeline(str(tmp_path)), 2, variant_list, build=False)
+    assert runner.run()
+
+    result = runner.get_result()
+    assert [len(v['samples']) for v in result['variants']] == [2, 2]
+    sample = result['variants'][1]['samples'][0]
+    assert sample['status'] == {'app': 'ready'}
+    assert sample['metrics']['shutdown'] < 5
+    assert set(result['variants'][0]['stats']['ready.app']) == {'min', 'median', 'p95'}
+
+    runner.save(str(tmp_path / 'bench.json'))
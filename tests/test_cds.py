@@ -0,0 +1,68 @@
+import os
+
+from pyrunjvm.cds import CdsManager, parse_java_version
+
+
+def test_parse_java_version():
+    assert parse_java_version('java version "1.8.0_292"') == 8
+    assert parse_java_version('openjdk version "17.0.2" 2022-01-18') == 17
+    assert parse_java_version('openjdk version "21" 2023-09-19') == 21
+    assert parse_java_version('command not found') is None
+
+
+def new_manager(tmp_path):
+    m = CdsManager(str(tmp_path / 'cds'), 'java')
+    m.enable = True
+    m._java_version = 17
+    m._java_version_text = 'openjdk version "17.0.2"'
+    return m
+
+
+def test_training_then_use_archive(tmp_path):
+    jar = tmp_path / 'app.jar'
+    jar.write_bytes(b'v1')
+    m = new_manager(tmp_path)
+
+    args = m.get_jvm_args('app', [str(jar)])
+    assert args[0].startswith('-XX:ArchiveClassesAtExit=')
+    tmp = args[0].split('=', 1)[1]
+    with open(tmp, 'w') as f:
+        f.write('archive')
+    m.finish('app')
+
+    args = m.get_jvm_args('app', [str(jar)])
+    assert args[0].startswith('-XX:SharedArchiveFile=')
+    assert os.path.isfile(args[0].split('=', 1)[1])
+
+
+def test_jar_change_invalidates_archive(tmp_path):
+    jar = tmp_path / 'app.jar'
+    jar.write_bytes(b'v1')
+    m = new_manager(tmp_path)
+    (tmp_path / 'cds').mkdir()
+    old = m.get_key([str(jar)])
+    (tmp_path / 'cds' / f'app-{old}.jsa').write_text('old')
+    (tmp_path / 'cds' / f'app-web-{old}.jsa').write_text('other')
+
+    jar.write_bytes(b'v2')
+    args = m.get_jvm_args('app', [str(jar)])
+    assert args[0].startswith('-XX:ArchiveClassesAtExit=')
+    assert sorted(os.listdir(tmp_path / 'cds')) == [f'app-web-{old}.jsa']
+
+    # jvm 没有生成归档
+    m.finish('app')
+    assert sorted(os.listdir(tmp_path / 'cds')) == [f'app-web-{old}.jsa']
+
+
+def test_launch_mode_and_class_path_change_key(tmp_path):
+    jar = tmp_path / 'app.jar'
+    jar.write_bytes(b'v1')
+    m = new_manager(tmp_path)
+
+    key_list = [
+        m.get_key([str(jar)], ['jar']),
+        m.get_key([str(jar)], ['exploded', 'classes', 'lib/a.jar']),
+        m.get_key([str(jar)], ['exploded', 'classes', 'lib/b.jar']),
+    ]
+    assert len(set(key_list)) == 3
+    assert m.get_key([str(jar)], ['jar']) == key_list[0]
@@ -0,0 +1,157 @@
+import os
+import sys
+import stat
+import time
+import asyncio
+
+import pytest
+
+from pyrunjvm.control import ControlServer, ControlError, send_command, CONTROL_FILE_NAME
+from pyrunjvm.supervisor import SupervisorError
+
+
+class FakeSupervisor(object):
+    def __init__(self):
+        self.call_list = []
+
+    def get_status(self):
+        return [
+            {'name': 'api', 'pid': os.getpid(), 'state': 'running',
+             'start_time': time.time() - 60, 'restarts': 1, 'ports': {'debug': 5005}},
+            {'name': 'web', 'pid': None, 'state': 'exited', 'start_time': None, 'restarts': 0},
+        ]
+
+    def _check(self, name):
+        if name not in ('api', 'web'):
+            raise SupervisorError(f'unknown service {name}')
+
+    def stop(self, name):
+        self._check(name)
+        self.call_list.append(('stop', name))
+
+    def restart(self, name):
+        self._check(name)
+        self.call_list.append(('restart', name))
+
+
+class FakeDiagnostics(object):
+    async def dump(self, name, kinds, timeout=None):
+        return {'dir': name, 'files': {}, 'errors': {}, 'kinds': kinds, 'timeout': timeout}
+
+
+def new_server(tmp_path):
+    return ControlServer(FakeSupervisor(), str(tmp_path), FakeDiagnostics())
+
+
+def request(server, cmd, name=None, token=None, **kwargs):
+    data = {'token': server.token if token is None else token, 'cmd': cmd, 'name': name}
+    data.update(kwargs)
+    return asyncio.run(server.handle_request(data))
+
+
+def test_reject_bad_token(tmp_path):
+    server = new_server(tmp_path)
+    with pytest.raises(ControlError, match='invalid token'):
+        request(server, 'status', token='bad')
+    with pytest.raises(ControlError, match='invalid token'):
+        request(server, 'stop', 'api', token='')
+    assert server.supervisor.call_list == []
+
+
+def test_status(tmp_path):
+    response = request(new_server(tmp_path), 'status')
+    assert response['ok']
+    api, web = response['services']
+    assert api['name'] == 'api' and api['restarts'] == 1
+    assert 59 <= api['uptime'] < 120
+    assert web['uptime'] is None and web['rss'] is None
+
+
+def test_stop_restart_and_errors(tmp_path):
+    server = new_server(tmp_path)
+    assert request(server, 'stop', 'api') == {'ok': True}
+    assert request(server, 'restart', 'web') == {'ok': True}
+    assert server.supervisor.call_list == [('stop', 'api'), ('restart', 'web')]
+
+    with pytest.raises(SupervisorError, match='unknown service'):
+        request(server, 'restart', 'nope')
+    with pytest.raises(ControlError, match='unknown cmd'):
+        request(server, 'kill', 'api')
+
+    response = request(server, 'dump', 'api', kinds=['histo'], timeout=30)
+    assert response['kinds'] == ['histo'] and response['timeout'] == 30.0
+    with pytest.raises(ControlError, match='timeout'):
+        request(server, 'dump', 'api', timeout=0)
+
+
+def test_send_command(tmp_path):
+    server = new_server(tmp_path)
+    dest_dir = str(tmp_path)
+
+    async def run():
+        await server.start()
+        loop = asyncio.get_event_loop()
+        try:
+            status = await loop.run_in_executor(None, send_command, dest_dir, 'status')
+            await loop.run_in_executor(None, send_command, dest_dir, 'stop', 'web')
+            try:
+                await loop.run_in_executor(None, send_command, dest_dir, 'stop', 'nope')
+            except ControlError as e:
+                error = str(e)
+        finally:
+            await server.close()
+        return status, error
+
+    status, error = asyncio.run(run())
+    assert [s['name'] for s in status['services']] == ['api', 'web']
+    assert error == 'unknown service nope'
+    assert server.supervisor.call_list == [('stop', 'web')]
+    assert not os.path.exists(tmp_path / CONTROL_FILE_NAME)
+
+    with pytest.raises(ControlError, match='not running'):
+        send_command(dest_dir, 'status')
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='posix file mode')
+def test_control_file_mode(tmp_path):
+    path = tmp_path / CONTROL_FILE_NAME
+    path.write_text('{}')
+    path.chmod(0o644)
+    server = new_server(tmp_path)
+
+    async def run():
+        await server.start()
+        try:
+            return stat.S_IMODE(os.stat(path).st_mode)
+        finally:
+            await server.close()
+
+    assert asyncio.run(run()) == 0o600
+
+
+@pytest.mark.parametrize('reply, error', [
+    (b'', 'closed the connection without a response'),
+    (b'{"ok": tr', 'closed the connection without a response'),
+    (b'not json\n', 'invalid response from pyrunjvm'),
+])
+def test_send_command_bad_reply(tmp_path, reply, error):
+    async def handle_client(reader, writer):
+        await reader.readline()
+        writer.write(reply)
+        await writer.drain()
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(handle_client, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        (tmp_path / CONTROL_FILE_NAME).write_text(f'{{"pid": 1, "port": {port}, "token": "t"}}')
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(None, send_command, str(tmp_path), 'status')
+        except ControlError as e:
+            return str(e)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    assert error in asyncio.run(run())
@@ -0,0 +1,112 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+from pyrunjvm.context import Project
+from pyrunjvm.diagnostics import Diagnostics, DiagnosticsError, get_jfr_jvm_args
+
+
+class FakeContext(object):
+    def __init__(self, config, jfr=False, java_version=17):
+        self.config = config
+        self.jfr = jfr
+        self.java_version = java_version
+
+    def resolve_config_value(self, value):
+        return value
+
+    def get_java_version(self):
+        return self.java_version
+
+
+class FakeProcess(object):
+    def __init__(self, pid, returncode=None):
+        self.pid = pid
+        self.returncode = returncode
+
+
+class FakeSupervisor(object):
+    def __init__(self, proc_map):
+        self.proc_map = proc_map
+
+
+# 模拟 jcmd, JFR.dump 把 pid 写到 filename, pid 为 4 时一直不返回
+JCMD_SCRIPT = '''
+import sys
+import time
+pid, cmd = sys.argv[1], sys.argv[2]
+print(pid + ':')
+if pid == '4':
+    time.sleep(30)
+if cmd == 'JFR.dump':
+    if pid == '2':
+        print('No recording with name pyrunjvm')
+    else:
+        open(sys.argv[4].split('=', 1)[1], 'w').write(pid)
+else:
+    print(cmd)
+'''
+
+
+def test_jfr_jvm_args():
+    config = {'jfr': {'max_size': '100m'}}
+    assert get_jfr_jvm_args(FakeContext(config), 'a') == []
+
+    args = get_jfr_jvm_args(FakeContext(config, jfr=True), 'a')
+    assert args == [
+        '-XX:StartFlightRecording=name=pyrunjvm,settings=default,maxsize=100m,maxage=30m,disk=true'
+    ]
+
+    # 项目配置优先
+    assert get_jfr_jvm_args(FakeContext(config, jfr=True), 'a', {'jfr': False}) == []
+    assert get_jfr_jvm_args(FakeContext(config, java_version=8), 'a', {'jfr': True}) == []
+
+
+def new_diagnostics(tmp_path):
+    jcmd = tmp_path / 'jcmd'
+    if sys.platform == 'win32':
+        pytest.skip('jcmd stub needs a shebang')
+    jcmd.write_text(f'#!{sys.executable}\n{JCMD_SCRIPT}')
+    jcmd.chmod(0o755)
+
+    project = Project('api', 'api', {})
+    project.proc = FakeProcess(2)
+    supervisor = FakeSupervisor({
+        'tomcat': FakeProcess(1), 'stopped': FakeProcess(3, 0), 'hang': FakeProcess(4),
+    })
+    return Diagnostics(supervisor, [project], str(tmp_path / 'diagnostics'), str(jcmd))
+
+
+def test_dump(tmp_path):
+    diagnostics = new_diagnostics(tmp_path)
+
+    result = asyncio.run(diagnostics.dump('tomcat', ['threads', 'jfr']))
+    assert result['errors'] == {}
+    assert os.path.dirname(result['dir']) == str(tmp_path / 'diagnostics' / 'tomcat')
+    with open(result['files']['threads']) as f:
+        assert f.read() == '1:\nThread.print\n'
+    with open(result['files']['jfr']) as f:
+        assert f.read() == '1'
+
+    # 按项目名查找, 没有 jfr 记录时只有 jfr 失败
+    result = asyncio.run(diagnostics.dump('api', ['histo', 'jfr']))
+    assert list(result['files']) == ['histo']
+    assert result['errors']['jfr'].startswith('No recording with name pyrunjvm')
+
+
+def test_dump_errors(tmp_path):
+    diagnostics = new_diagnostics(tmp_path)
+
+    for name, kinds in (('unknown', []), ('stopped', []), ('tomcat', ['heap'])):
+        with pytest.raises(DiagnosticsError):
+            asyncio.run(diagnostics.dump(name, kinds))
+    assert not os.path.exists(tmp_path / 'diagnostics')
+
+
+def test_dump_timeout(tmp_path):
+    diagnostics = new_diagnostics(tmp_path)
+
+    result = asyncio.run(diagnostics.dump('hang', ['threads'], timeout=0.5))
+    assert result['errors']['threads'] == 'jcmd Thread.print timeout after 0.5s'
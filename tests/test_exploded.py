@@ -0,0 +1,85 @@
+import os
+import zipfile
+
+import pytest
+
+from pyrunjvm.exploded import ExplodedJar, ExplodeError, parse_manifest, parse_classpath_index
+
+
+MANIFEST = '''Manifest-Version: 1.0
+Main-Class: org.springframework.boot.loader.JarLauncher
+Start-Class: com.example.Demo
+ Application
+Spring-Boot-Classes: BOOT-INF/classes/
+Spring-Boot-Lib: BOOT-INF/lib/
+Spring-Boot-Classpath-Index: BOOT-INF/classpath.idx
+'''
+
+
+def write_jar(path, lib_map, app_class=b'app'):
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('META-INF/MANIFEST.MF', MANIFEST)
+        z.writestr('BOOT-INF/classes/com/example/DemoApplication.class', app_class)
+        index = ''
+        for name, data in lib_map.items():
+            z.writestr(f'BOOT-INF/lib/{name}', data)
+            index += f'- "BOOT-INF/lib/{name}"\n'
+        z.writestr('BOOT-INF/classpath.idx', index)
+
+
+def test_parse_manifest():
+    m = parse_manifest(MANIFEST)
+    assert m['Start-Class'] == 'com.example.DemoApplication'
+    assert m['Spring-Boot-Lib'] == 'BOOT-INF/lib/'
+
+
+def test_parse_classpath_index():
+    assert parse_classpath_index('- "BOOT-INF/lib/a.jar"\n- "BOOT-INF/lib/b.jar"\n') == [
+        'BOOT-INF/lib/a.jar', 'BOOT-INF/lib/b.jar'
+    ]
+
+
+def test_extract(tmp_path):
+    jar = str(tmp_path / 'demo.jar')
+    dest = str(tmp_path / 'exploded')
+    write_jar(jar, {'z.jar': b'z', 'a.jar': b'a'})
+
+    e = ExplodedJar(jar, dest)
+    assert e.extract()
+    assert e.main_class == 'com.example.DemoApplication'
+    assert [os.path.relpath(p, dest) for p in e.class_path] == [
+        'classes.jar', os.path.join('lib', 'z.jar'), os.path.join('lib', 'a.jar')
+    ]
+    with zipfile.ZipFile(e.class_path[0]) as z:
+        assert z.namelist() == ['com/example/DemoApplication.class']
+
+    # jar 没有变化
+    assert not ExplodedJar(jar, dest).extract()
+
+
+def test_extract_incremental(tmp_path):
+    jar = str(tmp_path / 'demo.jar')
+    dest = str(tmp_path / 'exploded')
+    write_jar(jar, {'a.jar': b'a', 'b.jar': b'b'})
+    ExplodedJar(jar, dest).extract()
+
+    a_jar = os.path.join(dest, 'lib', 'a.jar')
+    os.utime(a_jar, (1, 1))
+    write_jar(jar, {'a.jar': b'a', 'c.jar': b'c'}, app_class=b'app2')
+
+    e = ExplodedJar(jar, dest)
+    assert e.extract()
+    # 没有变化的 jar 不会重写
+    assert os.stat(a_jar).st_mtime == 1
+    assert sorted(os.listdir(os.path.join(dest, 'lib'))) == ['a.jar', 'c.jar']
+    with zipfile.ZipFile(e.class_path[0]) as z:
+        assert z.read('com/example/DemoApplication.class') == b'app2'
+
+
+def test_extract_not_spring_boot_jar(tmp_path):
+    jar = str(tmp_path / 'plain.jar')
+    with zipfile.ZipFile(jar, 'w') as z:
+        z.writestr('META-INF/MANIFEST.MF', 'Manifest-Version: 1.0\nMain-Class: com.example.Main\n')
+
+    with pytest.raises(ExplodeError):
+        ExplodedJar(jar, str(tmp_path / 'exploded')).extract()
@@ -0,0 +1,42 @@
+import os
+
+from pyrunjvm.fingerprint import BuildCache, collect_files, compute_fingerprint
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_collect_files_with_exclude(tmp_path):
+    write(tmp_path / 'src' / 'a.java', 'a')
+    write(tmp_path / 'src' / 'sub' / 'b.java', 'b')
+    write(tmp_path / 'src' / 'sub' / 'b.bak', 'b')
+
+    files = collect_files(str(tmp_path), ['src/**/*', '!**/*.bak'])
+    assert [rel for rel, _ in files] == ['src/a.java', 'src/sub/b.java']
+
+
+def test_fingerprint_changes(tmp_path):
+    src = tmp_path / 'src' / 'a.java'
+    write(src, 'a')
+
+    base = str(tmp_path)
+    fp = compute_fingerprint(base, ['src/**'], ['gradle build'], mode='hash')
+    assert fp == compute_fingerprint(base, ['src/**'], ['gradle build'], mode='hash')
+    assert fp != compute_fingerprint(base, ['src/**'], ['gradle jar'], mode='hash')
+    assert fp != compute_fingerprint(
+        base, ['src/**'], ['gradle build'], {'A': '1'}, mode='hash')
+
+    write(src, 'b')
+    assert fp != compute_fingerprint(base, ['src/**'], ['gradle build'], mode='hash')
+
+
+def test_build_cache_roundtrip(tmp_path):
+    p = str(tmp_path / 'cache.json')
+    cache = BuildCache(p)
+    cache.set('api', 'abc')
+    cache.save()
+
+    assert os.path.isfile(p)
+    assert BuildCache(p).get('api') == 'abc'
@@ -0,0 +1,125 @@
+import sys
+import asyncio
+
+import pytest
+
+from pyrunjvm.context import load_context
+from pyrunjvm.application import create_application
+
+
+# -Dname 是服务名, -Ddelay 秒后打印就绪日志, -Dexit 不为空时直接退出,
+# 启动、就绪和退出的时间写到 -Devents 文件里
+STUB_JAVA = '''#!%s
+import sys, time
+opts = dict(a[2:].split('=', 1) for a in sys.argv if a.startswith('-D'))
+def event(kind):
+    with open(opts['events'], 'a') as f:
+        f.write('%%f %%s %%s\\n' %% (time.time(), kind, opts['name']))
+event('start')
+if opts.get('exit'):
+    event('exit')
+    sys.exit(1)
+time.sleep(float(opts.get('delay', '0.1')))
+event('ready')
+print('Started', flush=True)
+time.sleep(60)
+'''
+
+PROJECT = '''
+[[projects]]
+path = "app"
+name = "%s"
+jar_path = "app.jar"
+jvm_opts = ["-Dname=%s", "-Devents=${WORK_DIR}/events.txt", %s]
+depends_on = [%s]
+ready = { type = "log", pattern = "Started", interval = 0.05, timeout = 10 }
+'''
+
+CONFIG = '''app_type = "flatjar"
+
+[flatjar]
+max_parallel_starts = 2
+
+[env]
+JAVA_BIN = "%s"
+
+[shutdown]
+grace_period = 2
+'''
+
+
+def write_config(tmp_path, project_list):
+    java = tmp_path / 'java'
+    java.write_text(STUB_JAVA % sys.executable)
+    java.chmod(0o755)
+    (tmp_path / 'app').mkdir()
+
+    text = CONFIG % java
+    for name, opts, depends_on in project_list:
+        text += PROJECT % (
+            name, name, ', '.join(f'"{o}"' for o in opts),
+            ', '.join(f'"{d}"' for d in depends_on)
+        )
+    (tmp_path / '.pyrunjvm.toml').write_text(text)
+
+
+def read_events(tmp_path):
+    event_list = []
+    with open(tmp_path / 'events.txt') as f:
+        for line in f:
+            t, kind, name = line.split()
+            event_list.append((float(t), kind, name))
+    return sorted(event_list)
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='stub java needs a shebang')
+def test_staged_startup(tmp_path):
+    write_config(tmp_path, [
+        ('db', ['-Ddelay=0.5'], []),
+        ('api', [], ['db']),
+        ('bad', ['-Dexit=1'], []),
+        ('worker', [], ['bad']),
+        ('c1', ['-Ddelay=0.3'], []),
+        ('c2', ['-Ddelay=0.3'], []),
+    ])
+    context = load_context(
+        sys.platform, str(tmp_path), str(tmp_path / '.pyrunjvm.toml'), use_cache=False
+    )
+    app = create_application(context)
+    assert app.prepare_config()
+    app.pre_handle()
+    for project_config in context.config['projects']:
+        app.handle_project(project_config)
+    app.post_handle()
+
+    status_map = {}
+
+    def on_complete(report):
+        for name in report.name_list:
+            status_map[name] = report.result_map[name].status
+        asyncio.ensure_future(app.shutdown())
+
+    context.startup_listener = on_complete
+    app.run()
+
+    assert status_map == {
+        'db': 'ready', 'api': 'ready', 'bad': 'exited', 'worker': 'skipped',
+        'c1': 'ready', 'c2': 'ready',
+    }
+
+    event_list = read_events(tmp_path)
+    time_map = dict(((kind, name), t) for t, kind, name in event_list)
+    # 依赖就绪后才启动, 依赖失败的服务不启动
+    assert time_map['start', 'api'] > time_map['ready', 'db']
+    assert ('start', 'worker') not in time_map
+
+    # 同时处于启动中(已启动未就绪)的服务不超过 max_parallel_starts
+    starting = set()
+    max_starting = 0
+    for _, kind, name in event_list:
+        if kind == 'start':
+            starting.add(name)
+        else:
+            starting.discard(name)
+        max_starting = max(max_starting, len(starting))
+    assert max_starting == 2
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+
+import pyrunjvm
+
+
+# 这些模块导入较慢, 只能在用到的代码里导入
+HEAVY_MODULES = (
+    'pkg_resources', 'jinja2', 'tomlkit', 'dotenv', 'psutil',
+    'asyncio', 'urllib.request', 'pyrunjvm.application',
+)
+
+# 导入 pyrunjvm.cli 的时间上限(微秒), 留出足够的余量避免在慢机器上误报
+IMPORT_TIME_BUDGET = 500000
+
+
+def get_env():
+    # 使用当前源码目录里的 pyrunjvm
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(pyrunjvm.__file__)))
+    return env
+
+
+def import_time(module):
+    out = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        stderr=subprocess.PIPE, check=True, env=get_env()
+    ).stderr.decode('utf-8')
+
+    result = {}
+    for line in out.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        result[name.strip()] = int(cumulative)
+    return result
+
+
+def test_cli_import_is_lazy():
+    result = import_time('pyrunjvm.cli')
+    loaded = [m for m in HEAVY_MODULES if m in result]
+    assert loaded == []
+    assert result['pyrunjvm.cli'] < IMPORT_TIME_BUDGET
+
+
+def test_version_fast_path(tmp_path):
+    # --version 不读取配置文件
+    out = subprocess.run(
+        [sys.executable, '-m', 'pyrunjvm.cli', '--version', '-c', str(tmp_path / 'not_exist.toml')],
+        stdout=subprocess.PIPE, check=True, cwd=str(tmp_path), env=get_env()
+    ).stdout.decode('utf-8')
+    assert out.startswith('version: ')
@@ -0,0 +1,70 @@
+import pytest
+
+from pyrunjvm.interpolate import Resolver, InterpolationError
+
+
+def test_resolve():
+    r = Resolver([{'HOME': '/root', 'APP': '${HOME}/app', 'LOG': '$APP/logs'}])
+    assert r.resolve('${LOG}/a.log') == '/root/app/logs/a.log'
+    assert r.resolve('no var') == 'no var'
+    # 不存在的变量原样保留
+    assert r.resolve('${NOT_EXIST} $NOT_EXIST') == '${NOT_EXIST} $NOT_EXIST'
+
+
+def test_resolve_default():
+    r = Resolver([{'APP': '/app', 'EMPTY': ''}])
+    assert r.resolve('${LOG_DIR:-${APP}/logs}') == '/app/logs'
+    assert r.resolve('${EMPTY:-x}') == 'x'
+    assert r.resolve('${APP:-x}') == '/app'
+
+
+def test_resolve_escape():
+    r = Resolver([{'HOME': '/root'}])
+    assert r.resolve('$$HOME') == '$HOME'
+
+    r = Resolver([{'HOME': '/root'}], keep_escape=True)
+    assert r.resolve('$$HOME ${HOME}') == '$$HOME /root'
+
+
+def test_resolve_layer_order():
+    r = Resolver([{'A': 'env'}, {'A': 'config', 'B': 8080, 'T': {'x': 1}}])
+    assert r.resolve('$A $B ${T}') == 'env 8080 ${T}'
+
+
+def test_resolve_cycle():
+    r = Resolver([{'A': '${B}', 'B': 'x${C}', 'C': '$A'}])
+    with pytest.raises(InterpolationError) as e:
+        r.resolve('${A}')
+    assert 'A -> B -> C -> A' in str(e.value)
+
+    r = Resolver([{'A': '${A}x'}])
+    with pytest.raises(InterpolationError):
+        r.resolve('${A}')
+
+
+def test_resolve_self_reference_from_lower_layer():
+    r = Resolver([{'PATH': '${PATH}:/opt/bin'}, {'PATH': '/usr/bin'}])
+    assert r.resolve('$PATH') == '/usr/bin:/opt/bin'
+    assert r.resolve_var('PATH') == '/usr/bin:/opt/bin'
+
+    # 每一层都可以引用下一层
+    r = Resolver([
+        {'OPTS': '${OPTS} -Xmx1g', 'X': '[$OPTS]'},
+        {'OPTS': '${OPTS} -ea'},
+        {'OPTS': '-server'},
+    ])
+    assert r.resolve('$X') == '[-server -ea -Xmx1g]'
+
+
+def test_context_env_refers_to_os_variable(tmp_path, monkeypatch):
+    from pyrunjvm.context import Context
+
+    monkeypatch.setenv('PATH', '/usr/bin')
+    monkeypatch.setenv('JAVA_OPTS', '-server')
+    config = {'env': {'JAVA_OPTS': '${JAVA_OPTS} -ea'}}
+    context = Context('linux', str(tmp_path), config, {
+        'PATH': '${PATH}:/opt/bin', 'JAVA_OPTS': '${JAVA_OPTS} -Xmx1g',
+    })
+    assert context.environ['PATH'] == '/usr/bin:/opt/bin'
+    assert context.environ['JAVA_OPTS'] == '-server -ea -Xmx1g'
+    assert context.resolve_config_value('$PATH') == '/usr/bin:/opt/bin'
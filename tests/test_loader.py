@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+from pyrunjvm.loader import (
+    ConfigCache, ConfigError, read_config, merge_config, get_referenced_env_names
+)
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_merge_config():
+    base = {'a': 1, 't': {'x': 1, 'y': 1}, 'projects': [{'path': 'a'}], 'opts': ['-a']}
+    override = {'t': {'y': 2}, 'projects': [{'path': 'b'}], 'opts': ['-b']}
+    assert merge_config(base, override) == {
+        'a': 1,
+        't': {'x': 1, 'y': 2},
+        'projects': [{'path': 'a'}, {'path': 'b'}],
+        'opts': ['-b'],
+    }
+
+
+def test_read_config_include(tmp_path):
+    os.mkdir(tmp_path / 'shared')
+    write(tmp_path / 'shared' / 'common.toml', '''
+app_type = "tomcat"
+[shutdown]
+grace_period = 10
+[[projects]]
+path = "common"
+''')
+    write(tmp_path / '.pyrunjvm.toml', '''
+include = "shared/common.toml"
+app_type = "flatjar"
+[[projects]]
+path = "app"
+''')
+
+    config, file_list = read_config(str(tmp_path / '.pyrunjvm.toml'))
+    assert config['app_type'] == 'flatjar'
+    assert config['shutdown'] == {'grace_period': 10}
+    assert [p['path'] for p in config['projects']] == ['common', 'app']
+    assert 'include' not in config
+    assert len(file_list) == 2
+
+
+def test_read_config_include_cycle(tmp_path):
+    write(tmp_path / 'a.toml', 'include = ["b.toml"]\n')
+    write(tmp_path / 'b.toml', 'include = ["a.toml"]\n')
+    with pytest.raises(ConfigError):
+        read_config(str(tmp_path / 'a.toml'))
+
+
+def test_get_referenced_env_names():
+    config = {'jar_path': '${APP_HOME}/app.jar', 'cmds': ['$GRADLE_BIN build']}
+    environ = {'APP_HOME': '${BASE}/app', 'BASE': '/opt', 'OTHER': '1'}
+    assert get_referenced_env_names(config, None, environ) == ['APP_HOME', 'BASE', 'GRADLE_BIN']
+
+
+def test_config_cache(tmp_path, monkeypatch):
+    config_file = str(tmp_path / '.pyrunjvm.toml')
+    env_file = str(tmp_path / '.env')
+    write(config_file, 'app_type = "flatjar"\n')
+    monkeypatch.setenv('APP_HOME', '/opt')
+
+    cache = ConfigCache(str(tmp_path / 'cache.json'))
+    cache.save('linux', str(tmp_path), [config_file], [env_file], ['APP_HOME'], {'app_type': 'flatjar'}, None)
+    data = cache.load('linux', str(tmp_path), [env_file])
+    assert data['config'] == {'app_type': 'flatjar'}
+
+    # 没有引用的环境变量变化不影响缓存
+    monkeypatch.setenv('OTHER', '1')
+    assert cache.load('linux', str(tmp_path), [env_file]) is not None
+
+    # 引用的环境变量变化
+    monkeypatch.setenv('APP_HOME', '/usr')
+    assert cache.load('linux', str(tmp_path), [env_file]) is None
+
+    # env 文件新建
+    cache.save('linux', str(tmp_path), [config_file], [env_file], [], {'app_type': 'flatjar'}, None)
+    assert cache.load('linux', str(tmp_path), [env_file]) is not None
+    write(env_file, 'A=1\n')
+    assert cache.load('linux', str(tmp_path), [env_file]) is None
+
+
+def test_load_context_cache_same_args(tmp_path, capsys):
+    from pyrunjvm.context import load_context
+    from pyrunjvm.application import create_application
+
+    (tmp_path / 'app').mkdir()
+    write(str(tmp_path / '.pyrunjvm.toml'), '''app_type = "flatjar"
+jvm_opts = ["-Dfoo=${WORK_DIR}/proj"]
+
+[env]
+JAVA_BIN = "${WORK_DIR}/java"
+APP_DIR = "${WORK_DIR}/app"
+
+[[projects]]
+path = "app"
+jar_path = "${APP_DIR}/app.jar"
+''')
+
+    def get_cmd_list():
+        context = load_context('linux', str(tmp_path), str(tmp_path / '.pyrunjvm.toml'))
+        app = create_application(context)
+        app.pre_handle()
+        app.handle_project(context.config['projects'][0])
+        config = app.flatjar_config_list[0]
+        return app.get_cmd_list(config, context.jvm_arg_list), context.environ['APP_DIR']
+
+    cmd_list, app_dir = get_cmd_list()
+    assert 'use config cache' not in capsys.readouterr().out
+    # 第二次使用缓存, 传给 java 的参数和环境变量不变
+    assert get_cmd_list() == (cmd_list, app_dir)
+    assert 'use config cache' in capsys.readouterr().out
+    assert cmd_list[:2] == [str(tmp_path / 'java'), f'-Dfoo={tmp_path}/proj']
+    assert app_dir == str(tmp_path / 'app')
+
+
+def test_create_context(tmp_path):
+    import pyrunjvm
+
+    write(str(tmp_path / '.env'), 'FROM_FILE=1\n')
+    write(str(tmp_path / '.pyrunjvm.toml'), 'app_type = "flatjar"\njvm_opts = ["-Dhome=${APP_HOME}"]\n')
+    context = pyrunjvm.create_context(
+        'linux', str(tmp_path), str(tmp_path / '.pyrunjvm.toml'), {'APP_HOME': '/opt/app'}
+    )
+    assert context.jvm_arg_list == ['-Dhome=/opt/app']
+    assert 'FROM_FILE' not in context.env_keys
+    assert not os.path.exists(tmp_path / '.pyrunjvm' / 'config_cache.json')
+
+    assert pyrunjvm.create_context('linux', str(tmp_path), str(tmp_path / 'missing.toml'), None) is None
@@ -0,0 +1,26 @@
+from pyrunjvm.logs import RotatingLogFile, parse_size
+
+
+def test_parse_size():
+    assert parse_size(1024) == 1024
+    assert parse_size('2K') == 2048
+    assert parse_size('50MB') == 50 * 1024 * 1024
+    assert parse_size('') == 0
+
+
+def test_rotate_on_open_and_size(tmp_path):
+    path = tmp_path / 'app.log'
+    path.write_bytes(b'last run\n')
+
+    log_file = RotatingLogFile(str(path), max_bytes=10, backup_count=2).open()
+    assert (tmp_path / 'app.log.1').read_bytes() == b'last run\n'
+
+    log_file.write(b'0123456789')
+    log_file.write(b'abc')
+    log_file.write(b'def')
+    log_file.close()
+
+    assert path.read_bytes() == b'abcdef'
+    assert (tmp_path / 'app.log.1').read_bytes() == b'0123456789'
+    assert (tmp_path / 'app.log.2').read_bytes() == b'last run\n'
+    assert not (tmp_path / 'app.log.3').exists()
@@ -0,0 +1,58 @@
+import pytest
+
+from pyrunjvm.memory import (
+    MemoryPlanner, MemoryRequest, MemoryBudgetError, parse_size, get_jvm_sizes, MB
+)
+
+
+def test_parse_size():
+    assert parse_size('512m') == 512 * MB
+    assert parse_size('1.5G') == 1536 * MB
+    assert parse_size(1024) == 1024
+    with pytest.raises(MemoryBudgetError):
+        parse_size('lots')
+
+    assert get_jvm_sizes(['-Xmx1g', '-XX:ReservedCodeCacheSize=32m', '-Xss512k']) == {
+        'heap': 1024 * MB, 'code_cache': 32 * MB
+    }
+
+
+def new_planner(budget):
+    return MemoryPlanner(budget, '100m', '50m', '50m', '64m')
+
+
+def test_split_by_weight():
+    allocation_list = new_planner('1400m').plan([
+        MemoryRequest('a'), MemoryRequest('b', weight=3),
+    ])
+    # 每个进程固定 200m, 剩下 1000m 按 1:3 分配
+    assert [a.heap // MB for a in allocation_list] == [250, 750]
+    assert allocation_list[0].get_jvm_args() == [
+        '-Xmx250m', '-XX:MaxMetaspaceSize=100m', '-XX:ReservedCodeCacheSize=50m'
+    ]
+
+
+def test_min_heap_and_fixed_flags():
+    allocation_list = new_planner('1500m').plan([
+        MemoryRequest('a', weight=1, min_heap='300m'),
+        MemoryRequest('b', weight=9),
+        MemoryRequest('c', ['-Xmx200m', '-XX:MaxMetaspaceSize=64m']),
+    ])
+    a, b, c = allocation_list
+    assert a.heap == 300 * MB
+    assert c.heap == 200 * MB
+    assert c.get_jvm_args() == ['-XX:ReservedCodeCacheSize=50m']
+    assert sum(x.total for x in allocation_list) <= 1500 * MB
+    assert b.heap == 436 * MB
+
+
+def test_budget_can_not_be_met():
+    with pytest.raises(MemoryBudgetError) as e:
+        new_planner('500m').plan([MemoryRequest('a'), MemoryRequest('b')])
+    assert 'short of' in str(e.value)
+
+
+@pytest.mark.parametrize('weight', [0, -1, 'heavy'])
+def test_invalid_weight(weight):
+    with pytest.raises(MemoryBudgetError, match='memory_weight must be a positive number'):
+        MemoryRequest('a', weight=weight)
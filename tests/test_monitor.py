@@ -0,0 +1,17 @@
+from pyrunjvm.monitor import parse_jstat_output
+
+
+JSTAT_OUTPUT = '''  S0     S1     E      O      M     CCS    YGC     YGCT    FGC    FGCT     CGC    CGCT     GCT
+  0.00 100.00  42.86  12.50  97.62  91.30      3    0.012     0    0.000     2    0.003    0.015
+'''
+
+
+def test_parse_jstat_output():
+    gct, old = parse_jstat_output(JSTAT_OUTPUT)
+    assert gct == 0.015
+    assert old == 12.5
+
+
+def test_parse_jstat_output_invalid():
+    assert parse_jstat_output('') == (None, None)
+    assert parse_jstat_output('12345 not found\n') == (None, None)
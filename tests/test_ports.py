@@ -0,0 +1,46 @@
+import socket
+
+import pytest
+
+from pyrunjvm.ports import PortAllocator, PortError, parse_port_range, probe_port
+
+
+def test_parse_port_range():
+    assert parse_port_range('20000-20010') == (20000, 20010)
+    assert parse_port_range([20000, 20010]) == (20000, 20010)
+    with pytest.raises(PortError):
+        parse_port_range('20010-20000')
+
+
+def test_allocate_distinct_ports_and_reuse(tmp_path):
+    state = str(tmp_path / 'ports.json')
+    allocator = PortAllocator(state, (40000, 40100), use_psutil=False)
+    ports = allocator.allocate(['a', 'b', 'c'], exclude=[40000])
+
+    assert len(set(ports.values())) == 3
+    assert 40000 not in ports.values()
+
+    again = PortAllocator(state, (40000, 40100), use_psutil=False)
+    assert again.allocate(['a', 'b', 'c']) == ports
+
+
+def test_busy_port_is_not_reused(tmp_path):
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('', 0))
+    s.listen(1)
+    busy = s.getsockname()[1]
+    try:
+        assert not probe_port(busy)
+
+        allocator = PortAllocator(None, (busy, min(busy + 50, 65535)), use_psutil=False)
+        allocator.assigned['a'] = busy
+        assert allocator.allocate(['a'])['a'] != busy
+    finally:
+        s.close()
+
+
+def test_no_free_port():
+    allocator = PortAllocator(None, (40000, 40000), use_psutil=False)
+    allocator.reserve(40000)
+    with pytest.raises(PortError):
+        allocator.allocate(['a'])
@@ -0,0 +1,62 @@
+import pytest
+
+from pyrunjvm.profiles import (
+    ProfileResolver, ProfileError, merge_jvm_opts, filter_jvm_opts, get_option_key
+)
+
+
+def test_option_key():
+    assert get_option_key('-XX:+UseSerialGC') == get_option_key('-XX:+UseG1GC') == '-XX:gc'
+    assert get_option_key('-XX:MaxRAMPercentage=5') == '-XX:MaxRAMPercentage'
+    assert get_option_key('-Xmx512m') == '-Xmx'
+    assert get_option_key('-Dfoo=bar') == '-Dfoo'
+    assert get_option_key('-javaagent:a.jar') is None
+    assert get_option_key('--add-opens') is None
+
+
+def test_merge_jvm_opts():
+    profile = ['-XX:+UseSerialGC', '-Xmx256m', '-XX:TieredStopAtLevel=1']
+    user = ['-XX:+UseG1GC', '-Xmx1g', '-Dapp=1']
+    assert merge_jvm_opts(profile, None, user) == [
+        '-XX:TieredStopAtLevel=1', '-XX:+UseG1GC', '-Xmx1g', '-Dapp=1'
+    ]
+
+
+def test_merge_keeps_two_token_options():
+    a = ['--add-opens', 'java.base/java.lang=ALL-UNNAMED', '-Xmx1g', '-javaagent:a.jar']
+    b = ['--add-opens', 'java.base/java.util=ALL-UNNAMED', '-Xmx2g', '-javaagent:a.jar']
+    assert merge_jvm_opts(a, b) == [
+        '--add-opens', 'java.base/java.lang=ALL-UNNAMED', '-javaagent:a.jar',
+        '--add-opens', 'java.base/java.util=ALL-UNNAMED', '-Xmx2g', '-javaagent:a.jar',
+    ]
+    # 值看起来像 -D 参数时也不会被删除
+    assert merge_jvm_opts(['-cp', '-Dx=1'], ['-Dx=2']) == ['-cp', '-Dx=1', '-Dx=2']
+
+
+def test_filter_by_java_version():
+    opts = ['-XX:MaxRAMPercentage=5', '-XX:+UseBiasedLocking', '-Xss512k']
+    assert filter_jvm_opts(opts, 8)[0] == ['-XX:+UseBiasedLocking', '-Xss512k']
+    result, reason_list = filter_jvm_opts(opts, 21)
+    assert result == ['-XX:MaxRAMPercentage=5', '-Xss512k']
+    assert 'removed' in reason_list[0]
+    # 获取不到版本时不过滤
+    assert filter_jvm_opts(opts, None)[0] == opts
+
+
+def test_user_profiles():
+    resolver = ProfileResolver({
+        'dev': {'extends': 'fast-start', 'jvm_opts': ['-XX:+UseParallelGC', '-Xmx${HEAP}']},
+        'loop': {'extends': 'loop'},
+    }, lambda v: v.replace('${HEAP}', '512m'))
+
+    opts = resolver.resolve('dev')
+    assert '-XX:TieredStopAtLevel=1' in opts
+    assert '-XX:+UseSerialGC' not in opts
+    assert opts[-2:] == ['-XX:+UseParallelGC', '-Xmx512m']
+
+    assert resolver.resolve('fast-start,throughput')[-1] == '-Xmx2g'
+
+    with pytest.raises(ProfileError, match='cycle'):
+        resolver.resolve('loop')
+    with pytest.raises(ProfileError, match='unknown profile'):
+        resolver.resolve(['missing'])
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from pyrunjvm.readiness import HttpProbe, LogProbe, TcpProbe, create_probe, create_ready_probe
+
+
+class FakeContext(object):
+    def resolve_config_value(self, value):
+        return value
+
+
+def test_create_probe():
+    context = FakeContext()
+    assert create_probe(context, None) is None
+
+    probe = create_probe(context, {'type': 'http', 'path': 'health'}, 8080)
+    assert isinstance(probe, HttpProbe)
+    assert probe.url == 'http://127.0.0.1:8080/health'
+
+    probe = create_probe(context, {'type': 'tcp', 'timeout': 5}, 8080)
+    assert isinstance(probe, TcpProbe)
+    assert probe.timeout == 5
+
+    with pytest.raises(ValueError):
+        create_probe(context, {'type': 'log'})
+
+
+@pytest.mark.parametrize('ready_config, error', [
+    ({'type': 'tcp'}, 'tcp ready probe needs port'),
+    ({'type': 'grpc', 'port': 80}, 'unknown ready probe type grpc'),
+    ({'type': 'tcp', 'port': 'abc'}, "ready port must be a number, but it is 'abc'"),
+    ({'type': 'log', 'pattern': 'x', 'timeout': '1m'}, "ready timeout must be a number"),
+    ({'type': 'log', 'pattern': 'x', 'interval': 0}, 'ready interval must be positive'),
+    ({'type': 'log', 'pattern': '('}, "ready pattern '(' is invalid"),
+    ('log', "ready must be a table"),
+])
+def test_create_ready_probe_error(ready_config, error, capsys):
+    with pytest.raises(SystemExit):
+        create_ready_probe(FakeContext(), 'api', ready_config)
+    assert capsys.readouterr().out.startswith(f'error: api {error}')
+
+
+def test_log_probe_reads_incrementally(tmp_path):
+    log = tmp_path / 'a.log'
+    probe = LogProbe(str(log), r'Started .* in')
+
+    assert not asyncio.run(probe.check())
+
+    log.write_text('booting\nStarted App')
+    assert not asyncio.run(probe.check())
+
+    with open(log, 'a') as f:
+        f.write(' in 3 seconds\n')
+    assert asyncio.run(probe.check())
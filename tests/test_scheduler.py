@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+from pyrunjvm.scheduler import BuildScheduler, BuildError
+
+
+class FakeContext(object):
+    def __init__(self):
+        self.environ = dict(os.environ)
+
+    def resolve_cmd(self, cmd):
+        return cmd
+
+
+def py_cmd(code):
+    return '"%s" -c "%s"' % (sys.executable, code)
+
+
+def test_run_in_dependency_order(tmp_path):
+    out = tmp_path / 'order.txt'
+    append = "open(r'%s', 'a').write('%%s\\n')" % out
+
+    scheduler = BuildScheduler(FakeContext(), 4)
+    scheduler.add_task('c', [py_cmd(append % 'c')], ['a', 'b'])
+    scheduler.add_task('a', [py_cmd(append % 'a')])
+    scheduler.add_task('b', [py_cmd(append % 'b')], ['a'])
+
+    assert scheduler.run()
+    assert out.read_text().split() == ['a', 'b', 'c']
+
+    path, _ = scheduler.critical_path()
+    assert path == ['a', 'b', 'c']
+
+
+def test_stop_on_first_failure():
+    scheduler = BuildScheduler(FakeContext(), 2)
+    scheduler.add_task('a', [py_cmd('import sys; sys.exit(3)')])
+    scheduler.add_task('b', [py_cmd('pass')], ['a'])
+
+    assert not scheduler.run()
+    assert scheduler.task_map['a'].ok is False
+    assert scheduler.task_map['b'].skipped
+
+
+def test_cycle_is_reported():
+    scheduler = BuildScheduler(FakeContext())
+    scheduler.add_task('a', [], ['b'])
+    scheduler.add_task('b', [], ['a'])
+
+    with pytest.raises(BuildError, match='cycle'):
+        scheduler.run()
+
+
+def test_unknown_dependency():
+    scheduler = BuildScheduler(FakeContext())
+    scheduler.add_task('a', [], ['missing'])
+
+    with pytest.raises(BuildError, match='missing'):
+        scheduler.check()
+
+
+def test_batch_build(tmp_path):
+    from pyrunjvm.batch import BuildBatcher
+
+    gradlew = tmp_path / 'gradlew'
+    out = tmp_path / 'calls.txt'
+    gradlew.write_text(
+        '#!%s\nimport sys\nopen(r"%s", "a").write(" ".join(sys.argv[1:]) + "\\n")\n' % (sys.executable, out)
+    )
+    gradlew.chmod(0o755)
+
+    batcher = BuildBatcher(str(tmp_path))
+    scheduler = BuildScheduler(FakeContext(), 2, batcher=batcher)
+    for name, depends_on in (('a', []), ('b', ['a'])):
+        cmds = [f'{gradlew} :{name}:war']
+        scheduler.add_task(name, cmds, depends_on, batch=batcher.parse(cmds))
+    scheduler.add_task('c', [py_cmd('pass')])
+
+    assert scheduler.run()
+    assert out.read_text().split('\n') == [':a:war :b:war --parallel', '']
+    assert scheduler.task_map['b'].batched
+    assert not scheduler.task_map['c'].batched
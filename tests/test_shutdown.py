@@ -0,0 +1,54 @@
+import asyncio
+import sys
+
+import pytest
+
+from pyrunjvm.shutdown import ShutdownManager, new_process_group_kwargs
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='posix signals')
+
+IGNORE_TERM = 'import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print(1, flush=True); time.sleep(30)'
+
+
+async def spawn(code):
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, '-c', code,
+        stdout=asyncio.subprocess.PIPE, **new_process_group_kwargs()
+    )
+    await proc.stdout.readline()
+    return proc
+
+
+def test_stop_with_sigterm():
+    async def run():
+        manager = ShutdownManager(5)
+        proc = await spawn('import time; print(1, flush=True); time.sleep(30)')
+        return await manager.stop('a', proc)
+
+    result = asyncio.run(run())
+    assert result.method == 'SIGTERM'
+    assert result.seconds < 5
+
+
+def test_escalate_to_sigkill():
+    async def run():
+        manager = ShutdownManager(0.5)
+        proc = await spawn(IGNORE_TERM)
+        return await manager.stop('a', proc)
+
+    assert asyncio.run(run()).method == 'SIGTERM+SIGKILL'
+
+
+def test_graceful_command():
+    async def run():
+        manager = ShutdownManager(5)
+        proc = await spawn('import time; print(1, flush=True); time.sleep(30)')
+
+        async def graceful():
+            proc.terminate()
+            return True
+
+        manager.set_graceful('tomcat', graceful)
+        return await manager.stop('tomcat', proc)
+
+    assert asyncio.run(run()).method == 'SHUTDOWN'
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+
+from pyrunjvm.supervisor import (
+    RestartPolicy, StatusFile, Supervisor, SupervisorError, create_restart_policy
+)
+
+
+class FakeContext(object):
+    def __init__(self, config):
+        self.config = config
+
+    def resolve_config_value(self, value):
+        return value
+
+
+class FakeProcess(object):
+    pid = 1234
+
+    def __init__(self, returncode):
+        self.returncode = returncode
+
+    async def wait(self):
+        return self.returncode
+
+
+def test_restart_until_max_restarts(tmp_path):
+    path = str(tmp_path / 'status.json')
+    policy = RestartPolicy(enable=True, max_restarts=2, window=60, backoff=0.01)
+    supervisor = Supervisor(policy, StatusFile(path))
+    spawn_count = []
+
+    async def spawn():
+        spawn_count.append(1)
+        return FakeProcess(1)
+
+    async def run():
+        proc = await spawn()
+        supervisor.started('api', proc)
+        return await supervisor.supervise('api', proc, spawn)
+
+    assert asyncio.run(run()) == 1
+    assert len(spawn_count) == 3
+
+    with open(path) as f:
+        item = json.load(f)['processes'][0]
+    assert item['state'] == 'failed'
+    assert item['restarts'] == 2
+    assert [e['code'] for e in item['exits']] == [1, 1, 1]
+
+
+def test_clean_exit_is_not_restarted(tmp_path):
+    policy = RestartPolicy(enable=True)
+    supervisor = Supervisor(policy, StatusFile(str(tmp_path / 'status.json')))
+
+    async def spawn():
+        raise AssertionError('should not restart')
+
+    async def run():
+        proc = FakeProcess(0)
+        supervisor.started('api', proc)
+        return await supervisor.supervise('api', proc, spawn)
+
+    assert asyncio.run(run()) == 0
+    assert supervisor.status_file.get('api')['state'] == 'stopped'
+
+
+def test_restart_after_stop(tmp_path):
+    supervisor = Supervisor(RestartPolicy(), StatusFile(str(tmp_path / 'status.json')))
+    supervisor.started('api', FakeProcess(0))
+    supervisor.stop('api')
+
+    with pytest.raises(SupervisorError, match='restart pyrunjvm to start it again'):
+        supervisor.restart('api')
+
+
+def test_create_restart_policy():
+    policy = create_restart_policy(FakeContext({'supervise': {'restart': 'always', 'backoff': '2'}}))
+    assert policy.restart == 'always' and policy.backoff == 2.0 and not policy.enable
+
+
+@pytest.mark.parametrize('config, error', [
+    ({'restart': 'never'}, 'supervise restart must be one of on-failure, always, but it is never'),
+    ({'max_restarts': 'many'}, "supervise max_restarts must be a non-negative number, but it is 'many'"),
+    ({'backoff': -1}, 'supervise backoff must be a non-negative number, but it is -1'),
+])
+def test_create_restart_policy_error(config, error, capsys):
+    with pytest.raises(SystemExit):
+        create_restart_policy(FakeContext({'supervise': config}))
+    assert capsys.readouterr().out.strip() == f'error: {error}'
@@ -0,0 +1,45 @@
+import json
+import os
+
+from pyrunjvm.templates import TemplateRenderer
+
+
+class Info(object):
+    def __init__(self, name, port):
+        self.name = name
+        self.port = port
+
+
+def test_launch_json_is_valid(tmp_path):
+    r = TemplateRenderer(str(tmp_path / 'cache'))
+    s = r.render('vscode/launch.json', {
+        'debug_port_info_list': [Info('debug a', 5005), Info('debug "b"', 5006)]
+    })
+    data = json.loads(s)
+    assert [c['port'] for c in data['configurations']] == [5005, 5006]
+    assert data['configurations'][1]['name'] == 'debug "b"'
+
+    assert json.loads(r.render('vscode/launch.json', debug_port_info_list=[]))['configurations'] == []
+
+
+def test_render_to_file_only_if_changed(tmp_path):
+    r = TemplateRenderer(str(tmp_path / 'cache'))
+    out = str(tmp_path / 'app.xml')
+    m = {'context_path': '/app', 'war_path': '/a&b'}
+    assert r.render_to_file('tomcat/context.xml', out, m)
+    assert not r.render_to_file('tomcat/context.xml', out, m)
+    with open(out) as f:
+        assert 'docBase="/a&amp;b"' in f.read()
+    assert os.listdir(str(tmp_path / 'cache'))
+
+
+def test_override_template(tmp_path):
+    os.makedirs(str(tmp_path / 'tpl' / 'tomcat'))
+    with open(str(tmp_path / 'tpl' / 'tomcat' / 'context.xml'), 'w') as f:
+        f.write('<Context path="{{ context_path }}" reloadable="false"/>\n')
+
+    r = TemplateRenderer(None, str(tmp_path / 'tpl'))
+    assert r.render('tomcat/context.xml', context_path='/app') == '<Context path="/app" reloadable="false"/>\n'
+    assert r.get_template_file('tomcat/context.xml').startswith(str(tmp_path))
+    # 没有覆盖的模板使用自带的
+    assert r.get_template_file('tomcat/server.xml') != r.get_template_file('tomcat/context.xml')
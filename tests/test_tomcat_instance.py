@@ -0,0 +1,70 @@
+from pyrunjvm.context import Context
+from pyrunjvm.application import TomcatApplication
+
+
+def new_app(tmp_path, tomcat_config, projects):
+    tomcat_config['proxy'] = {'enable': False}
+    config = {
+        'app_type': 'tomcat',
+        'tomcat': tomcat_config,
+        'projects': projects,
+    }
+    context = Context('linux', str(tmp_path), config, {'TOMCAT_HOME': str(tmp_path / 'th')})
+    app = TomcatApplication(context)
+    assert app.prepare_config()
+    return app
+
+
+def test_group_by_instance(tmp_path):
+    app = new_app(tmp_path, {'instances': {'api': {'port': 9090}}}, [
+        {'path': 'web'},
+        {'path': 'api', 'instance': 'api'},
+        {'path': 'admin'},
+    ])
+
+    assert list(app.instance_map) == ['tomcat', 'tomcat-api']
+    assert app.get_instance({'path': 'admin'}).name == 'tomcat'
+    api = app.instance_map['tomcat-api']
+    assert api.port == 9090
+    assert api.debug_port == -1
+    assert api.tomcat_dir == str(tmp_path / '.pyrunjvm' / 'tomcat-api')
+    assert api.log_file.endswith('tomcat-api.log')
+
+
+def test_per_project_instance(tmp_path):
+    app = new_app(tmp_path, {'instance_mode': 'per-project'}, [
+        {'path': 'web'},
+        {'path': 'api', 'name': 'api-server'},
+    ])
+
+    assert list(app.instance_map) == ['tomcat-web', 'tomcat-api-server']
+
+
+def test_default_instance_without_projects(tmp_path):
+    app = new_app(tmp_path, {}, [])
+
+    assert list(app.instance_map) == ['tomcat']
+    assert app.instance_map['tomcat'].port == 8080
+
+
+def test_context_options(tmp_path):
+    app = new_app(tmp_path, {
+        'reloadable': False,
+        'jar_scan_skip': ['*.jar'],
+        'tld_scan': ['jstl-*.jar'],
+        'connector': {'protocol': 'nio', 'max_threads': 50, 'tcp_no_delay': True},
+    }, [{'path': 'web'}])
+
+    m = app.get_context_options({'path': 'web'})
+    assert m['reloadable'] == 'false'
+    assert m['jar_scanner'] == []
+    assert ('tldSkip', '*.jar') in m['jar_scan_filter']
+    assert ('tldScan', 'jstl-*.jar') in m['jar_scan_filter']
+
+    m = app.get_context_options({'path': 'api', 'reloadable': True, 'scan_class_path': False})
+    assert m['reloadable'] == 'true'
+    assert m['jar_scanner'] == [('scanClassPath', 'false')]
+
+    connector = app.tomcat_connector
+    assert connector.protocol == 'org.apache.coyote.http11.Http11NioProtocol'
+    assert connector.attrs == [('maxThreads', '50'), ('tcpNoDelay', 'true')]
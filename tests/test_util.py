@@ -0,0 +1,51 @@
+import os
+
+from pyrunjvm.util import sync_tree, write_file_if_changed
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_sync_tree_incremental(tmp_path):
+    src = tmp_path / 'src'
+    dest = tmp_path / 'dest'
+    write(src / 'web.xml', 'web')
+    write(src / 'server.xml', 'server')
+    write(src / 'Catalina' / 'localhost' / 'manager.xml', 'manager')
+
+    result = sync_tree(str(src), str(dest), exclude=['server.xml'], keep=['Catalina'])
+    assert sorted(result.copied) == ['Catalina/localhost/manager.xml', 'web.xml']
+    assert not (dest / 'server.xml').exists()
+
+    write(dest / 'stale.xml', 'stale')
+    write(dest / 'server.xml', 'rendered')
+    write(dest / 'Catalina' / 'localhost' / 'app.xml', 'app')
+
+    result = sync_tree(str(src), str(dest), exclude=['server.xml'], keep=['Catalina'])
+    assert result.copied == []
+    assert result.removed == ['stale.xml']
+    assert result.unchanged == 2
+    assert (dest / 'server.xml').read_text() == 'rendered'
+    assert (dest / 'Catalina' / 'localhost' / 'app.xml').exists()
+
+
+def test_sync_tree_hash_mode(tmp_path):
+    src = tmp_path / 'src'
+    dest = tmp_path / 'dest'
+    write(src / 'a.txt', 'aaa')
+    write(dest / 'a.txt', 'bbb')
+    st = os.stat(src / 'a.txt')
+    os.utime(dest / 'a.txt', ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    assert sync_tree(str(src), str(dest)).copied == []
+    assert sync_tree(str(src), str(dest), 'hash').copied == ['a.txt']
+    assert (dest / 'a.txt').read_text() == 'aaa'
+
+
+def test_write_file_if_changed(tmp_path):
+    p = str(tmp_path / 'a.xml')
+    assert write_file_if_changed(p, 'a')
+    assert not write_file_if_changed(p, 'a')
+    assert write_file_if_changed(p, 'b')
@@ -0,0 +1,57 @@
+import asyncio
+
+from pyrunjvm.watch import Watcher, WatchTarget, take_snapshot, diff_snapshot
+
+
+def test_diff_snapshot():
+    old = {'a': (1, 1), 'b': (1, 1)}
+    new = {'a': (2, 1), 'c': (1, 1)}
+    assert diff_snapshot(old, new) == ['a', 'b', 'c']
+    assert diff_snapshot(new, dict(new)) == []
+
+
+class FakeContext(object):
+    def __init__(self):
+        self.cmds = []
+
+    def execute_cmds(self, cmds):
+        self.cmds.extend(cmds)
+
+
+class FakeApp(object):
+    def __init__(self):
+        self.context = FakeContext()
+        self.redeploy_list = []
+
+    def get_build_cmds(self, project_config):
+        return project_config.get('build_cmds', [])
+
+    def redeploy(self, project_config):
+        self.redeploy_list.append(project_config['path'])
+
+
+def test_rebuild_after_debounce(tmp_path):
+    src = tmp_path / 'web' / 'src'
+    src.mkdir(parents=True)
+    (src / 'A.java').write_text('a')
+
+    app = FakeApp()
+    project_config = {'path': 'web', 'build_cmds': ['gradle war']}
+    target = WatchTarget('web', str(tmp_path / 'web'), ['src/**'], project_config)
+    watcher = Watcher(app, [target], interval=0.01, debounce=0)
+
+    async def run():
+        target.snapshot = take_snapshot(target.base_dir, target.patterns)
+        await watcher.check()
+        assert app.redeploy_list == []
+
+        (src / 'B.java').write_text('b')
+        await watcher.check()
+        # 变化后等到下一次检查没有新的变化才重新构建
+        assert app.redeploy_list == []
+        await watcher.check()
+
+    asyncio.run(run())
+    assert app.context.cmds == ['gradle war']
+    assert app.redeploy_list == ['web']
+    assert not target.changed